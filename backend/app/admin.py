@@ -1,5 +1,6 @@
 # admin.py
 from django.contrib import admin
+from django.urls import reverse
 from django.utils.html import format_html
 from .models import (
     CustomUser,
@@ -85,7 +86,8 @@ class ProductMarkingPhotoAdmin(admin.ModelAdmin):
 
     def thumbnail(self, obj):
         if obj.image:
-            return format_html('<img src="{}" width="50" />', obj.image.url)
+            url = reverse('media-thumb', args=('marking', obj.pk, 128))
+            return format_html('<img src="{}" width="50" />', url)
         return '-'
     thumbnail.short_description = 'Preview'
 
@@ -126,7 +128,7 @@ class PalletAdmin(admin.ModelAdmin):
 class ProductLoadingAdmin(admin.ModelAdmin):
     list_display = ('inspection', 'car_number', 'transport_temperature')
     inlines = [LoadingPhotoInline]
-    search_fields = ('inspection__job_number', 'car_number')
+    search_fields = ('inspection__job_number', 'car_number', 'seal_number')
 
 # Main Inspection admin inlines
 class MushroomStorageInline(admin.StackedInline):
@@ -172,8 +174,9 @@ class ProductLoadingInline(admin.StackedInline):
 
 @admin.register(Inspection)
 class InspectionAdmin(admin.ModelAdmin):
-    list_display = ('job_number', 'inspection_date', 'inspector_name', 'car_number')
-    search_fields = ('job_number', 'inspector_name', 'product_loading__car_number')
+    list_display = ('job_number', 'inspection_date', 'get_inspector', 'car_number')
+    list_select_related = ('inspector',)
+    search_fields = ('job_number', 'inspector_name', 'car_number')
     list_filter = ('inspection_date',)
     inlines = [
         MushroomStorageInline,
@@ -185,6 +188,14 @@ class InspectionAdmin(admin.ModelAdmin):
         ProductLoadingInline,
     ]
 
+    def get_inspector(self, obj):
+        # в админке инспектор, как и раньше, «Фамилия Имя»
+        if obj.inspector:
+            return f"{obj.inspector.last_name} {obj.inspector.first_name}"
+        return '-'
+    get_inspector.short_description = 'Инспектор'
+    get_inspector.admin_order_field = 'inspector__last_name'
+
 class CustomUserCreationForm(forms.ModelForm):
     password1 = forms.CharField(label="Пароль", widget=forms.PasswordInput)
     password2 = forms.CharField(label="Повтор пароля", widget=forms.PasswordInput)
@@ -0,0 +1,80 @@
+# app/archive.py
+"""
+ZIP со всеми фото инспекции, собираемый на лету (/api/inspections/<id>/photos.zip).
+
+Архив пишется в объект-приёмник без seek(), поэтому zipfile ставит
+размеры и CRC после данных (data descriptor), и ничего не нужно знать
+заранее. Генератор отдаёт байты сразу после каждого прочитанного куска
+файла: ответ начинается мгновенно, а память не зависит от числа фото.
+JPEG уже сжат, поэтому файлы кладутся без сжатия (ZIP_STORED).
+"""
+import logging
+import os
+import zipfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PHOTO_KINDS
+from .storage import photo_storage
+
+logger = logging.getLogger(__name__)
+
+
+class _Sink:
+    """Приёмник для ZipFile: копит записанное до следующего take()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def archive_entries(inspection, kinds):
+    """(имя в архиве, имя файла, время загрузки) для фото выбранных видов."""
+    for kind in kinds:
+        section_model, photo_model, owner_field = PHOTO_KINDS[kind]
+        if section_model is None:
+            qs = photo_model.objects.filter(inspection=inspection)
+        else:
+            qs = photo_model.objects.filter(**{f'{owner_field}__inspection': inspection})
+        rows = (qs.exclude(image='').exclude(image__isnull=True)
+                .order_by(owner_field, 'uploaded_at', 'id')
+                .values_list('id', f'{owner_field}_id', 'image', 'uploaded_at')
+                .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+        for pk, owner_id, name, uploaded_at in rows:
+            ext = os.path.splitext(name)[1].lower() or '.jpg'
+            yield f'{kind}/{owner_id}/{pk}{ext}', name, uploaded_at
+
+
+def stream_zip(entries, storage=None):
+    """Генератор байтов ZIP-архива из archive_entries()."""
+    storage = storage or photo_storage
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as zf:
+        for arcname, name, uploaded_at in entries:
+            try:
+                src = storage.open(name, 'rb')
+            except OSError as e:
+                logger.warning("Skipping %s in photo archive: %s", name, e)
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=timezone.localtime(uploaded_at).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with src, zf.open(info, 'w') as dest:
+                for chunk in src.chunks(settings.PHOTO_INGEST_CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield sink.take()
+            # data descriptor после файла
+            yield sink.take()
+    # центральный каталог пишется при закрытии архива
+    yield sink.take()
@@ -0,0 +1,113 @@
+# app/bundle.py
+"""
+Вся страница инспекции одним ответом: разделы и фото всех видов.
+
+Фото читаются через values_list, по одному запросу на вид, без создания
+моделей и сериализаторов на каждое фото. Базовый URL медиа строится один
+раз, а к нему дописываются имена файлов.
+"""
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+
+from .imaging import derivative_or_original
+from .models import (
+    DiameterMeasurement,
+    MushroomStorage,
+    Pallet,
+    ProductLoading,
+    QualityInspection,
+    QuantityInspection,
+    PHOTO_KINDS,
+)
+from .serializers import (
+    DiameterMeasurementSerializer,
+    FullInspectionSerializer,
+    MushroomStorageSerializer,
+    PalletSerializer,
+    ProductLoadingSerializer,
+    QualityInspectionSerializer,
+    QuantityInspectionSerializer,
+)
+
+# вид фото -> (ключ раздела в ответе, queryset разделов, сериализатор раздела)
+BUNDLE_SECTIONS = {
+    'placement': ('mushroom_storage',      MushroomStorage.objects.select_related('thermometer'),
+                  MushroomStorageSerializer),
+    'quantity':  ('quantity_inspections',  QuantityInspection.objects.prefetch_related('boxes'),
+                  QuantityInspectionSerializer),
+    'quality':   ('quality_inspections',   QualityInspection.objects.all(),
+                  QualityInspectionSerializer),
+    'diameter':  ('diameter_measurements', DiameterMeasurement.objects.all(),
+                  DiameterMeasurementSerializer),
+    'pallet':    ('pallets',               Pallet.objects.all(),
+                  PalletSerializer),
+    'loading':   ('product_loading',       ProductLoading.objects.all(),
+                  ProductLoadingSerializer),
+}
+
+BUNDLE_FIELDS = {'id', 'inspection_date', 'job_number', 'inspector_name', 'car_number'}
+
+
+def media_url_builder(request):
+    """Функция name -> абсолютный URL файла; база вычисляется один раз."""
+    base = settings.MEDIA_URL
+    if request is not None:
+        base = request.build_absolute_uri(base)
+    return lambda name: base + filepath_to_uri(name)
+
+
+def photo_rows(photo_model, owner_field, inspection, url):
+    """Фото одного вида: {id владельца: [фото, ...]} в порядке загрузки."""
+    if owner_field == 'inspection':
+        qs = photo_model.objects.filter(inspection=inspection)
+    else:
+        qs = photo_model.objects.filter(**{f'{owner_field}__inspection': inspection})
+    rows = qs.order_by('uploaded_at', 'id').values_list('id', f'{owner_field}_id', 'image', 'uploaded_at')
+
+    uploaded = serializers.DateTimeField()
+    storage = photo_model._meta.get_field('image').storage
+    grouped = {}
+    for pk, owner_id, name, uploaded_at in rows:
+        if not name:
+            continue
+        grouped.setdefault(owner_id, []).append({
+            'id': pk,
+            'image': url(name),
+            # у старых и нечитаемых фото копий нет — тогда оригинал
+            'thumbnail': url(derivative_or_original(name, 'thumb', storage)),
+            'screen': url(derivative_or_original(name, 'screen', storage)),
+            'report_image': url(derivative_or_original(name, 'report', storage)),
+            'uploaded_at': uploaded.to_representation(uploaded_at),
+        })
+    return grouped
+
+
+def inspection_bundle(inspection, request=None):
+    """
+    Инспекция со всеми разделами; у каждого раздела список photos,
+    фото маркировки — в marking_photos. Число запросов не зависит
+    от количества разделов и фото.
+    """
+    context = {'request': request}
+    url = media_url_builder(request)
+    data = dict(FullInspectionSerializer(inspection, fields=BUNDLE_FIELDS, context=context).data)
+
+    for kind, (section_model, photo_model, owner_field) in PHOTO_KINDS.items():
+        photos = photo_rows(photo_model, owner_field, inspection, url)
+        if section_model is None:
+            data['marking_photos'] = photos.get(inspection.pk, [])
+            continue
+
+        key, queryset, serializer_class = BUNDLE_SECTIONS[kind]
+        serializer = serializer_class(queryset.filter(inspection=inspection).order_by('id'),
+                                      many=True, context=context)
+        # фото подставляем сами, без запроса на каждый раздел
+        serializer.child.fields.pop('photos', None)
+        sections = []
+        for section in serializer.data:
+            section = dict(section)
+            section['photos'] = photos.get(section['id'], [])
+            sections.append(section)
+        data[key] = sections
+    return data
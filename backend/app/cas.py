@@ -0,0 +1,76 @@
+# app/cas.py
+"""
+Хранение фотографий по содержимому (content-addressed storage).
+
+Файл кладётся под именем photos/sha256/ab/cd/<sha256>.jpg, поэтому
+одинаковые байты — повторно загруженный архив или одно фото в архивах
+разных разделов — пишутся на диск один раз. Строки фото просто ссылаются
+на общий файл.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+CAS_PREFIX = 'photos/sha256'
+# оригинал, но не его копия IMG__thumb.jpg и не .incoming/
+CAS_NAME_RE = re.compile(rf'^{CAS_PREFIX}/[0-9a-f]{{2}}/[0-9a-f]{{2}}/[0-9a-f]{{64}}(\.\w+)?$')
+
+
+def cas_name(digest, ext):
+    return f"{CAS_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def is_cas_name(name):
+    """Имя оригинала в CAS: его содержимое под этим именем не меняется."""
+    return CAS_NAME_RE.match(name) is not None
+
+
+def normalize_ext(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return '.jpg' if ext == '.jpeg' else ext
+
+
+def hash_chunks(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_chunks(chunks, filename, storage):
+    """
+    Пишет поток во временный файл, попутно считая sha256, и ставит его на
+    место одной жёсткой ссылкой. Если такой файл уже есть, os.link падает
+    с FileExistsError — это и есть дедупликация, без отдельного stat().
+
+    Возвращает (имя в хранилище, sha256, записан ли файл впервые).
+    Для хранилищ без локального пути бросает NotImplementedError
+    до чтения chunks.
+    """
+    root = storage.path('')
+    incoming = os.path.join(root, CAS_PREFIX, '.incoming')
+    os.makedirs(incoming, exist_ok=True)
+
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=incoming)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+        if storage.file_permissions_mode is not None:
+            os.chmod(tmp, storage.file_permissions_mode)
+
+        hexdigest = digest.hexdigest()
+        name = cas_name(hexdigest, normalize_ext(filename))
+        target = storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(tmp, target)
+            created = True
+        except FileExistsError:
+            created = False
+        return name, hexdigest, created
+    finally:
+        os.remove(tmp)
@@ -0,0 +1,53 @@
+# app/conditional.py
+"""
+Условные GET-запросы для инспекций и их фото.
+
+Отпечаток инспекции — (version, updated_at), которые меняются при любой
+записи (app/signals.py). Если ETag или дата в запросе совпали, отвечаем
+304 одним запросом к БД, без выборки разделов и сериализации.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Inspection
+
+
+def inspection_validators(inspection_id, request):
+    """(etag, last_modified) инспекции или None, если её нет."""
+    try:
+        inspection_id = int(inspection_id)
+    except (TypeError, ValueError):
+        return None
+    row = Inspection.objects.filter(pk=inspection_id).values_list('version', 'updated_at').first()
+    if row is None:
+        return None
+    version, updated_at = row
+    # в ETag входит и адрес: ?fields=, ?expand= и курсор дают разные ответы
+    key = f"{inspection_id}:{version}:{updated_at.isoformat()}:{request.get_full_path()}"
+    return quote_etag(hashlib.sha1(key.encode()).hexdigest()), updated_at
+
+
+class ConditionalInspectionMixin:
+    """
+    conditional(inspection_id, handler, ...) вызывает handler только если
+    у клиента нет актуальной копии, и добавляет к ответу ETag/Last-Modified.
+    """
+
+    def conditional(self, inspection_id, handler, request, *args, **kwargs):
+        validators = inspection_validators(inspection_id, request)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, updated_at = validators
+        last_modified = updated_at.timestamp()
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            # браузер проверяет актуальность при каждом открытии страницы
+            response['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,98 @@
+# app/disk_cache.py
+"""
+Общее для дисковых кэшей (превью, отчёты): атомарная запись файла и
+ограничение суммарного размера каталога с вытеснением файлов, к которым
+дольше всего не обращались (время доступа — mtime, его обновляет touch()).
+"""
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+
+def write_atomic(path, data, mode=None):
+    """
+    Пишет файл целиком через временный и os.replace: читатели не видят половину.
+    mode — права файла (mkstemp создаёт 0600).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as out:
+        out.write(data)
+    if mode is not None:
+        os.chmod(tmp, mode)
+    os.replace(tmp, path)
+
+
+def touch(path):
+    """Отмечает попадание для LRU; False, если файла нет."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class DiskUsage:
+    """
+    Размер каталога кэша с вытеснением старых файлов.
+
+    Каталог и лимит — имена настроек, они читаются при каждом вызове.
+    Размер считается по диску при первом обращении, дальше ведётся
+    в памяти процесса.
+    """
+
+    def __init__(self, dir_setting, limit_setting):
+        self.dir_setting = dir_setting
+        self.limit_setting = limit_setting
+        self._lock = threading.Lock()
+        self._bytes = None
+
+    def scan(self):
+        """[(mtime, размер, путь), ...] всех файлов кэша."""
+        entries = []
+        for root, _, files in os.walk(getattr(settings, self.dir_setting)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def account(self, added, keep=None):
+        """
+        Учитывает новый файл и при переполнении удаляет самые старые;
+        keep — путь, который удалять нельзя (только что записанный).
+        """
+        limit = getattr(settings, self.limit_setting)
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = sum(size for _, size, _ in self.scan())
+            else:
+                self._bytes += added
+            if self._bytes <= limit:
+                return
+
+            # другие процессы тоже пишут в кэш — пересчитываем по диску
+            entries = sorted(self.scan())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= limit * 0.9:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._bytes = total
+
+    def forget(self, removed):
+        """Учитывает удалённый файл."""
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes = max(self._bytes - removed, 0)
@@ -0,0 +1,143 @@
+# app/export.py
+"""
+Выгрузка данных инспекций для сверки: CSV или NDJSON.
+
+Строки читаются через values_list(...).iterator(chunk_size) — на
+PostgreSQL это серверный курсор, в памяти держится только одна пачка
+строк, модели не создаются. Текст собирается генератором кусками
+примерно по EXPORT_BUFFER_SIZE байт и отдаётся через StreamingHttpResponse
+(views.ExportView) или пишется в файл (manage.py export_inspections).
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date
+
+from .models import Box, Inspection, MushroomStorage, ProductLoading, QualityInspection
+
+EXPORT_FORMATS = {
+    'csv':    ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+# набор -> (модель, путь к дате инспекции, [(колонка, поле), ...])
+EXPORT_DATASETS = {
+    'inspections': (Inspection, 'inspection_date', [
+        ('inspection_id',   'id'),
+        ('inspection_date', 'inspection_date'),
+        ('job_number',      'job_number'),
+        ('inspector_name',  'inspector_name'),
+        ('car_number',      'car_number'),
+    ]),
+    'storage': (MushroomStorage, 'inspection__inspection_date', [
+        ('inspection_id',            'inspection_id'),
+        ('inspection_date',          'inspection__inspection_date'),
+        ('job_number',               'inspection__job_number'),
+        ('storage_id',               'id'),
+        ('quantity_of_boxes',        'quantity_of_boxes'),
+        ('quantity_of_pallets',      'quantity_of_pallets'),
+        ('temperature_in_fridge',    'temperature_in_fridge'),
+        ('mushroom_temperature_min', 'mushroom_temperature_min'),
+        ('mushroom_temperature_max', 'mushroom_temperature_max'),
+        ('invoice_number',           'invoice_number'),
+    ]),
+    'boxes': (Box, 'quantity_inspection__inspection__inspection_date', [
+        ('inspection_id',            'quantity_inspection__inspection_id'),
+        ('inspection_date',          'quantity_inspection__inspection__inspection_date'),
+        ('job_number',               'quantity_inspection__inspection__job_number'),
+        ('quantity_inspection_id',   'quantity_inspection_id'),
+        ('box_id',                   'id'),
+        ('net_weight',               'net_weight'),
+        ('defect_weight',            'defect_weight'),
+    ]),
+    'quality': (QualityInspection, 'inspection__inspection_date', [
+        ('inspection_id',              'inspection_id'),
+        ('inspection_date',            'inspection__inspection_date'),
+        ('job_number',                 'inspection__job_number'),
+        ('quality_inspection_id',      'id'),
+        ('sample_mass_kg',             'sample_mass_kg'),
+        ('conforms_to_declared_grade', 'conforms_to_declared_grade'),
+        ('off_grade_mass_kg_50',       'off_grade_mass_kg_50'),
+        ('off_grade_mass_kg_70',       'off_grade_mass_kg_70'),
+    ]),
+    'loading': (ProductLoading, 'inspection__inspection_date', [
+        ('inspection_id',         'inspection_id'),
+        ('inspection_date',       'inspection__inspection_date'),
+        ('job_number',            'inspection__job_number'),
+        ('loading_id',            'id'),
+        ('car_number',            'car_number'),
+        ('refrigerator_number',   'refrigerator_number'),
+        ('seal_number',           'seal_number'),
+        ('mushroom_temperature',  'mushroom_temperature'),
+        ('transport_temperature', 'transport_temperature'),
+    ]),
+}
+
+
+def parse_period(date_from=None, date_to=None):
+    """(с, по) из строк YYYY-MM-DD; ValueError при неверной дате."""
+    period = []
+    for value in (date_from, date_to):
+        if value:
+            value = parse_date(value)
+            if value is None:
+                raise ValueError("Дата должна быть в формате YYYY-MM-DD")
+        period.append(value or None)
+    return tuple(period)
+
+
+def export_rows(dataset, date_from=None, date_to=None):
+    """Заголовки и итератор строк набора за период (включительно)."""
+    model, date_field, columns = EXPORT_DATASETS[dataset]
+    qs = model.objects.all()
+    if date_from:
+        qs = qs.filter(**{f'{date_field}__gte': date_from})
+    if date_to:
+        qs = qs.filter(**{f'{date_field}__lte': date_to})
+    rows = (qs.order_by(date_field, 'id')
+            .values_list(*(field for _, field in columns))
+            .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE))
+    return [name for name, _ in columns], rows
+
+
+class _Line:
+    """Файлоподобный объект для csv.writer: write() возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(header, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(header, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + '\n'
+
+
+def export_chunks(dataset, fmt, date_from=None, date_to=None):
+    """Генератор текста выгрузки кусками по EXPORT_BUFFER_SIZE символов."""
+    header, rows = export_rows(dataset, date_from, date_to)
+    lines = _csv_lines(header, rows) if fmt == 'csv' else _ndjson_lines(header, rows)
+    limit = settings.EXPORT_BUFFER_SIZE
+    buf, size = [], 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= limit:
+            yield ''.join(buf)
+            buf, size = [], 0
+    if buf:
+        yield ''.join(buf)
+
+
+def export_filename(dataset, fmt, date_from=None, date_to=None):
+    period = '_'.join(str(d) for d in (date_from, date_to) if d)
+    return f"{dataset}{'_' + period if period else ''}.{EXPORT_FORMATS[fmt][1]}"
@@ -0,0 +1,117 @@
+# app/imaging.py
+"""
+Уменьшенные копии фотографий, которые создаются один раз при загрузке.
+
+Рядом с оригиналом photos/.../IMG_1.jpg сохраняются
+IMG_1__thumb.jpg, IMG_1__screen.jpg и IMG_1__report.jpg
+(размеры — PHOTO_DERIVATIVES в settings.py). Ориентация по EXIF
+применяется сразу, а JPEG декодируется в draft-режиме, то есть сразу
+в уменьшенном масштабе, без распаковки всех 12–48 Мп.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .disk_cache import write_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def derivative_name(name, kind):
+    stem, _ = os.path.splitext(name)
+    return f"{stem}__{kind}.jpg"
+
+
+def open_normalized(fp, boxes):
+    """
+    Открывает фото, достаточно крупное для каждого из boxes, с учётом
+    EXIF-поворота. JPEG сразу декодируется в уменьшенном масштабе.
+    """
+    img = Image.open(fp)
+    w, h = img.size
+    # какой масштаб нужен самой крупной копии; поворот по EXIF ещё не
+    # применён, поэтому считаем для обеих ориентаций
+    scale = max(
+        max(min(bw / w, bh / h), min(bw / h, bh / w))
+        for bw, bh in boxes
+    )
+    if scale < 1:
+        # draft выбирает масштаб 1/2, 1/4, 1/8 не меньше запрошенного размера
+        img.draft('RGB', (int(w * scale) + 1, int(h * scale) + 1))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img
+
+
+def render(img, box, format='JPEG'):
+    """Вписывает img в box и возвращает байты в нужном формате."""
+    copy = img.copy()
+    copy.thumbnail(box, Image.LANCZOS)
+    buf = BytesIO()
+    copy.save(buf, format=format, quality=settings.PHOTO_DERIVATIVE_QUALITY, optimize=True)
+    return buf.getvalue()
+
+
+def make_derivatives(name, storage=None, kinds=None):
+    """
+    Создаёт уменьшенные копии фото name. Возвращает False, если файл
+    не удалось прочитать как изображение: загрузку это не прерывает.
+    Уже существующие копии заменяются на месте.
+    """
+    storage = storage or default_storage
+    sizes = settings.PHOTO_DERIVATIVES
+    kinds = kinds or list(sizes)
+    try:
+        with storage.open(name) as f:
+            img = open_normalized(f, [sizes[k] for k in kinds])
+            img.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        logger.warning("Cannot build derivatives for %s: %s", name, e)
+        return False
+
+    for kind in kinds:
+        save_exact(storage, derivative_name(name, kind), render(img, sizes[kind]))
+    return True
+
+
+def save_exact(storage, name, data):
+    """
+    Записывает data ровно под именем name, заменяя прежний файл. storage.save
+    при занятом имени подобрал бы другое, и копия осталась бы ничейной.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # удалённое хранилище: save после delete пишет под тем же именем
+        storage.delete(name)
+        storage.save(name, ContentFile(data))
+        return
+    write_atomic(path, data, mode=storage.file_permissions_mode)
+
+
+def derivative_or_original(name, kind, storage=None):
+    """
+    Имя копии kind, если она есть, иначе самого фото: у фото, загруженных
+    до появления копий или не прочитанных при загрузке, копий нет.
+    """
+    storage = storage or default_storage
+    target = derivative_name(name, kind)
+    return target if storage.exists(target) else name
+
+
+def ensure_derivative(name, kind, storage=None):
+    """
+    Имя копии kind для фото name. Если копии нет (фото загружено до её
+    появления), создаёт её; если фото не читается — возвращает оригинал.
+    """
+    storage = storage or default_storage
+    target = derivative_name(name, kind)
+    if storage.exists(target) or make_derivatives(name, storage, kinds=[kind]):
+        return target
+    return name
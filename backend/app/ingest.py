@@ -0,0 +1,278 @@
+# app/ingest.py
+"""
+Общий путь распаковки ZIP-архивов с фотографиями.
+
+Каждый файл архива копируется из zf.open() в хранилище кусками
+фиксированного размера, поэтому расход памяти не зависит ни от размера
+архива, ни от размера отдельных фотографий. Архивы всех разделов
+инспекции распаковываются одним пулом потоков (PhotoIngest).
+Файлы хранятся по содержимому (app/cas.py), дубликаты пишутся один раз.
+"""
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.files import File
+
+from .cas import hash_chunks, store_chunks
+from .imaging import make_derivatives
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+class ZipMemberFile(File):
+    """Файл внутри ZIP-архива, который читается потоком, а не целиком."""
+
+    def __init__(self, member, info):
+        super().__init__(member, name=os.path.basename(info.filename))
+        self.size = info.file_size
+
+    def chunks(self, chunk_size=None):
+        # ZipExtFile умеет seek(0) только через повторную распаковку,
+        # поэтому читаем строго вперёд, без перемотки.
+        chunk_size = chunk_size or settings.PHOTO_INGEST_CHUNK_SIZE
+        while True:
+            data = self.file.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+
+def iter_image_members(zf):
+    """Возвращает записи архива, похожие на фотографии."""
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        if info.filename.lower().endswith(IMAGE_EXTENSIONS):
+            yield info
+
+
+def store_photo(photo, content):
+    """
+    Кладёт content в photo.image, не сохраняя строку в БД.
+    Возвращает True, если такие байты записаны на диск впервые.
+    """
+    storage = photo.image.storage
+    if settings.PHOTO_CONTENT_ADDRESSED:
+        try:
+            name, digest, created = store_chunks(content.chunks(), content.name, storage)
+        except NotImplementedError:
+            pass  # хранилище без локального пути — обычное сохранение
+        else:
+            photo.image = name
+            photo.sha256 = digest
+            return created
+    photo.image.save(content.name, content, save=False)
+    return True
+
+
+def save_file(f, photo):
+    """Как save_member, но для отдельного загруженного фото (не из архива)."""
+    if store_photo(photo, f) and settings.PHOTO_DERIVATIVES_ON_INGEST:
+        make_derivatives(photo.image.name, photo.image.storage)
+    return photo
+
+
+def save_member(zf, info, photo):
+    """
+    Копирует один файл архива в photo.image, не сохраняя строку в БД,
+    и для нового содержимого строит уменьшенные копии (см. app/imaging.py).
+    """
+    with zf.open(info) as member:
+        created = store_photo(photo, ZipMemberFile(member, info))
+    if created and settings.PHOTO_DERIVATIVES_ON_INGEST:
+        make_derivatives(photo.image.name, photo.image.storage)
+    return photo
+
+
+class PhotoIngest:
+    """
+    Набор ZIP-архивов (и отдельных фото), которые распаковываются общим
+    пулом потоков.
+
+    Потоки только копируют файлы в хранилище. Строки фотографий
+    создаются потом в вызывающем потоке через bulk_create, в порядке
+    файлов внутри архива, поэтому потокам не нужно своё соединение с БД.
+    """
+
+    def __init__(self, workers=None, progress=None, reuse_existing=False):
+        self.workers = workers or settings.PHOTO_INGEST_WORKERS
+        # необязательный отчёт о прогрессе: expect(model, total), advance(model)
+        self.progress = progress
+        # повтор загрузки в существующий раздел не создаёт строки второй раз
+        self.reuse_existing = reuse_existing
+        self.jobs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, zip_file, photo_model, **owner):
+        # архив открывается сразу: битый ZIP даёт BadZipFile здесь же,
+        # у вызывающего раздела, а не в общем run()
+        self.jobs.append((zipfile.ZipFile(zip_file), photo_model, owner))
+
+    def add_files(self, files, photo_model, **owner):
+        """Отдельные загруженные фото; в run() им соответствует свой список."""
+        self.jobs.append((list(files), photo_model, owner))
+
+    def close(self):
+        """Закрывает архивы, которые так и не дошли до run() (ошибка в другом разделе)."""
+        jobs, self.jobs = self.jobs, []
+        for source, _, _ in jobs:
+            if not isinstance(source, list):
+                source.close()
+
+    def run(self):
+        """Распаковывает все архивы и возвращает списки фото по add()/add_files()."""
+        jobs, self.jobs = self.jobs, []
+        if not jobs:
+            return []
+
+        with ExitStack() as archives:
+            for source, _, _ in jobs:
+                if not isinstance(source, list):
+                    archives.enter_context(source)
+            pool = ThreadPoolExecutor(max_workers=self.workers,
+                                      thread_name_prefix='photo-ingest')
+            try:
+                pending = []
+                # одинаковые CRC32 и размер из центрального каталога ZIP —
+                # дешёвый признак дубликата внутри одной загрузки
+                seen = {}
+                for source, photo_model, owner in jobs:
+                    if isinstance(source, list):
+                        if self.progress is not None:
+                            self.progress.expect(photo_model, len(source))
+                        pending.append([pool.submit(self._save_file, f, photo_model(**owner))
+                                        for f in source])
+                        continue
+                    zf = source
+                    infos = list(iter_image_members(zf))
+                    if self.progress is not None:
+                        self.progress.expect(photo_model, len(infos))
+                    futures = []
+                    for info in infos:
+                        photo = photo_model(**owner)
+                        first = seen.get((info.CRC, info.file_size))
+                        if first is None:
+                            future = pool.submit(self._save_member, zf, info, photo)
+                            seen[(info.CRC, info.file_size)] = future
+                        else:
+                            # очередь пула FIFO: first уже взят в работу раньше
+                            future = pool.submit(self._save_duplicate, zf, info, photo, first)
+                        futures.append(future)
+                    pending.append(futures)
+                results = [[f.result() for f in futures] for futures in pending]
+            except BaseException:
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+            pool.shutdown(wait=True)
+
+        # сначала файлы, потом все строки разом: по одному INSERT на пачку
+        # фотографий одной модели, а не на каждую фотографию
+        if self.reuse_existing:
+            self._reuse_existing(jobs, results)
+        by_model = {}
+        for index, (_, photo_model, owner) in enumerate(jobs):
+            by_model.setdefault(photo_model, []).extend(
+                photo for photo in results[index] if photo.pk is None)
+        for photo_model, photos in by_model.items():
+            photo_model.objects.bulk_create(
+                photos, batch_size=settings.PHOTO_BULK_CREATE_BATCH_SIZE)
+        return results
+
+    @staticmethod
+    def _reuse_existing(jobs, results):
+        # один проход на модель и владельца: архив и отдельные фото того же
+        # раздела делят уже существующие строки, а не берут их каждый себе
+        groups = {}
+        for index, (_, photo_model, owner) in enumerate(jobs):
+            groups.setdefault((photo_model, tuple(sorted(owner.items()))), []).append(index)
+        for (photo_model, owner), indexes in groups.items():
+            photos = reuse_existing_photos(
+                [photo for index in indexes for photo in results[index]],
+                photo_model, **dict(owner))
+            for index in indexes:
+                count = len(results[index])
+                results[index], photos = photos[:count], photos[count:]
+
+    def _save_file(self, f, photo):
+        save_file(f, photo)
+        if self.progress is not None:
+            self.progress.advance(type(photo))
+        return photo
+
+    def _save_member(self, zf, info, photo):
+        save_member(zf, info, photo)
+        if self.progress is not None:
+            self.progress.advance(type(photo))
+        return photo
+
+    def _save_duplicate(self, zf, info, photo, first):
+        # кандидат в дубликаты: сверяем sha256, ничего не записывая на диск
+        original = first.result()
+        if original.sha256:
+            with zf.open(info) as member:
+                digest = hash_chunks(ZipMemberFile(member, info).chunks())
+            if digest == original.sha256:
+                photo.image = original.image.name
+                photo.sha256 = digest
+                if self.progress is not None:
+                    self.progress.advance(type(photo))
+                return photo
+        return self._save_member(zf, info, photo)
+
+
+def reuse_existing_photos(photos, photo_model, **owner):
+    """
+    Заменяет ещё не сохранённые фото уже существующими строками владельца
+    с тем же sha256 (повтор загрузки после потерянного ответа). Каждая
+    строка используется один раз, поэтому одинаковые фото внутри одной
+    загрузки по-прежнему дают отдельные строки. Без sha256 (хранилище
+    не по содержимому) ничего не заменяется.
+    """
+    digests = {photo.sha256 for photo in photos if photo.sha256}
+    if not digests:
+        return photos
+    existing = {}
+    for row in photo_model.objects.filter(sha256__in=digests, **owner).order_by('id'):
+        existing.setdefault(row.sha256, []).append(row)
+    result = []
+    for photo in photos:
+        rows = existing.get(photo.sha256) if photo.sha256 else None
+        result.append(rows.pop(0) if rows else photo)
+    return result
+
+
+def extract_zip_photos(zip_file, photo_model, ingest=None, reuse_existing=False, **owner):
+    """
+    Распаковывает фотографии из zip_file в новые строки photo_model.
+    owner — поле-владелец, например storage=storage.
+
+    Если передан ingest (PhotoIngest), архив только ставится в очередь,
+    а распаковка произойдёт при ingest.run().
+    """
+    if ingest is not None:
+        ingest.add(zip_file, photo_model, **owner)
+        return None
+    ingest = PhotoIngest(reuse_existing=reuse_existing)
+    ingest.add(zip_file, photo_model, **owner)
+    return ingest.run()[0]
+
+
+def save_uploaded_photos(files, photo_model, ingest=None, reuse_existing=False, **owner):
+    """
+    Сохраняет отдельные загруженные фото (не из архива) одним bulk_create.
+    С ingest — как extract_zip_photos: только ставит в очередь до ingest.run().
+    """
+    if ingest is not None:
+        ingest.add_files(files, photo_model, **owner)
+        return None
+    ingest = PhotoIngest(reuse_existing=reuse_existing)
+    ingest.add_files(files, photo_model, **owner)
+    return ingest.run()[0]
@@ -0,0 +1,360 @@
+# app/jobs.py
+"""
+Очередь фоновой загрузки инспекций, хранящаяся в БД (IngestJob).
+
+Запрос сохраняет исходные части формы в хранилище и сразу отвечает 202.
+Распаковку выполняет поток внутри процесса (INGEST_RUN_IN_PROCESS) или
+отдельная команда `manage.py process_ingest_jobs`.
+
+Пока задача выполняется, обработчик обновляет heartbeat_at. Задачу,
+чей обработчик молчит дольше JOB_STALE_AFTER (процесс упал или был
+перезапущен), следующий обработчик забирает заново. Поток внутри процесса
+запускается новой задачей или запросом статуса ещё не выполненной.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    ChunkedUpload,
+    IngestJob,
+    MushroomPhoto,
+    ProductMarkingPhoto,
+    QuantityInspectionPhoto,
+    QualityInspectionPhoto,
+    DiameterMeasurementPhoto,
+    PalletPhoto,
+    ProductLoadingPhoto,
+)
+from .serializers import FullInspectionSerializer
+from .uploads import AssembledUpload, delete_upload, open_completed_upload
+
+logger = logging.getLogger(__name__)
+
+# ключ прогресса = имя раздела в FullInspectionSerializer
+PROGRESS_SECTIONS = {
+    MushroomPhoto:            'mushroom_storage',
+    ProductMarkingPhoto:      'marking_zips',
+    QuantityInspectionPhoto:  'quantity_inspections',
+    QualityInspectionPhoto:   'quality_inspections',
+    DiameterMeasurementPhoto: 'diameter_measurements',
+    PalletPhoto:              'pallets',
+    ProductLoadingPhoto:      'product_loading',
+}
+
+FILE_MARKER = '__file__'
+UPLOAD_MARKER = '__upload__'
+
+
+def _store_files(value, prefix):
+    """Сохраняет загруженные файлы в хранилище и заменяет их ссылками."""
+    if isinstance(value, AssembledUpload):
+        # докачанный архив уже лежит на диске — запоминаем только id
+        return {UPLOAD_MARKER: str(value.upload_id)}
+    if isinstance(value, UploadedFile):
+        name = default_storage.save(f"{prefix}/{value.name}", value)
+        return {FILE_MARKER: name, 'filename': value.name}
+    if isinstance(value, dict):
+        return {k: _store_files(v, prefix) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_store_files(v, prefix) for v in value]
+    return value
+
+
+def _open_files(value, opened):
+    """Обратное к _store_files: открывает сохранённые части формы."""
+    if isinstance(value, dict):
+        if FILE_MARKER in value:
+            f = File(default_storage.open(value[FILE_MARKER]), name=value['filename'])
+            opened.append(f)
+            return f
+        if UPLOAD_MARKER in value:
+            f = open_completed_upload(value[UPLOAD_MARKER])
+            if f is None:
+                raise ValueError(f"Загрузка {value[UPLOAD_MARKER]} не найдена")
+            opened.append(f)
+            return f
+        return {k: _open_files(v, opened) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_open_files(v, opened) for v in value]
+    return value
+
+
+def _delete_files(value, uploads=True):
+    if isinstance(value, dict):
+        if FILE_MARKER in value:
+            default_storage.delete(value[FILE_MARKER])
+            return
+        if UPLOAD_MARKER in value:
+            if uploads:
+                delete_upload(ChunkedUpload(pk=value[UPLOAD_MARKER]))
+            return
+        for v in value.values():
+            _delete_files(v, uploads)
+    elif isinstance(value, list):
+        for v in value:
+            _delete_files(v, uploads)
+
+
+def _upload_ids(value, ids):
+    if isinstance(value, dict):
+        if UPLOAD_MARKER in value:
+            ids.add(value[UPLOAD_MARKER])
+            return
+        for v in value.values():
+            _upload_ids(v, ids)
+    elif isinstance(value, list):
+        for v in value:
+            _upload_ids(v, ids)
+    return ids
+
+
+def queued_upload_ids():
+    """id докачанных загрузок, которые ещё ждут задачи в очереди или в работе."""
+    ids = set()
+    payloads = (IngestJob.objects.filter(status__in=('pending', 'running'))
+                .values_list('payload', flat=True))
+    for payload in payloads.iterator():
+        _upload_ids(payload, ids)
+    return ids
+
+
+def enqueue_ingest_job(structured, user=None, client_key=None):
+    """
+    Ставит разобранную форму полной инспекции в очередь.
+    Повтор с тем же client_key возвращает уже созданную задачу.
+    """
+    if client_key:
+        job = IngestJob.objects.filter(client_key=client_key).first()
+        if job is not None:
+            return job, False
+
+    payload = _store_files(structured, f"ingest/{uuid.uuid4().hex}")
+    try:
+        with transaction.atomic():
+            job = IngestJob.objects.create(
+                payload=payload,
+                created_by=user if getattr(user, 'is_authenticated', False) else None,
+                client_key=client_key or None,
+            )
+    except IntegrityError:
+        # параллельный повтор с тем же ключом успел раньше;
+        # докачанные архивы общие с той задачей — их не трогаем
+        _delete_files(payload, uploads=False)
+        return IngestJob.objects.get(client_key=client_key), False
+
+    if settings.INGEST_RUN_IN_PROCESS:
+        transaction.on_commit(start_ingest_worker)
+    return job, True
+
+
+class JobProgress:
+    """
+    Считает обработанные фото по разделам и раз в INGEST_PROGRESS_INTERVAL
+    секунд пишет их в IngestJob.progress.
+
+    Запись идёт из собственного потока, то есть через отдельное соединение
+    вне транзакции создания инспекции, поэтому прогресс виден сразу.
+    """
+
+    def __init__(self, job_id, interval=None):
+        self.job_id = job_id
+        self.interval = interval or settings.INGEST_PROGRESS_INTERVAL
+        self.counts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _entry(self, photo_model):
+        section = PROGRESS_SECTIONS.get(photo_model, photo_model.__name__)
+        return self.counts.setdefault(section, {'done': 0, 'total': 0})
+
+    def expect(self, photo_model, total):
+        with self._lock:
+            self._entry(photo_model)['total'] += total
+
+    def advance(self, photo_model):
+        with self._lock:
+            self._entry(photo_model)['done'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {k: dict(v) for k, v in self.counts.items()}
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, name=f'ingest-progress-{self.job_id}',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self._flush()
+            self._flush()
+        finally:
+            connection.close()
+
+    def _flush(self):
+        try:
+            # заодно отметка, что обработчик жив
+            IngestJob.objects.filter(pk=self.job_id).update(progress=self.snapshot(),
+                                                            heartbeat_at=timezone.now())
+        except DatabaseError:
+            logger.warning("Ingest job %s: could not save progress", self.job_id, exc_info=True)
+
+
+def stale_before():
+    return timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+
+
+def claimable():
+    """Условие на задачи, которые можно забрать: в очереди или брошенные."""
+    return Q(status='pending') | Q(status='running') & (
+        Q(heartbeat_at__lt=stale_before()) | Q(heartbeat_at__isnull=True))
+
+
+def is_claimable(job):
+    if job.status == 'pending':
+        return True
+    return job.status == 'running' and (job.heartbeat_at is None or
+                                        job.heartbeat_at < stale_before())
+
+
+class Heartbeat:
+    """
+    Пока открыт, раз в JOB_STALE_AFTER / 5 секунд обновляет heartbeat_at
+    задачи из своего потока — для задач без JobProgress (отчёты).
+    """
+
+    def __init__(self, model, job_id):
+        self.queryset = model.objects.filter(pk=job_id)
+        self.interval = settings.JOB_STALE_AFTER / 5
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, name='job-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.queryset.update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    logger.warning("Could not save job heartbeat", exc_info=True)
+        finally:
+            connection.close()
+
+
+def claim_next_job():
+    """Забирает самую старую задачу из очереди; параллельные обработчики её пропустят."""
+    with transaction.atomic():
+        job = (IngestJob.objects
+               .select_for_update(skip_locked=True)
+               .filter(claimable())
+               .order_by('id')
+               .first())
+        if job is None:
+            return None
+        if job.status == 'running':
+            logger.warning("Ingest job %s: worker lost, running again", job.pk)
+        job.status = 'running'
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'heartbeat_at', 'updated_at'])
+    return job
+
+
+def run_ingest_job(job):
+    opened = []
+    try:
+        data = _open_files(job.payload, opened)
+        with JobProgress(job.pk) as progress:
+            serializer = FullInspectionSerializer(data=data, context={'progress': progress})
+            if serializer.is_valid():
+                # инспекция и отметка «готово» — одной транзакцией: иначе задачу,
+                # брошенную между ними, заберут снова и создадут вторую инспекцию
+                with transaction.atomic():
+                    inspection = serializer.save()
+                    IngestJob.objects.filter(pk=job.pk).update(
+                        status='done', inspection=inspection, updated_at=timezone.now())
+                job.status, job.inspection = 'done', inspection
+            else:
+                job.status = 'failed'
+                job.error = json.dumps(serializer.errors, ensure_ascii=False)
+    except Exception as e:
+        logger.exception("Ingest job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+    finally:
+        for f in opened:
+            f.close()
+
+    if job.status != 'done':
+        job.save(update_fields=['status', 'inspection', 'error', 'updated_at'])
+    if job.status == 'done':
+        # исходные архивы больше не нужны; при ошибке оставляем для разбора
+        _delete_files(job.payload)
+    return job
+
+
+def run_pending_ingest_jobs():
+    """Обрабатывает задачи, пока очередь не опустеет. Возвращает их число."""
+    count = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return count
+        run_ingest_job(job)
+        count += 1
+
+
+# Обработчик внутри процесса: один поток, который будят новые задачи
+_worker_lock = threading.Lock()
+_worker_state = {'running': False, 'wakeup': False}
+
+
+def start_ingest_worker():
+    with _worker_lock:
+        if _worker_state['running']:
+            _worker_state['wakeup'] = True
+            return
+        _worker_state['running'] = True
+    threading.Thread(target=_worker_loop, name='ingest-worker', daemon=True).start()
+
+
+def _worker_loop():
+    try:
+        while True:
+            run_pending_ingest_jobs()
+            with _worker_lock:
+                if not _worker_state['wakeup']:
+                    _worker_state['running'] = False
+                    return
+                _worker_state['wakeup'] = False
+    except Exception:
+        logger.exception("Ingest worker stopped")
+        with _worker_lock:
+            _worker_state['running'] = False
+    finally:
+        connection.close()
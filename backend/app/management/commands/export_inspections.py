@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.export import EXPORT_DATASETS, EXPORT_FORMATS, export_chunks, parse_period
+
+
+class Command(BaseCommand):
+    help = "Выгружает данные инспекций в CSV или NDJSON (потоково, без загрузки всего в память)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--from', dest='date_from', help="Дата инспекции с, YYYY-MM-DD")
+        parser.add_argument('--to', dest='date_to', help="Дата инспекции по, YYYY-MM-DD")
+        parser.add_argument('--output', '-o', default='-', help="Файл; по умолчанию stdout")
+
+    def handle(self, *args, **options):
+        try:
+            date_from, date_to = parse_period(options['date_from'], options['date_to'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        chunks = export_chunks(options['dataset'], options['fmt'], date_from, date_to)
+        if options['output'] == '-':
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for chunk in chunks:
+                out.write(chunk)
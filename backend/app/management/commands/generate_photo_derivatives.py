@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app.imaging import derivative_name, make_derivatives
+from app.models import PHOTO_KINDS
+
+
+class Command(BaseCommand):
+    help = "Создаёт уменьшенные копии (thumb/screen/report) для уже загруженных фото"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Пересоздать копии, даже если они уже есть")
+
+    def handle(self, *args, **options):
+        done = 0
+        for kind, (_, photo_model, _) in PHOTO_KINDS.items():
+            photos = photo_model.objects.exclude(image='').exclude(image__isnull=True)
+            for photo in photos.only('id', 'image').iterator():
+                storage = photo.image.storage
+                if not options['force'] and storage.exists(derivative_name(photo.image.name, 'thumb')):
+                    continue
+                if make_derivatives(photo.image.name, storage):
+                    done += 1
+            self.stdout.write(f"{kind}: готово")
+        self.stdout.write(f"Создано копий для фото: {done}")
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.jobs import run_pending_ingest_jobs
+
+
+class Command(BaseCommand):
+    help = "Обрабатывает очередь фоновых загрузок полной инспекции (IngestJob)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Не завершаться, а ждать новые задачи")
+        parser.add_argument('--sleep', type=float, default=2.0,
+                            help="Пауза между проверками очереди в режиме --loop, сек")
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_ingest_jobs()
+            if count:
+                self.stdout.write(f"Обработано загрузок: {count}")
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.jobs import queued_upload_ids
+from app.models import ChunkedUpload
+from app.uploads import delete_upload
+
+
+class Command(BaseCommand):
+    help = ("Удаляет докачиваемые загрузки, которые не менялись дольше "
+            "CHUNKED_UPLOAD_EXPIRE_HOURS и не нужны задачам в очереди")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRE_HOURS)
+        count = 0
+        # архив, который ждёт задача загрузки, удалять нельзя
+        expired = (ChunkedUpload.objects.filter(updated_at__lt=cutoff)
+                   .exclude(pk__in=queued_upload_ids()))
+        for upload in expired:
+            delete_upload(upload)
+            count += 1
+        self.stdout.write(f"Удалено загрузок: {count}")
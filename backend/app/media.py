@@ -0,0 +1,74 @@
+# app/media.py
+"""
+Отдача файлов MEDIA_ROOT через Django (views.media_file).
+
+MEDIA_SENDFILE_BACKEND:
+  'nginx'  — ответ с X-Accel-Redirect, файл отдаёт nginx (internal location
+             MEDIA_ACCEL_PREFIX, указывающий на MEDIA_ROOT);
+  'apache' — X-Sendfile с абсолютным путём (mod_xsendfile);
+  'django' — FileResponse: под gunicorn/uwsgi он уходит в wsgi.file_wrapper,
+             то есть в os.sendfile без копирования через Python.
+Во всех случаях поддерживаются If-None-Match/If-Modified-Since, а в режиме
+'django' — ещё и Range (один диапазон) для докачки.
+"""
+import re
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) включительно для заголовка Range с одним диапазоном;
+    None — заголовок не поддерживается и отдаётся весь файл.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500 — последние 500 байт
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class RangeFile:
+    """
+    Файл, из которого читается не больше length байт с текущей позиции.
+
+    fileno() отдаётся как есть: wsgi.file_wrapper сервера отправит файл
+    через sendfile с текущего смещения ровно Content-Length байт.
+    """
+
+    def __init__(self, f, start, length):
+        f.seek(start)
+        self.file = f
+        self.name = f.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
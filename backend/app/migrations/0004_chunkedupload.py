@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 15:09
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('offset', models.BigIntegerField(default=0, verbose_name='Принято байт')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='sha256 всего файла')),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('complete', 'Загружен')], default='uploading', max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='chunked_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_chunkedupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diametermeasurementphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='mushroomphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='palletphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='productloadingphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='productmarkingphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='qualityinspectionphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+        migrations.AddField(
+            model_name='quantityinspectionphoto',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='sha256 содержимого'),
+        ),
+    ]
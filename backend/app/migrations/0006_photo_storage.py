@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 15:14
+
+import app.models
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_photo_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='diametermeasurementphoto',
+            name='image',
+            field=models.ImageField(storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='mushroomphoto',
+            name='image',
+            field=models.ImageField(storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='palletphoto',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='productloadingphoto',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='productmarkingphoto',
+            name='image',
+            field=models.ImageField(storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='qualityinspectionphoto',
+            name='image',
+            field=models.ImageField(storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+        migrations.AlterField(
+            model_name='quantityinspectionphoto',
+            name='image',
+            field=models.ImageField(storage=app.storage.PhotoStorage(), upload_to=app.models.inspection_photo_upload_path),
+        ),
+    ]
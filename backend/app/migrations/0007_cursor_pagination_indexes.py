@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_photo_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inspection',
+            index=models.Index(fields=['inspection_date', 'id'], name='inspection_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='palletphoto',
+            index=models.Index(fields=['uploaded_at', 'id'], name='pallet_photo_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmarkingphoto',
+            index=models.Index(fields=['uploaded_at', 'id'], name='marking_photo_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qualityinspectionphoto',
+            index=models.Index(fields=['uploaded_at', 'id'], name='quality_photo_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quantityinspectionphoto',
+            index=models.Index(fields=['uploaded_at', 'id'], name='quantity_photo_uploaded_idx'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2 on 2026-10-18 15:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Поиск в админке (icontains) на PostgreSQL превращается в
+# UPPER(col::text) LIKE UPPER('%...%'): B-tree тут не помогает,
+# нужен GIN-индекс по триграммам на то же выражение.
+TRIGRAM_INDEXES = (
+    ('inspection', 'job_number', 'inspection_job_number_trgm'),
+    ('productloading', 'car_number', 'loading_car_number_trgm'),
+    ('productloading', 'seal_number', 'loading_seal_number_trgm'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    quote = schema_editor.quote_name
+    for model_name, column, name in TRIGRAM_INDEXES:
+        table = apps.get_model('app', model_name)._meta.db_table
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} '
+            f'USING gin (UPPER({quote(column)}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, _, name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_inspection_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diametermeasurementphoto',
+            index=models.Index(fields=['diameter_measurement', 'uploaded_at', 'id'], name='diameter_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mushroomphoto',
+            index=models.Index(fields=['storage', 'uploaded_at', 'id'], name='mushroom_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='palletphoto',
+            index=models.Index(fields=['pallet', 'uploaded_at', 'id'], name='pallet_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productloadingphoto',
+            index=models.Index(fields=['loading', 'uploaded_at', 'id'], name='loading_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productmarkingphoto',
+            index=models.Index(fields=['inspection', 'uploaded_at', 'id'], name='marking_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='qualityinspectionphoto',
+            index=models.Index(fields=['quality_inspection', 'uploaded_at', 'id'], name='quality_photo_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quantityinspectionphoto',
+            index=models.Index(fields=['quantity_inspection', 'uploaded_at', 'id'], name='quantity_photo_owner_idx'),
+        ),
+        # составные индексы начинаются с внешнего ключа и заменяют его
+        # отдельный индекс: держать оба — лишняя запись на каждое фото
+        migrations.AlterField(
+            model_name='diametermeasurementphoto',
+            name='diameter_measurement',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.diametermeasurement'),
+        ),
+        migrations.AlterField(
+            model_name='mushroomphoto',
+            name='storage',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.mushroomstorage'),
+        ),
+        migrations.AlterField(
+            model_name='palletphoto',
+            name='pallet',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.pallet'),
+        ),
+        migrations.AlterField(
+            model_name='productloadingphoto',
+            name='loading',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.productloading'),
+        ),
+        migrations.AlterField(
+            model_name='productmarkingphoto',
+            name='inspection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='marking_photos', to='app.inspection'),
+        ),
+        migrations.AlterField(
+            model_name='qualityinspectionphoto',
+            name='quality_inspection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.qualityinspection'),
+        ),
+        migrations.AlterField(
+            model_name='quantityinspectionphoto',
+            name='quantity_inspection',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='app.quantityinspection'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 15:27
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+TRIGRAM_INDEXES = (
+    ('inspector_name', 'inspection_inspector_trgm'),
+    ('car_number', 'inspection_car_number_trgm'),
+)
+
+
+def backfill(apps, schema_editor):
+    Inspection = apps.get_model('app', 'Inspection')
+    ProductLoading = apps.get_model('app', 'ProductLoading')
+    CustomUser = apps.get_model('app', 'CustomUser')
+
+    first_loading = (ProductLoading.objects
+                     .filter(inspection=OuterRef('pk'))
+                     .order_by('pk')
+                     .values('car_number')[:1])
+    Inspection.objects.update(car_number=Subquery(first_loading))
+    # как CustomUser.get_full_name(); пользователей немного — запрос на каждого
+    users = CustomUser.objects.filter(inspections__isnull=False).distinct()
+    for user in users.only('first_name', 'last_name'):
+        name = f'{user.first_name} {user.last_name}'.strip()[:255]
+        Inspection.objects.filter(inspector=user).update(inspector_name=name)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # поиск в админке по этим полям, см. 0009_index_plan
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    quote = schema_editor.quote_name
+    table = apps.get_model('app', 'Inspection')._meta.db_table
+    for column, name in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} '
+            f'USING gin (UPPER({quote(column)}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_index_plan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inspection',
+            name='car_number',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, null=True, verbose_name='Номер машины'),
+        ),
+        migrations.AddField(
+            model_name='inspection',
+            name='inspector_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255, verbose_name='ФИО инспектора'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
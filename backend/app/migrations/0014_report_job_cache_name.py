@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_report_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='reportjob',
+            name='file',
+        ),
+        migrations.AddField(
+            model_name='reportjob',
+            name='cache_name',
+            field=models.CharField(blank=True, max_length=255, verbose_name='Отчёт в кэше'),
+        ),
+    ]
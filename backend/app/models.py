@@ -1,9 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 import os
-import datetime
+import uuid
 from django.conf import settings
 
+from .storage import photo_storage
+
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
         ('inspector', 'Инспектор'),
@@ -15,40 +17,38 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+# подкаталог и поле владельца для каждой модели фото
+PHOTO_UPLOAD_DIRS = {
+    'MushroomPhoto':            ('placement',           'storage'),
+    'ProductMarkingPhoto':      ('marking',             'inspection'),
+    'QuantityInspectionPhoto':  ('quantity_inspection', 'quantity_inspection'),
+    'QualityInspectionPhoto':   ('quality_inspection',  'quality_inspection'),
+    'DiameterMeasurementPhoto': ('diameter',            'diameter_measurement'),
+    'PalletPhoto':              ('pallets',             'pallet'),
+    'ProductLoadingPhoto':      ('loading',             'loading'),
+}
+
+
 def inspection_photo_upload_path(instance, filename):
-    # определяем inspection
-    if hasattr(instance, 'inspection'):
-        insp = instance.inspection
-    elif hasattr(instance, 'storage'):
-        insp = instance.storage.inspection
-    elif hasattr(instance, 'loading'):
-        insp = instance.loading.inspection
-    elif hasattr(instance, 'quantity_inspection'):
-        insp = instance.quantity_inspection.inspection
-    elif hasattr(instance, 'quality_inspection'):
-        insp = instance.quality_inspection.inspection
-    elif hasattr(instance, 'diameter_measurement'):
-        insp = instance.diameter_measurement.inspection
-    elif hasattr(instance, 'pallet'):
-        insp = instance.pallet.inspection
-    else:
+    """
+    photos/<дата инспекции>/<раздел>/<имя>_<uuid>.<ext>
+
+    Загрузка создаёт фото с уже готовыми объектами раздела и инспекции
+    (photo_model(pallet=pallet) и т.п.), поэтому связи берутся из кэша
+    экземпляра без запросов. Короткий uuid делает имя уникальным без
+    проверки exists() (см. app/storage.py).
+    """
+    try:
+        sub, owner_field = PHOTO_UPLOAD_DIRS[instance.__class__.__name__]
+    except KeyError:
         raise ValueError("Cannot determine inspection")
+    owner = getattr(instance, owner_field)
+    insp = owner if owner_field == 'inspection' else owner.inspection
 
     date_str = insp.inspection_date.strftime("%Y-%m-%d")
-    time_str = datetime.datetime.now().strftime("%H-%M-%S")
-    base = f"photos/{date_str}_{time_str}"
-
-    sub = {
-        'MushroomPhoto': 'placement',
-        'ProductMarkingPhoto': 'marking',
-        'QuantityInspectionPhoto': 'quantity_inspection',
-        'QualityInspectionPhoto': 'quality_inspection',
-        'DiameterMeasurementPhoto': 'diameter',
-        'PalletPhoto': 'pallets',
-        'ProductLoadingPhoto': 'loading',
-    }.get(instance.__class__.__name__, 'other')
-
-    return os.path.join(base, sub, filename)
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    # длина имени ограничена max_length=100 поля ImageField
+    return f"photos/{date_str}/{sub}/{stem[:40]}_{uuid.uuid4().hex[:12]}{ext.lower()}"
 
 class Inspection(models.Model):
     inspection_date= models.DateField("Дата инспекции")
@@ -64,17 +64,22 @@ class Inspection(models.Model):
         null=True,      # Позволяет хранить NULL в базе, если значение отсутствует
         blank=True      # Позволяет оставить поле пустым в формах и валидации
     )
-
-
-    @property
-    def inspector_name(self):
-        return f"{self.inspector.last_name} {self.inspector.first_name}"
-
-    @property
-    def car_number(self):
-        # берём первую (или единственную) загрузку
-        loading = self.product_loading.first()
-        return loading.car_number if loading else None
+    # копии для списка, сортировки и поиска без JOIN; обновляются сигналами
+    # при изменении инспектора и погрузок (app/signals.py)
+    inspector_name = models.CharField("ФИО инспектора", max_length=255, blank=True, default='',
+                                      editable=False, db_index=True)
+    car_number     = models.CharField("Номер машины", max_length=20, null=True, blank=True,
+                                      editable=False, db_index=True)
+    # меняются при любой записи в инспекцию, её разделы и фото (app/signals.py);
+    # по ним строятся ETag и Last-Modified
+    version    = models.PositiveIntegerField("Версия", default=1, editable=False)
+    updated_at = models.DateTimeField("Изменена", auto_now=True)
+
+    class Meta:
+        indexes = [
+            # курсорная пагинация списка (app/pagination.py)
+            models.Index(fields=['inspection_date', 'id'], name='inspection_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.car_number} — {self.job_number}"
@@ -103,20 +108,33 @@ class MushroomStorage(models.Model):
         return f"Размещение — {self.inspection}"
 
 class MushroomPhoto(models.Model):
-    storage     = models.ForeignKey(MushroomStorage, on_delete=models.CASCADE, related_name='photos')
-    image       = models.ImageField(upload_to=inspection_photo_upload_path)
+    storage     = models.ForeignKey(MushroomStorage, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image       = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage)
+    sha256      = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # фото одного раздела в порядке загрузки (bundle)
+        indexes = [models.Index(fields=['storage', 'uploaded_at', 'id'], name='mushroom_photo_owner_idx')]
+
 # 2. Маркировка товара
 class ProductMarkingZip(models.Model):
     inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='marking_zips')
     zip_photos = models.FileField(upload_to='zips/marking', verbose_name="ZIP с фото маркировки")
 
 class ProductMarkingPhoto(models.Model):
-    inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='marking_photos')
-    image      = models.ImageField(upload_to=inspection_photo_upload_path)
+    inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='marking_photos', db_index=False)
+    image      = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage)
+    sha256     = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at= models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id'], name='marking_photo_uploaded_idx'),
+            # фото одного раздела в порядке загрузки (фильтр ?inspection=, bundle)
+            models.Index(fields=['inspection', 'uploaded_at', 'id'], name='marking_photo_owner_idx'),
+        ]
+
 class Scale(models.Model):
     model = models.CharField("Модель весов", max_length=100)
     serial_number = models.CharField("Заводской номер весов", max_length=100, blank=True, null=True)
@@ -142,10 +160,18 @@ class Box(models.Model):
 
 
 class QuantityInspectionPhoto(models.Model):
-    quantity_inspection = models.ForeignKey(QuantityInspection, on_delete=models.CASCADE, related_name='photos')
-    image               = models.ImageField(upload_to=inspection_photo_upload_path)
+    quantity_inspection = models.ForeignKey(QuantityInspection, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image               = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage)
+    sha256              = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at         = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id'], name='quantity_photo_uploaded_idx'),
+            # фото одного раздела в порядке загрузки (фильтр ?inspection=, bundle)
+            models.Index(fields=['quantity_inspection', 'uploaded_at', 'id'], name='quantity_photo_owner_idx'),
+        ]
+
 # 4. Инспекция качества товара
 class QualityInspection(models.Model):
     inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='quality_inspections')
@@ -184,30 +210,51 @@ class QualityInspection(models.Model):
         return f"Качество — {self.inspection}"
 
 class QualityInspectionPhoto(models.Model):
-    quality_inspection = models.ForeignKey(QualityInspection, on_delete=models.CASCADE, related_name='photos')
-    image              = models.ImageField(upload_to=inspection_photo_upload_path)
+    quality_inspection = models.ForeignKey(QualityInspection, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image              = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage)
+    sha256             = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at        = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id'], name='quality_photo_uploaded_idx'),
+            # фото одного раздела в порядке загрузки (фильтр ?inspection=, bundle)
+            models.Index(fields=['quality_inspection', 'uploaded_at', 'id'], name='quality_photo_owner_idx'),
+        ]
+
 # 5. Замер диаметра грибов
 class DiameterMeasurement(models.Model):
     inspection      = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='diameter_measurements')
     zip_photos      = models.FileField(upload_to='zips/diameter', null=True, blank=True)
 
 class DiameterMeasurementPhoto(models.Model):
-    diameter_measurement = models.ForeignKey(DiameterMeasurement, on_delete=models.CASCADE, related_name='photos')
-    image                = models.ImageField(upload_to=inspection_photo_upload_path)
+    diameter_measurement = models.ForeignKey(DiameterMeasurement, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image                = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage)
+    sha256               = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at          = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # фото одного раздела в порядке загрузки (bundle)
+        indexes = [models.Index(fields=['diameter_measurement', 'uploaded_at', 'id'], name='diameter_photo_owner_idx')]
+
 # 6. Фотографии палет и их вес
 class Pallet(models.Model):
     inspection    = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='pallets')
     zip_photos    = models.FileField(upload_to='zips/pallets', null=True, blank=True)
 
 class PalletPhoto(models.Model):
-    pallet      = models.ForeignKey(Pallet, on_delete=models.CASCADE, related_name='photos')
-    image       = models.ImageField(upload_to=inspection_photo_upload_path, null=True, blank=True)
+    pallet      = models.ForeignKey(Pallet, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image       = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage, null=True, blank=True)
+    sha256      = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at', 'id'], name='pallet_photo_uploaded_idx'),
+            # фото одного раздела в порядке загрузки (фильтр ?inspection=, bundle)
+            models.Index(fields=['pallet', 'uploaded_at', 'id'], name='pallet_photo_owner_idx'),
+        ]
+
 # 7. Погрузка товара
 class ProductLoading(models.Model):
     inspection           = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name="product_loading")
@@ -220,6 +267,94 @@ class ProductLoading(models.Model):
     zip_photos           = models.FileField(upload_to='zips/loading', null=True, blank=True)
 
 class ProductLoadingPhoto(models.Model):
-    loading     = models.ForeignKey(ProductLoading, on_delete=models.CASCADE, related_name='photos')
-    image       = models.ImageField(upload_to=inspection_photo_upload_path, null=True, blank=True)
+    loading     = models.ForeignKey(ProductLoading, on_delete=models.CASCADE, related_name='photos', db_index=False)
+    image       = models.ImageField(upload_to=inspection_photo_upload_path, storage=photo_storage, null=True, blank=True)
+    sha256      = models.CharField("sha256 содержимого", max_length=64, blank=True, db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # фото одного раздела в порядке загрузки (bundle)
+        indexes = [models.Index(fields=['loading', 'uploaded_at', 'id'], name='loading_photo_owner_idx')]
+
+
+# Фото-разделы инспекции: вид -> (модель раздела, модель фото, поле-владелец).
+# У маркировки нет своей строки раздела: фото принадлежат самой инспекции.
+PHOTO_KINDS = {
+    'placement': (MushroomStorage,     MushroomPhoto,            'storage'),
+    'marking':   (None,                ProductMarkingPhoto,      'inspection'),
+    'quantity':  (QuantityInspection,  QuantityInspectionPhoto,  'quantity_inspection'),
+    'quality':   (QualityInspection,   QualityInspectionPhoto,   'quality_inspection'),
+    'diameter':  (DiameterMeasurement, DiameterMeasurementPhoto, 'diameter_measurement'),
+    'pallet':    (Pallet,              PalletPhoto,              'pallet'),
+    'loading':   (ProductLoading,      ProductLoadingPhoto,      'loading'),
+}
+
+# Фоновая загрузка полной инспекции
+class IngestJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Обрабатывается'),
+        ('done',    'Готово'),
+        ('failed',  'Ошибка'),
+    ]
+    status     = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='pending')
+    # вложенные данные формы; файлы заменены на имена в хранилище
+    payload    = models.JSONField("Данные формы", default=dict)
+    # {раздел: {"done": n, "total": m}}
+    progress   = models.JSONField("Прогресс", default=dict)
+    inspection = models.ForeignKey(Inspection, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='ingest_jobs')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='ingest_jobs')
+    client_key = models.CharField("Idempotency-Key клиента", max_length=100,
+                                  null=True, blank=True, unique=True)
+    error      = models.TextField("Ошибка", blank=True)
+    # обработчик отмечается, пока задача running; давняя отметка — процесс упал
+    heartbeat_at = models.DateTimeField("Обработчик на связи", null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Загрузка #{self.pk} — {self.get_status_display()}"
+
+
+# Фоновая сборка отчёта .docx (см. app/reports.py)
+class ReportJob(models.Model):
+    STATUS_CHOICES = IngestJob.STATUS_CHOICES
+    status     = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='pending')
+    inspection = models.ForeignKey(Inspection, on_delete=models.CASCADE, related_name='report_jobs')
+    # {параметр запроса: [id фото, ...]}, id отсортированы
+    photo_ids  = models.JSONField("Выбранные фото", default=dict)
+    # готовый отчёт: путь внутри REPORT_CACHE_DIR (app/report_cache.py)
+    cache_name = models.CharField("Отчёт в кэше", max_length=255, blank=True)
+    error      = models.TextField("Ошибка", blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='report_jobs')
+    # как у IngestJob: отметка обработчика, пока задача running
+    heartbeat_at = models.DateTimeField("Обработчик на связи", null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Отчёт #{self.pk} — {self.get_status_display()}"
+
+
+# Докачиваемая загрузка архива кусками (см. app/uploads.py)
+class ChunkedUpload(models.Model):
+    STATUS_CHOICES = [
+        ('uploading', 'Загружается'),
+        ('complete',  'Загружен'),
+    ]
+    id         = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename   = models.CharField("Имя файла", max_length=255)
+    size       = models.BigIntegerField("Размер, байт")
+    offset     = models.BigIntegerField("Принято байт", default=0)
+    sha256     = models.CharField("sha256 всего файла", max_length=64, blank=True)
+    status     = models.CharField("Статус", max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL,
+                                   null=True, blank=True, related_name='chunked_uploads')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,102 @@
+# app/multipart.py
+"""
+Разбор плоских ключей multipart-формы полной инспекции.
+
+Angular отправляет вложенные данные ключами вида
+    section[i].field
+    section[i].boxes[n].field
+Все ключи разбираются за один проход, без перебора индексов и без
+ограничений на количество разделов или ящиков.
+
+Префикс ключа (всё до последней точки) разбирается один раз: у ящика
+несколько полей, и остальные ключи с тем же префиксом находят свой
+словарь одним поиском в кэше.
+
+По скорости разбор не выигрывает у прежних циклов: на 3×1500 ящиков
+(9000 ключей) он на 10–50% медленнее, на обычных формах — вровень, и в
+любом случае это несколько процентов от разбора самого multipart-тела
+Django (~470 мс на тех же 9000 полях). Смысл в другом: прежние циклы
+теряли ящики после 20-го, разделы с пропусками в индексах и поля, которых
+не знали.
+"""
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ValidationError
+
+
+def _ordered(items):
+    """{индекс: значение} -> список в порядке индексов."""
+    return [items[i] for i in sorted(items)]
+
+
+def _split_index(part):
+    """'boxes[12]' -> ('boxes', 12); None, если часть другого вида."""
+    name, bracket, index = part.partition('[')
+    if bracket and index[-1:] == ']' and index[:-1].isdecimal() and name.isidentifier():
+        return name, int(index[:-1])
+    return None
+
+
+def _conflict(key):
+    return ValidationError({key: "Поле не может быть одновременно значением и списком"})
+
+
+def _last_values(data):
+    # как QueryDict.__getitem__, но без вызова метода на каждый ключ
+    if isinstance(data, MultiValueDict):
+        for key, values in dict.items(data):
+            yield key, values[-1] if values else []
+    else:
+        yield from data.items()
+
+
+def parse_nested_keys(data):
+    """
+    Возвращает (root, sections):
+      root     — ключи без индексов, например inspection_date;
+      sections — {section: [item, ...]}, вложенные списки (boxes и т.п.)
+                 уже собраны в item[field] = [{...}, ...].
+
+    Для multipart-запроса DRF request.data уже содержит и поля, и файлы,
+    поэтому достаточно одного словаря. Если поле раздела пришло и значением,
+    и списком (x[0].boxes и x[0].boxes[0].f), — ValidationError.
+    """
+    root = {}
+    tree = {}
+    # префикс ключа -> словарь, куда пишутся его поля
+    targets = {}
+    for key, value in _last_values(data):
+        prefix, _, field = key.rpartition('.')
+        target = targets.get(prefix) if field.isidentifier() else None
+        if target is None and field.isidentifier():
+            head, _, tail = prefix.partition('.')
+            sub = _split_index(tail) if tail else None
+            if not tail or sub is not None:
+                target = targets.get(head)
+                if target is None:
+                    parsed = _split_index(head)
+                    if parsed is not None:
+                        target = tree.setdefault(parsed[0], {}).setdefault(parsed[1], {})
+                        targets[head] = target
+            if target is not None and sub is not None:
+                nested = target.setdefault(sub[0], {})
+                if not isinstance(nested, dict):
+                    raise _conflict(key)
+                target = nested.setdefault(sub[1], {})
+            if target is not None:
+                targets[prefix] = target
+        if target is None:
+            root[key] = value
+            continue
+        # повтор поля возможен только при совпадении имени со вложенным списком
+        if field in target:
+            raise _conflict(key)
+        target[field] = value
+
+    sections = {}
+    for name, items in tree.items():
+        sections[name] = [
+            {field: _ordered(value) if isinstance(value, dict) else value
+             for field, value in item.items()}
+            for item in _ordered(items)
+        ]
+    return root, sections
@@ -0,0 +1,24 @@
+# app/pagination.py
+"""
+Курсорная (keyset) пагинация: следующая страница выбирается условием
+«после последней строки», а не OFFSET, поэтому сотая страница стоит
+столько же, сколько первая. Ответ: {next, previous, results}.
+
+Порядок совпадает с составными индексами в Meta.indexes моделей;
+id — второй ключ, чтобы порядок был однозначным при равных датах.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class InspectionPagination(CursorPagination):
+    ordering = ('-inspection_date', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class PhotoPagination(CursorPagination):
+    ordering = ('uploaded_at', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,118 @@
+# app/reference.py
+"""
+Кэш справочников: термометры и весы.
+
+Таблицы маленькие и меняются редко, а читаются при каждом открытии формы
+инспекции. Список хранится в кэше Django (CACHES), ключ включает
+«поколение» справочника. Сигналы save/delete (app/signals.py) меняют
+поколение, и все процессы, читающие тот же кэш, перестают видеть старые
+данные.
+
+С кэшем в памяти процесса (по умолчанию) поколение у каждого воркера своё,
+и сброс виден только записавшему процессу; остальные получают свежий
+список по истечении REFERENCE_CACHE_TIMEOUT, который в этом случае короткий
+(см. settings.py).
+
+Поиск весов по (модель, номер, дата поверки) идёт по словарю в памяти
+процесса, который перестраивается одним запросом при смене поколения.
+Словарь может отставать от БД, поэтому найденный id перепроверяется
+запросом по первичному ключу.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.dateparse import parse_date
+
+from .models import Scale
+
+
+def _generation_key(name):
+    return f'reference:{name}:generation'
+
+
+def generation(name):
+    """Текущее поколение справочника; новое, если ключ вытеснен из кэша."""
+    value = cache.get(_generation_key(name))
+    if value is None:
+        value = uuid.uuid4().hex
+        # add: если другой процесс успел раньше, берём его значение
+        if not cache.add(_generation_key(name), value, None):
+            value = cache.get(_generation_key(name), value)
+    return value
+
+
+def invalidate(name):
+    cache.set(_generation_key(name), uuid.uuid4().hex, None)
+
+
+def cached_list(name, build):
+    """Данные списка справочника; build() вызывается только при промахе."""
+    key = f'reference:{name}:list:{generation(name)}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.REFERENCE_CACHE_TIMEOUT)
+    return data
+
+
+# Весы в памяти процесса: (поколение, {(модель, номер, дата): id});
+# кортеж заменяется целиком, поэтому читать его можно без блокировки
+_scales = (None, {})
+_scales_lock = threading.Lock()
+
+
+def _scale_key(model, serial_number, calibration_date):
+    if isinstance(calibration_date, str):
+        calibration_date = parse_date(calibration_date) if calibration_date else None
+    return (model, serial_number, calibration_date)
+
+
+def _scale_ids(current):
+    global _scales
+    with _scales_lock:
+        if _scales[0] != current:
+            ids = {
+                (s.model, s.serial_number, s.calibration_date): s.pk
+                for s in Scale.objects.only('model', 'serial_number', 'calibration_date')
+            }
+            _scales = (current, ids)
+        return _scales[1]
+
+
+def _forget_scales():
+    global _scales
+    with _scales_lock:
+        _scales = (None, {})
+
+
+def scale_id(model, serial_number=None, calibration_date=None):
+    """
+    id весов с такими данными; создаёт запись, если её нет
+    (как Scale.objects.get_or_create).
+    """
+    try:
+        key = _scale_key(model, serial_number, calibration_date)
+    except ValueError:
+        key = None  # некорректную дату пусть разбирает сама БД
+
+    if key is not None:
+        current = generation('scale')
+        loaded, ids = _scales
+        if loaded != current:
+            ids = _scale_ids(current)
+        pk = ids.get(key)
+        if pk is not None:
+            # весы могли удалить или исправить в другом процессе
+            if Scale.objects.filter(pk=pk, model=key[0], serial_number=key[1],
+                                    calibration_date=key[2]).exists():
+                return pk
+            _forget_scales()
+
+    scale, _ = Scale.objects.get_or_create(
+        model=model,
+        serial_number=serial_number,
+        calibration_date=calibration_date,
+    )
+    return scale.pk
@@ -0,0 +1,72 @@
+# app/report_cache.py
+"""
+Дисковый кэш готовых отчётов .docx.
+
+Ключ — id инспекции, её версия (Inspection.version, растёт при любой
+правке инспекции, разделов и фото) и отсортированные списки выбранных
+фото. Повторный запрос того же отчёта не собирает документ заново.
+Задачи (ReportJob.cache_name) ссылаются прямо на файл кэша, и скачивание
+отдаёт его оттуда — других копий отчёта на диске нет.
+
+Файлы лежат в REPORT_CACHE_DIR/<id инспекции>/<версия>-<хэш>.docx. При
+записи отчёта новой версии файлы старых версий той же инспекции
+удаляются сразу; общий размер ограничен REPORT_CACHE_MAX_BYTES
+(вытесняются давно не запрашиваемые).
+"""
+import hashlib
+import json
+import os
+
+from django.conf import settings
+
+from .disk_cache import DiskUsage, touch, write_atomic
+
+_usage = DiskUsage('REPORT_CACHE_DIR', 'REPORT_CACHE_MAX_BYTES')
+
+
+def report_cache_path(inspection_id, version, photo_ids):
+    params = json.dumps({k: sorted(v) for k, v in photo_ids.items() if v}, sort_keys=True)
+    digest = hashlib.sha1(params.encode()).hexdigest()
+    return os.path.join(settings.REPORT_CACHE_DIR, str(inspection_id), f'{version}-{digest}.docx')
+
+
+def get_cached_report(path):
+    """path, если отчёт есть в кэше (и отмечает обращение), иначе None."""
+    return path if touch(path) else None
+
+
+def store_report(path, data):
+    write_atomic(path, data)
+    _usage.account(len(data), keep=path)
+    # отчёты прежних версий этой инспекции больше никогда не запросят
+    directory, current = os.path.split(path)
+    version = current.split('-', 1)[0]
+    for entry in os.scandir(directory):
+        # временные файлы параллельной записи (не .docx) не трогаем
+        if entry.name.endswith('.docx') and entry.name.split('-', 1)[0] != version:
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            _usage.forget(size)
+    return path
+
+
+def cache_name(path):
+    """Путь файла кэша относительно REPORT_CACHE_DIR (для ReportJob.cache_name)."""
+    return os.path.relpath(path, settings.REPORT_CACHE_DIR)
+
+
+def open_cached_report(name):
+    """
+    Открывает отчёт по cache_name и отмечает обращение; None, если он уже
+    вытеснен. Открытый файл можно дочитать, даже если его тут же вытеснят.
+    """
+    path = os.path.join(settings.REPORT_CACHE_DIR, name)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    touch(path)
+    return f
@@ -7,7 +7,9 @@ from docx.oxml.ns import qn
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from datetime import date
 
-logger = logging.getLogger(__name__)
+from django.conf import settings
+
+from .imaging import ensure_derivative
 from .models import (
     Inspection,
     MushroomStorage,
@@ -27,6 +29,19 @@ from .models import (
     Thermometer,
 )
 
+logger = logging.getLogger(__name__)
+
+
+def add_photo(run, photo):
+    """
+    Вставляет фото шириной REPORT_IMAGE_WIDTH_INCHES. Берётся копия report,
+    уже уменьшенная до печатного размера: python-docx встраивает файл
+    как есть, и оригинал на 5–10 МБ раздул бы документ.
+    """
+    storage = photo.image.storage
+    with storage.open(ensure_derivative(photo.image.name, 'report', storage)) as f:
+        run.add_picture(f, width=Inches(settings.REPORT_IMAGE_WIDTH_INCHES))
+
 
 def generate_inspection_report(inspection_id,
                                placement_ids=None,
@@ -247,7 +262,7 @@ def generate_inspection_report(inspection_id,
                 r, c = divmod(idx, cols)
                 cell = table.cell(r, c)
                 run = cell.paragraphs[0].add_run()
-                run.add_picture(photo.image.path, width=Inches(4))
+                add_photo(run, photo)
         else:
             doc.add_page_break()
             doc.add_paragraph("Пользователь не выбрал ни одного фото для отчёта.")
@@ -278,7 +293,7 @@ def generate_inspection_report(inspection_id,
                     r, c = divmod(idx, cols)
                     cell = table.cell(r, c)
                     run = cell.paragraphs[0].add_run()
-                    run.add_picture(photo.image.path, width=Inches(4))
+                    add_photo(run, photo)
 
         # раздел 3
         doc.add_page_break()
@@ -318,7 +333,7 @@ def generate_inspection_report(inspection_id,
             for idx, photo in enumerate(qty_photos):
                 r, c = divmod(idx, cols)
                 cell = table.cell(r, c)
-                cell.paragraphs[0].add_run().add_picture(photo.image.path, width=Inches(4))
+                add_photo(cell.paragraphs[0].add_run(), photo)
         else:
             doc.add_paragraph("Пользователь не выбрал фото для раздела 3.")
 
@@ -412,7 +427,7 @@ def generate_inspection_report(inspection_id,
                 r, c = divmod(idx, cols)
                 cell = table.cell(r, c)
                 run = cell.paragraphs[0].add_run()
-                run.add_picture(photo.image.path, width=Inches(4))
+                add_photo(run, photo)
         else:
             doc.add_paragraph("Пользователь не выбрал ни одного фото для раздела 4.")
 
@@ -501,7 +516,7 @@ def generate_inspection_report(inspection_id,
                 cell = table.cell(r, c)
                 run.bold = True
                 # само изображение
-                cell.paragraphs[0].add_run().add_picture(photo.image.path, width=Inches(4))
+                add_photo(cell.paragraphs[0].add_run(), photo)
         else:
             doc.add_paragraph("Пользователь не выбрал ни одной фотографии палет.")
 
@@ -557,7 +572,7 @@ def generate_inspection_report(inspection_id,
                 r, c = divmod(idx, cols)
                 cell = table.cell(r, c)
                 # само изображение
-                cell.paragraphs[0].add_run().add_picture(photo.image.path, width=Inches(4))
+                add_photo(cell.paragraphs[0].add_run(), photo)
         else:
             doc.add_paragraph("Пользователь не выбрал ни одной фотографии погрузки.")
 
@@ -626,6 +641,6 @@ def generate_inspection_report(inspection_id,
 
         return doc, insp.inspection_date
 
-    except Exception as e:
-        print(f"Error in generating report for inspection {inspection_id}: {e}")
+    except Exception:
+        logger.exception("Error in generating report for inspection %s", inspection_id)
         raise
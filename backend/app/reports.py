@@ -0,0 +1,186 @@
+# app/reports.py
+"""
+Очередь сборки отчётов .docx (ReportJob).
+
+POST /generate-report/<id>/ только ставит задачу и отвечает 202; отчёт
+собирают обработчики. Внутри веб-процесса (REPORT_RUN_IN_PROCESS) их не
+больше REPORT_MAX_CONCURRENCY, поэтому тяжёлые отчёты не занимают все
+потоки API. Если False — запускайте отдельно
+`manage.py process_report_jobs --loop`, по процессу на каждый слот.
+
+Статус — GET /api/report-jobs/<id>/, файл — .../download/ (прямо из кэша;
+если отчёт уже вытеснен, задача ставится в очередь заново).
+
+Готовые отчёты кэшируются (app/report_cache.py): если такой же отчёт по
+той же версии инспекции уже собирали, задача создаётся сразу готовой.
+
+Брошенные упавшим процессом задачи забираются заново, а обработчик
+запускается и запросом статуса — так же, как у загрузок (app/jobs.py).
+"""
+import logging
+import threading
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .jobs import Heartbeat, claimable
+from .models import Inspection, ReportJob
+from .report_cache import cache_name, get_cached_report, report_cache_path, store_report
+from .report_generator import generate_inspection_report
+
+logger = logging.getLogger(__name__)
+
+# параметр запроса -> аргумент generate_inspection_report
+REPORT_PHOTO_PARAMS = {
+    'placement_photo_ids': 'placement_ids',
+    'marking_photo_ids':   'marking_ids',
+    'quantity_photo_ids':  'quantity_photo_ids',
+    'quality_photo_ids':   'quality_photo_ids',
+    'pallet_photo_ids':    'pallet_photo_ids',
+    'loading_photo_ids':   'loading_ids',
+}
+
+
+def parse_photo_ids(body):
+    """
+    {параметр: отсортированные id} из тела запроса;
+    ValueError, если значение — не список целых.
+    """
+    photo_ids = {}
+    for param in REPORT_PHOTO_PARAMS:
+        value = body.get(param)
+        if value is None:
+            continue
+        if not isinstance(value, list):
+            raise ValueError(f"{param}: ожидается список id")
+        try:
+            photo_ids[param] = sorted({int(v) for v in value})
+        except (TypeError, ValueError):
+            raise ValueError(f"{param}: ожидается список id")
+    return photo_ids
+
+
+def report_file_name(inspection_id, inspection_date):
+    """Имя файла при скачивании."""
+    return f"{inspection_date:%Y-%m-%d}_{inspection_id}.docx"
+
+
+def enqueue_report_job(inspection, photo_ids, user=None):
+    """
+    Задача сборки отчёта; inspection — с загруженной version. Если отчёт
+    есть в кэше, задача сразу готова.
+    """
+    job = ReportJob(
+        inspection=inspection,
+        photo_ids=photo_ids,
+        created_by=user if getattr(user, 'is_authenticated', False) else None,
+    )
+    cached = get_cached_report(report_cache_path(inspection.pk, inspection.version, photo_ids))
+    if cached:
+        job.status = 'done'
+        job.cache_name = cache_name(cached)
+    job.save()
+    if job.status == 'pending' and settings.REPORT_RUN_IN_PROCESS:
+        transaction.on_commit(start_report_worker)
+    return job
+
+
+def requeue_report_job(job):
+    """Собирает заново отчёт готовой задачи, вытесненный из кэша."""
+    job.status = 'pending'
+    job.cache_name = ''
+    job.save(update_fields=['status', 'cache_name', 'updated_at'])
+    if settings.REPORT_RUN_IN_PROCESS:
+        transaction.on_commit(start_report_worker)
+
+
+def claim_next_report_job():
+    """Забирает самую старую задачу; параллельные обработчики её пропустят."""
+    with transaction.atomic():
+        job = (ReportJob.objects
+               .select_for_update(skip_locked=True)
+               .filter(claimable())
+               .order_by('id')
+               .first())
+        if job is None:
+            return None
+        if job.status == 'running':
+            logger.warning("Report job %s: worker lost, running again", job.pk)
+        job.status = 'running'
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'heartbeat_at', 'updated_at'])
+    return job
+
+
+def build_report(job):
+    """Байты .docx для задачи."""
+    kwargs = {REPORT_PHOTO_PARAMS[param]: ids for param, ids in job.photo_ids.items()}
+    doc, _ = generate_inspection_report(job.inspection_id, **kwargs)
+    buf = BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def run_report_job(job):
+    try:
+        # версию читаем до сборки: правка во время сборки даст новый ключ
+        version = Inspection.objects.filter(pk=job.inspection_id).values_list('version', flat=True).get()
+        path = report_cache_path(job.inspection_id, version, job.photo_ids)
+        if not get_cached_report(path):
+            with Heartbeat(ReportJob, job.pk):
+                data = build_report(job)
+            store_report(path, data)
+        job.cache_name = cache_name(path)
+        job.status = 'done'
+        job.error = ''
+    except Exception as e:
+        logger.exception("Report job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = f"{type(e).__name__}: {e}"
+    job.save(update_fields=['status', 'cache_name', 'error', 'updated_at'])
+    return job
+
+
+def run_pending_report_jobs():
+    """Собирает отчёты, пока очередь не опустеет. Возвращает их число."""
+    count = 0
+    while True:
+        job = claim_next_report_job()
+        if job is None:
+            return count
+        run_report_job(job)
+        count += 1
+
+
+# Обработчики внутри процесса: не больше REPORT_MAX_CONCURRENCY потоков.
+# Если все заняты, новая задача достанется первому освободившемуся.
+_worker_lock = threading.Lock()
+_worker_state = {'running': 0, 'wakeup': False}
+
+
+def start_report_worker():
+    with _worker_lock:
+        if _worker_state['running'] >= settings.REPORT_MAX_CONCURRENCY:
+            _worker_state['wakeup'] = True
+            return
+        _worker_state['running'] += 1
+    threading.Thread(target=_worker_loop, name='report-worker', daemon=True).start()
+
+
+def _worker_loop():
+    try:
+        while True:
+            run_pending_report_jobs()
+            with _worker_lock:
+                if not _worker_state['wakeup']:
+                    _worker_state['running'] -= 1
+                    return
+                _worker_state['wakeup'] = False
+    except Exception:
+        logger.exception("Report worker stopped")
+        with _worker_lock:
+            _worker_state['running'] -= 1
+    finally:
+        connection.close()
@@ -1,20 +1,53 @@
-import zipfile, os
-from io import BytesIO
-from django.core.files.base import ContentFile
+import logging
+import zipfile
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
+from .imaging import derivative_or_original
+from .ingest import PhotoIngest, extract_zip_photos
 from .models import *
-from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DerivativeURLField(serializers.Field):
+    """
+    URL уменьшенной копии фото, созданной при загрузке (см. app/imaging.py);
+    URL оригинала, если копии нет.
+    """
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        kwargs.setdefault('source', 'image')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = value.storage.url(derivative_or_original(value.name, self.kind, value.storage))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class PhotoDerivativesMixin(serializers.Serializer):
+    thumbnail    = DerivativeURLField('thumb')
+    screen       = DerivativeURLField('screen')
+    report_image = DerivativeURLField('report')
+
+DERIVATIVE_FIELDS = ('thumbnail', 'screen', 'report_image')
 
 # 1. Размещение
-class MushroomPhotoSerializer(serializers.ModelSerializer):
+class MushroomPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = MushroomPhoto
-        fields = ('id','image')
+        fields = ('id','image') + DERIVATIVE_FIELDS
 
-class ProductMarkingPhotoSerializer(serializers.ModelSerializer):
+class ProductMarkingPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductMarkingPhoto
-        fields = ('id', 'image', 'uploaded_at')
+        fields = ('id', 'image', 'uploaded_at') + DERIVATIVE_FIELDS
 
 class ThermometerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -39,13 +72,7 @@ class MushroomStorageSerializer(serializers.ModelSerializer):
         zip_file = validated_data.pop('zip_photos', None)
         storage = MushroomStorage.objects.create(**validated_data)
         if zip_file:
-            with zipfile.ZipFile(zip_file) as zf:
-                for name in zf.namelist():
-                    if name.lower().endswith(('.jpg','.png','.jpeg')):
-                        data = zf.read(name)
-                        fn = os.path.basename(name)
-                        photo = MushroomPhoto(storage=storage)
-                        photo.image.save(fn, ContentFile(data), save=True)
+            extract_zip_photos(zip_file, MushroomPhoto, self.context.get('ingest'), storage=storage)
         return storage
 
 # 2. Маркировка
@@ -59,13 +86,7 @@ class ProductMarkingZipSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         zip_file = validated_data.pop('zip_photos')
         obj = ProductMarkingZip.objects.create(**validated_data)
-        with zipfile.ZipFile(zip_file) as zf:
-            for name in zf.namelist():
-                if name.lower().endswith(('.jpg','.png')):
-                    data = zf.read(name)
-                    fn = os.path.basename(name)
-                    pm = ProductMarkingPhoto(inspection=obj.inspection)
-                    pm.image.save(fn, ContentFile(data), save=True)
+        extract_zip_photos(zip_file, ProductMarkingPhoto, self.context.get('ingest'), inspection=obj.inspection)
         return obj
 
 class ScaleSerializer(serializers.ModelSerializer):
@@ -79,10 +100,10 @@ class BoxSerializer(serializers.ModelSerializer):
         model = Box
         fields = ('net_weight','defect_weight')
 
-class QuantityInspectionPhotoSerializer(serializers.ModelSerializer):
+class QuantityInspectionPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = QuantityInspectionPhoto
-        fields = ('id', 'image', 'uploaded_at')
+        fields = ('id', 'image', 'uploaded_at') + DERIVATIVE_FIELDS
 
 class QuantityInspectionSerializer(serializers.ModelSerializer):
     boxes = BoxSerializer(many=True)
@@ -102,30 +123,23 @@ class QuantityInspectionSerializer(serializers.ModelSerializer):
         boxes_data = validated_data.pop('boxes', [])
         qi = QuantityInspection.objects.create(**validated_data)
 
-        # создаём Box
-        for box in boxes_data:
-            Box.objects.create(quantity_inspection=qi, **box)
+        # создаём Box одним запросом
+        Box.objects.bulk_create(
+            [Box(quantity_inspection=qi, **box) for box in boxes_data],
+            batch_size=settings.PHOTO_BULK_CREATE_BATCH_SIZE,
+        )
 
         # распаковываем фото из архива, если он был
         if zip_file:
-            import zipfile
-            from django.core.files.base import ContentFile
-
-            with zipfile.ZipFile(zip_file) as zf:
-                for name in zf.namelist():
-                    if name.lower().endswith(('.jpg', '.jpeg', '.png')):
-                        data = zf.read(name)
-                        fn = os.path.basename(name)
-                        ph = QuantityInspectionPhoto(quantity_inspection=qi)
-                        ph.image.save(fn, ContentFile(data), save=True)
+            extract_zip_photos(zip_file, QuantityInspectionPhoto, self.context.get('ingest'), quantity_inspection=qi)
 
         return qi
 
 # 4. Качество
-class QualityInspectionPhotoSerializer(serializers.ModelSerializer):
+class QualityInspectionPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = QualityInspectionPhoto
-        fields = ('id', 'image', 'uploaded_at')
+        fields = ('id', 'image', 'uploaded_at') + DERIVATIVE_FIELDS
 
 
 class QualityInspectionSerializer(serializers.ModelSerializer):
@@ -137,13 +151,7 @@ class QualityInspectionSerializer(serializers.ModelSerializer):
         zip_file = validated_data.pop('zip_photos', None)
         ql = QualityInspection.objects.create(**validated_data)
         if zip_file:
-            with zipfile.ZipFile(zip_file) as zf:
-                for name in zf.namelist():
-                    if name.lower().endswith(('.jpg','.png')):
-                        data = zf.read(name)
-                        fn = os.path.basename(name)
-                        ph = QualityInspectionPhoto(quality_inspection=ql)
-                        ph.image.save(fn, ContentFile(data), save=True)
+            extract_zip_photos(zip_file, QualityInspectionPhoto, self.context.get('ingest'), quality_inspection=ql)
         return ql
 
 # 5. Диаметр
@@ -156,13 +164,7 @@ class DiameterMeasurementSerializer(serializers.ModelSerializer):
         zip_file = validated_data.pop('zip_photos', None)
         dm = DiameterMeasurement.objects.create(**validated_data)
         if zip_file:
-            with zipfile.ZipFile(zip_file) as zf:
-                for name in zf.namelist():
-                    if name.lower().endswith(('.jpg','.png')):
-                        data = zf.read(name)
-                        fn = os.path.basename(name)
-                        ph = DiameterMeasurementPhoto(diameter_measurement=dm)
-                        ph.image.save(fn, ContentFile(data), save=True)
+            extract_zip_photos(zip_file, DiameterMeasurementPhoto, self.context.get('ingest'), diameter_measurement=dm)
         return dm
 
 # 6. Паллеты
@@ -174,55 +176,21 @@ class PalletSerializer(serializers.ModelSerializer):
         exclude = ['inspection']  # Исключаем поля, которые не должны быть переданы
 
     def create(self, validated_data):
-        print("1. Вызван метод create для паллеты с данными:", validated_data)
-
         zip_file = validated_data.pop('zip_photos', None)
-        print(f"2. Zip файл: {zip_file}")
-
-        # Создаем паллету
         pal = Pallet.objects.create(**validated_data)
-        print(f"3. Паллет с id {pal.id} успешно создан.")
-
-        # Проверяем, если есть zip-файл, распаковываем и сохраняем фотографии
         if zip_file:
-            print("4. Zip файл найден, начинаем распаковку...")
-
             try:
-                # Убедитесь, что директория существует
-                directory = os.path.join(settings.MEDIA_ROOT, 'zips/pallets')
-                os.makedirs(directory, exist_ok=True)
-                print(f"5. Директория для сохранения файлов: {directory}")
-
-                # Распаковка zip-файла
-                with zipfile.ZipFile(zip_file) as zf:
-                    print(f"6. Содержимое zip-файла: {zf.namelist()}")
-                    for name in zf.namelist():
-                        if name.lower().endswith(('.jpg', '.png')):  # Проверка на изображение
-                            print(f"7. Обрабатываем файл: {name}")
-                            data = zf.read(name)
-                            fn = os.path.basename(name)
-
-                            # Сохраняем каждое изображение
-                            ph = PalletPhoto(pallet=pal)
-                            ph.image.save(fn, ContentFile(data), save=True)
-                            print(f"8. Фотография {fn} успешно сохранена.")
-
+                extract_zip_photos(zip_file, PalletPhoto, self.context.get('ingest'), pallet=pal)
             except zipfile.BadZipFile as e:
-                print(f"9. Ошибка при открытии ZIP-файла: {e}")
-            except Exception as e:
-                print(f"10. Ошибка при сохранении изображения: {e}")
-
-        else:
-            print("11. Zip файл не передан.")
-
+                logger.warning("Pallet %s: invalid ZIP archive: %s", pal.id, e)
         return pal
 
 
 # 7. Погрузка (ZIP & обычные фото)
-class ProductLoadingPhotoSerializer(serializers.ModelSerializer):
+class ProductLoadingPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = ProductLoadingPhoto
-        fields = ('id','image')
+        fields = ('id','image') + DERIVATIVE_FIELDS
 
 class ProductLoadingSerializer(serializers.ModelSerializer):
     thermometer = serializers.PrimaryKeyRelatedField(
@@ -241,31 +209,63 @@ class ProductLoadingSerializer(serializers.ModelSerializer):
         zip_file = validated_data.pop('zip_photos', None)
         photos   = validated_data.pop('photos', [])
         pl = ProductLoading.objects.create(**validated_data)
-        for p in photos:
-            ProductLoadingPhoto.objects.create(loading=pl, **p)
+        ProductLoadingPhoto.objects.bulk_create(
+            [ProductLoadingPhoto(loading=pl, **p) for p in photos])
         if zip_file:
-            with zipfile.ZipFile(zip_file) as zf:
-                for name in zf.namelist():
-                    if name.lower().endswith(('.jpg','.png')):
-                        data = zf.read(name)
-                        fn = os.path.basename(name)
-                        ph = ProductLoadingPhoto(loading=pl)
-                        ph.image.save(fn, ContentFile(data), save=True)
+            extract_zip_photos(zip_file, ProductLoadingPhoto, self.context.get('ingest'), loading=pl)
         return pl
 
-class PalletPhotoSerializer(serializers.ModelSerializer):
+class PalletPhotoSerializer(PhotoDerivativesMixin, serializers.ModelSerializer):
     class Meta:
         model = PalletPhoto
-        fields = ('id', 'image', 'uploaded_at', 'pallet')
+        fields = ('id', 'image', 'uploaded_at', 'pallet') + DERIVATIVE_FIELDS
+
+def parse_field_list(value):
+    """'a, b,c' -> {'a', 'b', 'c'}; None, если параметр не передан."""
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Обрезает дерево полей при чтении:
+      fields — какие поля оставить (None — все);
+      expand — какие вложенные разделы (SECTIONS) отдавать.
+    Раздел, явно перечисленный в fields, тоже считается раскрытым.
+    """
+    SECTIONS = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+        expand = expand or set()
+        for name in list(self.fields):
+            if name in self.SECTIONS:
+                keep = name in expand or (fields is not None and name in fields)
+            else:
+                keep = fields is None or name in fields
+            if not keep:
+                self.fields.pop(name)
+
 
 # Главный сериализатор
-class FullInspectionSerializer(serializers.ModelSerializer):
+class FullInspectionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    SECTIONS = (
+        'mushroom_storage',
+        'marking_zips',
+        'quantity_inspections',
+        'quality_inspections',
+        'diameter_measurements',
+        'pallets',
+        'product_loading',
+    )
+
     inspector = serializers.PrimaryKeyRelatedField(
         queryset=CustomUser.objects.all(),
         write_only=True
     )
-    inspector_name = serializers.SerializerMethodField(read_only=True)
-    car_number = serializers.SerializerMethodField(read_only=True)
     mushroom_storage      = MushroomStorageSerializer(many=True)
     marking_zips          = ProductMarkingZipSerializer(many=True, required=False)
     quantity_inspections  = QuantityInspectionSerializer(many=True, required=False)
@@ -278,15 +278,7 @@ class FullInspectionSerializer(serializers.ModelSerializer):
         model = Inspection
         fields = '__all__'
 
-    def get_inspector_name(self, obj):
-        return obj.inspector.get_full_name()
-
-    def get_car_number(self, obj):
-        # берём первую (или единственную) запись из product_loading
-        loading = obj.product_loading.first()
-        return loading.car_number if loading else None
-        # не забываем вернуть значение!
-
+    @transaction.atomic
     def create(self, validated_data):
         sections = {
             'mushroom_storage':      (MushroomStorageSerializer,   'mushroom_storage'),
@@ -304,10 +296,59 @@ class FullInspectionSerializer(serializers.ModelSerializer):
             job_number     = validated_data.pop('job_number'),
         )
 
-        for key, (ser_cls, _) in sections.items():
-            items = validated_data.pop(key, [])
-            for item in items:
-                item['inspection'] = inspection
-                ser_cls().create(item)
+        # разделы создаются по очереди, а их архивы распаковываются вместе
+        with PhotoIngest(progress=self.context.get('progress')) as ingest:
+            context = {**self.context, 'ingest': ingest}
+            for key, (ser_cls, _) in sections.items():
+                items = validated_data.pop(key, [])
+                for item in items:
+                    item['inspection'] = inspection
+                    ser_cls(context=context).create(item)
+            ingest.run()
 
         return inspection
+
+
+class InspectionListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Строка списка инспекций: только то, что показывает таблица."""
+
+    class Meta:
+        model = Inspection
+        fields = ('id', 'inspection_date', 'job_number', 'inspector_name', 'car_number')
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestJob
+        fields = ('id', 'status', 'progress', 'inspection', 'error', 'created_at', 'updated_at')
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'status', 'inspection', 'photo_ids', 'error', 'download_url',
+                  'created_at', 'updated_at')
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        url = reverse('report-job-download', args=[obj.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ('id', 'filename', 'size', 'offset', 'sha256', 'status', 'created_at')
+        read_only_fields = ('offset', 'status', 'created_at')
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Размер должен быть больше нуля")
+        if value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Размер не может быть больше {settings.CHUNKED_UPLOAD_MAX_SIZE} байт")
+        return value
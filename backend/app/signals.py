@@ -0,0 +1,161 @@
+# app/signals.py
+"""
+Сигналы моделей.
+
+Версия инспекции: любая запись в разделы, фото и ящики увеличивает
+Inspection.version и обновляет updated_at одним UPDATE, без загрузки
+связанных объектов. По версии строятся ETag и Last-Modified (app/conditional.py).
+
+Копии Inspection.inspector_name и Inspection.car_number: первое берётся
+из инспектора при сохранении инспекции и при изменении пользователя,
+второе — из первой погрузки при любой записи в погрузки.
+
+bulk_create сигналов не посылает — кто добавляет фото пачкой в уже
+существующую инспекцию, вызывает bump_inspection_version сам. То же
+с QuerySet.update() пользователей и погрузок.
+"""
+from django.db.models import F, OuterRef, Q, Subquery
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import reference
+from .models import (
+    Box,
+    CustomUser,
+    DiameterMeasurement,
+    Inspection,
+    MushroomStorage,
+    Pallet,
+    ProductLoading,
+    ProductMarkingZip,
+    QualityInspection,
+    QuantityInspection,
+    Thermometer,
+    Scale,
+    PHOTO_KINDS,
+)
+
+SECTION_MODELS = (
+    MushroomStorage,
+    ProductMarkingZip,
+    QuantityInspection,
+    QualityInspection,
+    DiameterMeasurement,
+    Pallet,
+    ProductLoading,
+)
+
+
+def bump_inspection_version(*conditions, **lookups):
+    """Увеличивает версию инспекций, отобранных как в Inspection.objects.filter()."""
+    (Inspection.objects.filter(*conditions, **lookups)
+     .update(version=F('version') + 1, updated_at=timezone.now()))
+
+
+def inspector_full_name(user):
+    # как прежний FullInspectionSerializer.get_inspector_name: «Имя Фамилия»
+    return user.get_full_name()[:255]
+
+
+def first_car_number():
+    """Подзапрос: номер машины первой погрузки инспекции."""
+    return Subquery(ProductLoading.objects
+                    .filter(inspection=OuterRef('pk'))
+                    .order_by('pk')
+                    .values('car_number')[:1])
+
+
+@receiver(pre_save, sender=Inspection)
+def inspection_pre_save(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if instance.pk is not None:
+        instance.version += 1
+    if instance.inspector_id is not None:
+        instance.inspector_name = inspector_full_name(instance.inspector)
+
+
+def section_changed(sender, instance, origin=None, **kwargs):
+    # при удалении самой инспекции обновлять нечего
+    if isinstance(origin, Inspection) or kwargs.get('raw'):
+        return
+    if sender is ProductLoading:
+        # номер машины и версия — одним UPDATE
+        (Inspection.objects.filter(pk=instance.inspection_id)
+         .update(car_number=first_car_number(), version=F('version') + 1,
+                 updated_at=timezone.now()))
+    else:
+        bump_inspection_version(pk=instance.inspection_id)
+
+
+def photo_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Inspection) or kwargs.get('raw'):
+        return
+    section_model, owner_field = PHOTO_OWNERS[sender]
+    if section_model is None:
+        bump_inspection_version(pk=instance.inspection_id)
+    else:
+        owner_id = getattr(instance, f'{owner_field}_id')
+        bump_inspection_version(
+            pk__in=section_model.objects.filter(pk=owner_id).values('inspection_id'))
+
+
+def box_changed(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Inspection) or kwargs.get('raw'):
+        return
+    bump_inspection_version(
+        pk__in=QuantityInspection.objects.filter(pk=instance.quantity_inspection_id)
+                                         .values('inspection_id'))
+
+
+@receiver(post_save, sender=CustomUser)
+def inspector_changed(sender, instance, created, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if created or kwargs.get('raw') or (
+            update_fields and not {'first_name', 'last_name'} & set(update_fields)):
+        return  # например, вход в систему обновляет только last_login
+    name = inspector_full_name(instance)
+    (Inspection.objects.filter(inspector=instance).exclude(inspector_name=name)
+     .update(inspector_name=name, version=F('version') + 1, updated_at=timezone.now()))
+
+
+@receiver(post_save, sender=Thermometer)
+@receiver(post_delete, sender=Thermometer)
+def thermometer_reference_changed(sender, **kwargs):
+    reference.invalidate('thermometer')
+
+
+@receiver(post_save, sender=Scale)
+@receiver(post_delete, sender=Scale)
+def scale_reference_changed(sender, **kwargs):
+    reference.invalidate('scale')
+
+
+@receiver(post_save, sender=Thermometer)
+def thermometer_changed(sender, instance, created, **kwargs):
+    # сведения о термометре отдаются вместе с разделами инспекции
+    if not created:
+        bump_inspection_version(Q(mushroom_storage__thermometer=instance) |
+                                Q(product_loading__thermometer=instance))
+
+
+@receiver(post_save, sender=Scale)
+def scale_changed(sender, instance, created, **kwargs):
+    if not created:
+        bump_inspection_version(quantity_inspections__scale=instance)
+
+
+PHOTO_OWNERS = {
+    photo_model: (section_model, owner_field)
+    for section_model, photo_model, owner_field in PHOTO_KINDS.values()
+}
+
+for model in SECTION_MODELS:
+    post_save.connect(section_changed, sender=model)
+    post_delete.connect(section_changed, sender=model)
+for model in PHOTO_OWNERS:
+    post_save.connect(photo_changed, sender=model)
+    post_delete.connect(photo_changed, sender=model)
+post_save.connect(box_changed, sender=Box)
+post_delete.connect(box_changed, sender=Box)
@@ -0,0 +1,41 @@
+# app/storage.py
+"""
+Хранилище фотографий инспекций.
+
+Обычно фото пишутся по содержимому (app/cas.py) мимо save(). Через save()
+идут фото при PHOTO_CONTENT_ADDRESSED=False и в хранилищах без локального
+пути — с именем из inspection_photo_upload_path.
+
+Эти имена уже уникальны (uuid), поэтому перед записью не нужен exists():
+на каталоге с тысячами файлов цикл get_available_name превращается
+в серию stat() на каждое фото.
+"""
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible(path='app.storage.PhotoStorage')
+class PhotoStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        """
+        Как Storage.save, но без get_available_name до записи. Файл
+        открывается с O_EXCL, и при редком совпадении имени _save сам
+        подберёт свободное через get_available_name.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+        if max_length is not None and len(name) > max_length:
+            # слишком длинное имя обрезает get_available_name, как в Storage.save
+            name = self.get_available_name(name, max_length=max_length)
+        name = self._save(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        return name
+
+
+photo_storage = PhotoStorage()
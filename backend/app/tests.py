@@ -1,3 +1,1432 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from .cas import cas_name
+from .imaging import derivative_name, make_derivatives
+from .ingest import extract_zip_photos, save_member
+from .jobs import claim_next_job, run_pending_ingest_jobs
+from .models import (
+    Box,
+    ChunkedUpload,
+    CustomUser,
+    DiameterMeasurement,
+    DiameterMeasurementPhoto,
+    IngestJob,
+    Inspection,
+    MushroomPhoto,
+    MushroomStorage,
+    Pallet,
+    PalletPhoto,
+    ProductLoading,
+    ProductLoadingPhoto,
+    ProductMarkingPhoto,
+    QualityInspection,
+    QuantityInspection,
+    QuantityInspectionPhoto,
+    ReportJob,
+    Scale,
+    Thermometer,
+)
+from .multipart import parse_nested_keys
+from .reference import scale_id
+from .reports import run_pending_report_jobs
+from .serializers import FullInspectionSerializer, PalletPhotoSerializer
+from .storage import PhotoStorage
+from .thumbnails import get_thumbnail
+from .uploads import create_upload, upload_path
+
+
+def make_jpeg(size=(64, 48), color=(200, 180, 160), orientation=None):
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    Image.new('RGB', size, color).save(buf, 'JPEG', exif=exif)
+    return buf.getvalue()
+
+
+def make_zip(count, prefix='photo'):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for n in range(count):
+            zf.writestr(f'{prefix}_{n:04}.jpg', make_jpeg(color=(n % 256, len(prefix), 100)))
+    return SimpleUploadedFile(f'{prefix}.zip', buf.getvalue())
+
+
+class MediaRootMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._media_root = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media_root)
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class FullInspectionIngestTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='inspector', role='inspector')
+
+    def payload(self, photos):
+        return {
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-1',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 100,
+                'quantity_of_pallets': 4,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+            }],
+            'quantity_inspections': [{
+                'zip_photos': make_zip(photos, 'quantity'),
+                'boxes': [{'net_weight': 10, 'defect_weight': 1}] * photos,
+            }],
+            'pallets': [
+                {'zip_photos': make_zip(photos, 'pallet_a')},
+                {'zip_photos': make_zip(photos, 'pallet_b')},
+            ],
+        }
+
+    def create(self, photos):
+        serializer = FullInspectionSerializer(data=self.payload(photos))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as ctx:
+            inspection = serializer.save()
+        return inspection, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_photos(self):
+        _, few = self.create(2)
+        _, many = self.create(60)
+        self.assertEqual(few, many)
+
+    def test_photo_order_and_ownership_are_kept(self):
+        inspection, _ = self.create(5)
+        pallets = list(inspection.pallets.order_by('id'))
+        for pallet, prefix in zip(pallets, ('pallet_a', 'pallet_b')):
+            digests = list(PalletPhoto.objects.filter(pallet=pallet).order_by('id')
+                           .values_list('sha256', flat=True))
+            expected = [hashlib.sha256(make_jpeg(color=(n, len(prefix), 100))).hexdigest()
+                        for n in range(5)]
+            self.assertEqual(digests, expected)
+        qi = inspection.quantity_inspections.get()
+        self.assertEqual(QuantityInspectionPhoto.objects.filter(quantity_inspection=qi).count(), 5)
+        self.assertEqual(Box.objects.filter(quantity_inspection=qi).count(), 5)
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='inspector', role='inspector')
+
+    def create(self, zip_file):
+        serializer = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-1',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 1,
+                'quantity_of_pallets': 1,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+            }],
+            'pallets': [{'zip_photos': zip_file}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_same_photos_are_stored_once(self):
+        # в архиве 3 одинаковых снимка и 1 другой, архив загружается дважды
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            for n in range(3):
+                zf.writestr(f'same_{n}.jpg', make_jpeg())
+            zf.writestr('other.jpg', make_jpeg(color=(0, 0, 0)))
+        self.create(SimpleUploadedFile('a.zip', buf.getvalue()))
+        self.create(SimpleUploadedFile('b.zip', buf.getvalue()))
+
+        photos = PalletPhoto.objects.order_by('id')
+        self.assertEqual(photos.count(), 8)
+        names = set(photos.values_list('image', flat=True))
+        self.assertEqual(len(names), 2)
+        for name in names:
+            self.assertTrue(name.startswith('photos/sha256/'))
+            with default_storage.open(name) as f:
+                self.assertEqual(hashlib.sha256(f.read()).hexdigest(), name.rsplit('/', 1)[-1][:64])
+            self.assertTrue(default_storage.exists(derivative_name(name, 'thumb')))
+        _, files = default_storage.listdir('photos/sha256/.incoming')
+        self.assertEqual(files, [])
+
+
+@override_settings(PHOTO_CONTENT_ADDRESSED=False)
+class PhotoUploadPathTests(MediaRootMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='inspector', role='inspector')
+
+    def test_names_are_unique_without_queries_or_stat(self):
+        # все файлы архива с одним именем в разных папках
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            for n in range(20):
+                zf.writestr(f'dir_{n}/IMG_0001.JPG', make_jpeg(color=(n, 0, 0)))
+        serializer = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-1',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 1,
+                'quantity_of_pallets': 1,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+            }],
+            'pallets': [{'zip_photos': SimpleUploadedFile('p.zip', buf.getvalue())}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with mock.patch.object(PhotoStorage, 'exists', side_effect=AssertionError('exists() called')):
+            inspection = serializer.save()
+
+        names = list(PalletPhoto.objects.filter(pallet__inspection=inspection)
+                     .values_list('image', flat=True))
+        self.assertEqual(len(set(names)), 20)
+        for name in names:
+            self.assertRegex(name, r'^photos/2025-05-01/pallets/IMG_0001_[0-9a-f]{12}\.jpg$')
+
+    def test_long_name_is_cut_to_max_length(self):
+        storage = PhotoStorage()
+        name = storage.save(f"photos/test/{'a' * 150}.jpg", io.BytesIO(make_jpeg()), max_length=100)
+        self.addCleanup(storage.delete, name)
+        self.assertLessEqual(len(name), 100)
+        self.assertTrue(name.startswith('photos/test/aaa') and name.endswith('.jpg'))
+
+
+class InspectionViewSetQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='inspector', role='inspector',
+                                             first_name='Иван', last_name='Петров')
+        cls.thermometer = Thermometer.objects.create(info='T-1')
+
+    def make_inspection(self, sections):
+        inspection = Inspection.objects.create(inspection_date='2025-05-01', inspector=self.user,
+                                               job_number='J-1')
+        for n in range(sections):
+            storage = MushroomStorage.objects.create(
+                inspection=inspection, thermometer=self.thermometer, quantity_of_boxes=1,
+                quantity_of_pallets=1, temperature_in_fridge=2,
+                mushroom_temperature_min=1, mushroom_temperature_max=3)
+            MushroomPhoto.objects.create(storage=storage, image=f'photos/m{n}.jpg')
+            qi = QuantityInspection.objects.create(inspection=inspection)
+            Box.objects.create(quantity_inspection=qi, net_weight=10, defect_weight=1)
+            QuantityInspectionPhoto.objects.create(quantity_inspection=qi, image=f'photos/q{n}.jpg')
+            Pallet.objects.create(inspection=inspection)
+            loading = ProductLoading.objects.create(inspection=inspection, car_number=f'A{n}')
+            ProductLoadingPhoto.objects.create(loading=loading, image=f'photos/l{n}.jpg')
+        return inspection
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        for _ in range(3):
+            self.make_inspection(2)
+        _, few = self.count_queries('/api/inspections/?page_size=50')
+        for _ in range(20):
+            self.make_inspection(2)
+        response, many = self.count_queries('/api/inspections/?page_size=50')
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['results']), 23)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'inspection_date', 'job_number', 'inspector_name', 'car_number'})
+        self.assertEqual(row['inspector_name'], 'Иван Петров')
+        self.assertEqual(row['car_number'], 'A0')
+
+    def test_list_is_paginated_by_default(self):
+        for _ in range(25):
+            self.make_inspection(0)
+        response, _ = self.count_queries('/api/inspections/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_pages_cover_every_inspection_once(self):
+        # несколько инспекций на одну дату: порядок держится на id
+        for day in range(1, 6):
+            for _ in range(3):
+                Inspection.objects.create(inspection_date=f'2025-05-{day:02}', inspector=self.user)
+        seen = []
+        url = '/api/inspections/?page_size=4'
+        while url:
+            response, _ = self.count_queries(url)
+            seen += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        expected = list(Inspection.objects.order_by('-inspection_date', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_fields_and_expand_prune_serializer_and_queries(self):
+        inspection = self.make_inspection(3)
+        _, full = self.count_queries(f'/api/inspections/{inspection.id}/')
+
+        response, lean = self.count_queries(f'/api/inspections/{inspection.id}/?fields=id,job_number')
+        self.assertEqual(set(response.data), {'id', 'job_number'})
+        # версия для ETag + сама инспекция
+        self.assertEqual(lean, 2)
+        self.assertLess(lean, full)
+
+        response, _ = self.count_queries(f'/api/inspections/{inspection.id}/?expand=pallets')
+        self.assertIn('pallets', response.data)
+        self.assertNotIn('mushroom_storage', response.data)
+        self.assertIn('car_number', response.data)
+
+        response, queries = self.count_queries('/api/inspections/?expand=quantity_inspections')
+        row = response.data['results'][0]
+        self.assertEqual(len(row['quantity_inspections']), 3)
+        self.assertNotIn('pallets', row)
+        # инспекции + разделы + ящики + фото
+        self.assertEqual(queries, 4)
+
+    def test_bundle_has_every_photo_kind_in_fixed_queries(self):
+        small = self.make_inspection(1)
+        large = self.make_inspection(5)
+        for inspection in (small, large):
+            ProductMarkingPhoto.objects.create(inspection=inspection, image='photos/mark.jpg')
+            measurement = DiameterMeasurement.objects.create(inspection=inspection)
+            DiameterMeasurementPhoto.objects.create(diameter_measurement=measurement,
+                                                    image='photos/d.jpg')
+        _, few = self.count_queries(f'/api/inspections/{small.id}/bundle/')
+        response, many = self.count_queries(f'/api/inspections/{large.id}/bundle/')
+        self.assertEqual(few, many)
+
+        data = response.data
+        self.assertEqual(data['car_number'], 'A0')
+        self.assertEqual(len(data['mushroom_storage']), 5)
+        self.assertEqual(data['mushroom_storage'][0]['thermometer_info']['info'], 'T-1')
+        self.assertEqual(len(data['quantity_inspections'][0]['boxes']), 1)
+        self.assertEqual(data['marking_photos'][0]['image'], 'http://testserver/media/photos/mark.jpg')
+        # файлов копий нет — вместо них оригинал
+        self.assertEqual(data['diameter_measurements'][0]['photos'][0]['thumbnail'],
+                         'http://testserver/media/photos/d.jpg')
+        self.assertEqual(len(data['product_loading'][4]['photos']), 1)
+
+    def test_conditional_get(self):
+        inspection = self.make_inspection(2)
+        url = f'/api/inspections/{inspection.id}/'
+        response, _ = self.count_queries(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            cached = APIClient().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        # другое представление — другой ETag
+        response, _ = self.count_queries(url + '?fields=id')
+        self.assertNotEqual(response['ETag'], etag)
+
+        # новое фото в разделе меняет версию
+        pallet = inspection.pallets.first()
+        PalletPhoto.objects.create(pallet=pallet, image='photos/new.jpg')
+        response = APIClient().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        photos_url = f'/api/pallet-photos/?inspection={inspection.id}'
+        response, _ = self.count_queries(photos_url)
+        cached = APIClient().get(photos_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_unknown_expand_is_rejected(self):
+        response = APIClient().get('/api/inspections/?expand=nope')
+        self.assertEqual(response.status_code, 400)
+
+    def test_photo_list_is_paginated(self):
+        inspection = self.make_inspection(0)
+        pallet = Pallet.objects.create(inspection=inspection)
+        PalletPhoto.objects.bulk_create(
+            [PalletPhoto(pallet=pallet, image=f'photos/p{n}.jpg') for n in range(15)])
+        response, _ = self.count_queries(f'/api/pallet-photos/?inspection={inspection.id}&page_size=10')
+        self.assertEqual(len(response.data['results']), 10)
+        response, _ = self.count_queries(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_detail_query_count_is_constant(self):
+        small = self.make_inspection(1)
+        large = self.make_inspection(10)
+        _, few = self.count_queries(f'/api/inspections/{small.id}/')
+        response, many = self.count_queries(f'/api/inspections/{large.id}/')
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.data['mushroom_storage']), 10)
+        self.assertEqual(response.data['car_number'], 'A0')
+
+    def test_inspector_name_keeps_full_name_order(self):
+        # в API, как раньше, CustomUser.get_full_name(): «Имя Фамилия»
+        inspection = self.make_inspection(0)
+        detail, _ = self.count_queries(f'/api/inspections/{inspection.id}/')
+        listing, _ = self.count_queries('/api/inspections/')
+        self.assertEqual(detail.data['inspector_name'], self.user.get_full_name())
+        self.assertEqual(listing.data['results'][0]['inspector_name'], 'Иван Петров')
+
+
+class InspectionDenormalizedFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='inspector', role='inspector',
+                                             first_name='Иван', last_name='Петров')
+
+    def test_fields_follow_loadings_and_inspector(self):
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                               inspector=self.user, job_number='J-1')
+        self.assertEqual(inspection.inspector_name, 'Иван Петров')
+        self.assertIsNone(inspection.car_number)
+
+        first = ProductLoading.objects.create(inspection=inspection, car_number='A1')
+        second = ProductLoading.objects.create(inspection=inspection, car_number='B2')
+        inspection.refresh_from_db()
+        self.assertEqual(inspection.car_number, 'A1')
+        first.delete()
+        inspection.refresh_from_db()
+        self.assertEqual(inspection.car_number, 'B2')
+        second.car_number = 'C3'
+        second.save()
+        inspection.refresh_from_db()
+        self.assertEqual(inspection.car_number, 'C3')
+
+        version = inspection.version
+        self.user.last_name = 'Сидоров'
+        self.user.save()
+        inspection.refresh_from_db()
+        self.assertEqual(inspection.inspector_name, 'Иван Сидоров')
+        self.assertGreater(inspection.version, version)
+
+        version = inspection.version
+        self.user.save(update_fields=['last_login'])
+        inspection.refresh_from_db()
+        self.assertEqual(inspection.version, version)
+
+    def test_list_needs_one_query(self):
+        for n in range(5):
+            inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                                   inspector=self.user, job_number=f'J-{n}')
+            ProductLoading.objects.create(inspection=inspection, car_number=f'A{n}')
+        with CaptureQueriesContext(connection) as ctx:
+            response = APIClient().get('/api/inspections/')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual({row['car_number'] for row in response.data['results']},
+                         {f'A{n}' for n in range(5)})
+
+
+@skipUnless(connection.vendor == 'postgresql', 'планы запросов проверяются только на PostgreSQL')
+class IndexPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create(username='planner', role='inspector',
+                                         first_name='Иван', last_name='Петров')
+        for n in range(200):
+            inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 1, 1),
+                                                   inspector=user, job_number=f'J-{n:05d}')
+            ProductLoading.objects.create(inspection=inspection, car_number=f'AB{n:04d}KZ',
+                                          seal_number=f'SGS{n:06d}')
+            pallet = Pallet.objects.create(inspection=inspection)
+            PalletPhoto.objects.create(pallet=pallet, image=f'photos/p{n}.jpg')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            # на маленькой таблице seq scan дешевле — запрещаем его,
+            # чтобы проверять, что подходящий индекс вообще есть
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+
+    def assertUsesIndex(self, queryset, name):
+        plan = queryset.explain()
+        self.assertIn(name, plan, plan)
+
+    def test_admin_search_uses_trigram_indexes(self):
+        self.assertUsesIndex(Inspection.objects.filter(job_number__icontains='0012'),
+                             'inspection_job_number_trgm')
+        self.assertUsesIndex(ProductLoading.objects.filter(car_number__icontains='b001'),
+                             'loading_car_number_trgm')
+        self.assertUsesIndex(ProductLoading.objects.filter(seal_number__icontains='00015'),
+                             'loading_seal_number_trgm')
+        self.assertUsesIndex(Inspection.objects.filter(car_number__icontains='b001'),
+                             'inspection_car_number_trgm')
+        self.assertUsesIndex(Inspection.objects.filter(inspector_name__icontains='петр'),
+                             'inspection_inspector_trgm')
+
+    def test_inspection_list_order(self):
+        self.assertUsesIndex(Inspection.objects.order_by('-inspection_date', '-id')[:20],
+                             'inspection_date_id_idx')
+
+    def test_section_photos_order(self):
+        pallet = Pallet.objects.first()
+        self.assertUsesIndex(PalletPhoto.objects.filter(pallet=pallet).order_by('uploaded_at', 'id'),
+                             'pallet_photo_owner_idx')
+        # отдельного индекса на pallet_id нет — удаление паллеты идёт по составному
+        self.assertUsesIndex(PalletPhoto.objects.filter(pallet=pallet), 'pallet_photo_owner_idx')
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2, EXPORT_BUFFER_SIZE=64)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        for day in (1, 2, 3):
+            inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, day),
+                                                   inspector=user, job_number=f'J-{day}')
+            qi = QuantityInspection.objects.create(inspection=inspection)
+            Box.objects.bulk_create([Box(quantity_inspection=qi, net_weight=day * 10 + n, defect_weight=1)
+                                     for n in range(4)])
+            ProductLoading.objects.create(inspection=inspection, car_number=f'A{day}',
+                                          seal_number=f'S-{day}')
+
+    def test_csv_is_streamed_and_filtered_by_date(self):
+        response = self.client.get('/api/export/boxes/?date_from=2025-05-02&date_to=2025-05-03')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('boxes_2025-05-02_2025-05-03.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['inspection_id', 'inspection_date'])
+        self.assertEqual(len(lines), 1 + 8)
+        self.assertEqual([line.split(',')[-2] for line in lines[1:]],
+                         ['20.0', '21.0', '22.0', '23.0', '30.0', '31.0', '32.0', '33.0'])
+
+    def test_ndjson(self):
+        response = self.client.get('/api/export/loading/?format=ndjson&date_to=2025-05-01')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in
+                b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['seal_number'], 'S-1')
+        self.assertEqual(rows[0]['inspection_date'], '2025-05-01')
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get('/api/export/boxes/?format=xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/boxes/?date_from=05.05.2025').status_code, 400)
+        self.assertEqual(self.client.get('/api/export/users/').status_code, 404)
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_inspections', 'inspections', '--from', '2025-05-03', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('J-3', lines[1])
+        self.assertIn('A3', lines[1])
+
+
+class ReferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_thermometer_list_is_cached_until_write(self):
+        client = APIClient()
+        Thermometer.objects.create(info='T-1')
+        self.assertEqual(len(client.get('/api/thermometers/').data), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(len(client.get('/api/thermometers/').data), 1)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        response = client.post('/api/thermometers/', {'info': 'T-2'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(client.get('/api/thermometers/').data), 2)
+        client.delete(f"/api/thermometers/{response.data['id']}/")
+        self.assertEqual(len(client.get('/api/thermometers/').data), 1)
+
+    def test_scale_lookup(self):
+        scale = Scale.objects.create(model='CAS', serial_number='1', calibration_date='2025-01-01')
+        self.assertEqual(scale_id('CAS', '1', '2025-01-01'), scale.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(scale_id('CAS', '1', '2025-01-01'), scale.pk)
+        # только проверка по первичному ключу
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        created = scale_id('CAS', '2', '2025-01-01')
+        self.assertNotEqual(created, scale.pk)
+        self.assertEqual(scale_id('CAS', '2', '2025-01-01'), created)
+        self.assertEqual(Scale.objects.count(), 2)
+
+    def test_scale_changed_by_another_process(self):
+        edited = Scale.objects.create(model='CAS', serial_number='1', calibration_date='2025-01-01')
+        deleted = Scale.objects.create(model='CAS', serial_number='2', calibration_date='2025-01-01')
+        self.assertEqual(scale_id('CAS', '1', '2025-01-01'), edited.pk)
+        self.assertEqual(scale_id('CAS', '2', '2025-01-01'), deleted.pk)
+        # сброс поколения в другом воркере сюда не доходит
+        with mock.patch('app.signals.reference.invalidate'):
+            Scale.objects.filter(pk=edited.pk).update(serial_number='9')
+            deleted.delete()
+
+        pk = scale_id('CAS', '1', '2025-01-01')
+        self.assertNotEqual(pk, edited.pk)
+        self.assertEqual(Scale.objects.get(pk=pk).serial_number, '1')
+        pk = scale_id('CAS', '2', '2025-01-01')
+        self.assertNotEqual(pk, deleted.pk)
+        self.assertTrue(Scale.objects.filter(pk=pk, serial_number='2').exists())
+
+
+class ParseNestedKeysTests(SimpleTestCase):
+    def test_sections_and_boxes_without_caps(self):
+        data = QueryDict(mutable=True)
+        data['inspection_date'] = '2025-05-01'
+        # ящики в обратном порядке и больше старого предела в 20
+        for n in reversed(range(1500)):
+            data[f'quantity_inspections[1].boxes[{n}].net_weight'] = str(n)
+            data[f'quantity_inspections[1].boxes[{n}].defect_weight'] = '1'
+        data['quantity_inspections[0].scale_model'] = 'ВЭ-15'
+        data['quality_inspections[0].off_grade_mass_kg_70'] = '0.7'
+
+        root, sections = parse_nested_keys(data)
+
+        self.assertEqual(root, {'inspection_date': '2025-05-01'})
+        first, second = sections['quantity_inspections']
+        self.assertEqual(first, {'scale_model': 'ВЭ-15'})
+        self.assertEqual(len(second['boxes']), 1500)
+        self.assertEqual(second['boxes'][1499], {'net_weight': '1499', 'defect_weight': '1'})
+        self.assertEqual(sections['quality_inspections'], [{'off_grade_mass_kg_70': '0.7'}])
+
+    def test_field_cannot_be_value_and_list(self):
+        for keys in (['quantity_inspections[0].boxes', 'quantity_inspections[0].boxes[0].net_weight'],
+                     ['quantity_inspections[0].boxes[0].net_weight', 'quantity_inspections[0].boxes']):
+            data = QueryDict(mutable=True)
+            for key in keys:
+                data[key] = '1'
+            with self.assertRaises(ValidationError):
+                parse_nested_keys(data)
+
+    def test_malformed_keys_stay_in_root(self):
+        data = {'pallets[0]': '1', 'pallets[x].f': '2', 'pallets[0].boxes[0]': '3',
+                'a[0].b[0].c[0].f': '4', 'pallets[1].notes': '5'}
+        root, sections = parse_nested_keys(data)
+        self.assertEqual(sections, {'pallets': [{'notes': '5'}]})
+        self.assertEqual(set(root), {'pallets[0]', 'pallets[x].f', 'pallets[0].boxes[0]',
+                                     'a[0].b[0].c[0].f'})
+
+
+@override_settings(INGEST_RUN_IN_PROCESS=False)
+class AsyncIngestTests(MediaRootMixin, TransactionTestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='inspector', role='inspector')
+        self.client = APIClient()
+
+    def post(self, **headers):
+        form = {
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-2',
+            'mushroom_storage[0].quantity_of_boxes': 100,
+            'mushroom_storage[0].quantity_of_pallets': 4,
+            'mushroom_storage[0].temperature_in_fridge': 2,
+            'mushroom_storage[0].mushroom_temperature_min': 1,
+            'mushroom_storage[0].mushroom_temperature_max': 3,
+            'pallets[0].zip_photos': make_zip(7, 'pallet'),
+        }
+        return self.client.post('/api/full-inspection/?async=1', form, format='multipart', **headers)
+
+    def test_upload_is_accepted_and_processed_later(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 202)
+        job = IngestJob.objects.get(pk=response.data['id'])
+        self.assertEqual(job.status, 'pending')
+        self.assertIsNone(job.inspection)
+
+        self.assertEqual(run_pending_ingest_jobs(), 1)
+
+        status = self.client.get(f'/api/ingest-jobs/{job.pk}/').data
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['progress']['pallets'], {'done': 7, 'total': 7})
+        self.assertEqual(PalletPhoto.objects.filter(pallet__inspection_id=status['inspection']).count(), 7)
+
+    def test_retry_with_same_key_does_not_duplicate(self):
+        first = self.post(HTTP_IDEMPOTENCY_KEY='abc')
+        second = self.post(HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(IngestJob.objects.count(), 1)
+
+    def test_job_of_dead_worker_is_claimed_again(self):
+        job = IngestJob.objects.get(pk=self.post().data['id'])
+        self.assertEqual(claim_next_job().pk, job.pk)
+        # обработчик на связи — задачу никто не трогает
+        self.assertIsNone(claim_next_job())
+
+        IngestJob.objects.filter(pk=job.pk).update(
+            heartbeat_at=timezone.now() - datetime.timedelta(seconds=settings.JOB_STALE_AFTER + 1))
+        self.assertEqual(run_pending_ingest_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+
+    def test_inspection_and_done_are_saved_together(self):
+        job = IngestJob.objects.get(pk=self.post().data['id'])
+        update = QuerySet.update
+
+        def lost(qs, **kwargs):
+            # обработчик упал сразу после сохранения инспекции
+            if kwargs.get('status') == 'done':
+                raise DatabaseError('connection lost')
+            return update(qs, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', lost):
+            run_pending_ingest_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNone(job.inspection)
+        self.assertFalse(Inspection.objects.exists())
+
+    def test_status_poll_starts_worker_for_leftover_job(self):
+        job_id = self.post().data['id']
+        with override_settings(INGEST_RUN_IN_PROCESS=True), \
+                mock.patch('app.views.start_ingest_worker') as start:
+            self.client.get(f'/api/ingest-jobs/{job_id}/')
+            start.assert_called_once_with()
+            run_pending_ingest_jobs()
+            start.reset_mock()
+            self.client.get(f'/api/ingest-jobs/{job_id}/')
+            start.assert_not_called()
+
+
+class SectionPhotoUploadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='inspector', role='inspector')
+        self.client = APIClient()
+
+    def test_metadata_then_per_section_uploads(self):
+        response = self.client.post('/api/inspections/metadata/', {
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-3',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 100,
+                'quantity_of_pallets': 4,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+            }],
+            'quantity_inspections': [{'boxes': [{'net_weight': 10, 'defect_weight': 1}]}],
+            'pallets': [{}, {}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        inspection_id = response.data['id']
+        second_pallet = response.data['sections']['pallets'][1]
+
+        upload = self.client.post(
+            f'/api/inspections/{inspection_id}/photos/pallet/',
+            {'section': second_pallet, 'zip_photos': make_zip(3, 'pallet')},
+            format='multipart',
+        )
+        self.assertEqual(upload.status_code, 201, upload.data)
+        self.assertEqual(upload.data['section'], second_pallet)
+        self.assertEqual(PalletPhoto.objects.filter(pallet_id=second_pallet).count(), 3)
+
+        marking = self.client.post(
+            f'/api/inspections/{inspection_id}/photos/marking/',
+            {'images': [SimpleUploadedFile('m.jpg', make_jpeg())]},
+            format='multipart',
+        )
+        self.assertEqual(marking.status_code, 201, marking.data)
+        self.assertEqual(len(marking.data['photos']), 1)
+
+    def test_retry_is_idempotent_and_failure_leaves_nothing(self):
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                               inspector=self.user, job_number='J-5')
+        pallet = Pallet.objects.create(inspection=inspection)
+        url = f'/api/inspections/{inspection.pk}/photos/pallet/'
+        image = make_jpeg(color=(1, 2, 3))
+
+        with mock.patch('app.views.save_uploaded_photos', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'zip_photos': make_zip(2, 'pallet')}, format='multipart')
+        # фото из архива откатились вместе с упавшей загрузкой
+        self.assertFalse(PalletPhoto.objects.exists())
+
+        def upload():
+            return self.client.post(url, {
+                'zip_photos': make_zip(2, 'pallet'),
+                'images': [SimpleUploadedFile('a.jpg', image), SimpleUploadedFile('b.jpg', image)],
+            }, format='multipart')
+
+        first = upload()
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(len(set(first.data['photos'])), 4)
+        # повтор после потерянного ответа: те же строки, новых нет
+        again = upload()
+        self.assertEqual(again.status_code, 201, again.data)
+        self.assertEqual(again.data['photos'], first.data['photos'])
+        self.assertEqual(PalletPhoto.objects.filter(pallet=pallet).count(), 4)
+
+    def test_same_bytes_in_archive_and_images(self):
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                               inspector=self.user, job_number='J-6')
+        pallet = Pallet.objects.create(inspection=inspection)
+        url = f'/api/inspections/{inspection.pk}/photos/pallet/'
+        # то же фото, что единственный файл make_zip(1, 'pallet')
+        image = make_jpeg(color=(0, len('pallet'), 100))
+
+        def upload():
+            return self.client.post(url, {
+                'zip_photos': make_zip(1, 'pallet'),
+                'images': [SimpleUploadedFile('same.jpg', image)],
+            }, format='multipart')
+
+        first = upload()
+        self.assertEqual(first.status_code, 201, first.data)
+        self.assertEqual(len(set(first.data['photos'])), 2)
+        again = upload()
+        self.assertEqual(again.data['photos'], first.data['photos'])
+        self.assertEqual(PalletPhoto.objects.filter(pallet=pallet).count(), 2)
+
+    def test_unknown_kind(self):
+        inspection = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01', 'inspector': self.user.id, 'job_number': 'J-4',
+            'mushroom_storage': [],
+        })
+        self.assertTrue(inspection.is_valid(), inspection.errors)
+        pk = inspection.save().pk
+        response = self.client.post(f'/api/inspections/{pk}/photos/boxes/', {}, format='multipart')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(INGEST_RUN_IN_PROCESS=False)
+class PhotoArchiveTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        self.inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                                    inspector=user, job_number='J-7')
+        self.pallet = Pallet.objects.create(inspection=self.inspection)
+        self.loading = ProductLoading.objects.create(inspection=self.inspection)
+        self.images = {}
+        for n in range(3):
+            data = make_jpeg(color=(n, 10, 10))
+            photo = PalletPhoto.objects.create(
+                pallet=self.pallet, image=default_storage.save(f'photos/p{n}.jpg', io.BytesIO(data)))
+            self.images[f'pallet/{self.pallet.pk}/{photo.pk}.jpg'] = data
+        photo = ProductMarkingPhoto.objects.create(
+            inspection=self.inspection, image=default_storage.save('photos/m.jpg', io.BytesIO(make_jpeg())))
+        self.marking_name = f'marking/{self.inspection.pk}/{photo.pk}.jpg'
+        # фото без файла на диске пропускается
+        ProductLoadingPhoto.objects.create(loading=self.loading, image='photos/missing.jpg')
+
+    def download(self, query=''):
+        response = APIClient().get(f'/api/inspections/{self.inspection.pk}/photos.zip/{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive_contains_stored_photos(self):
+        zf = self.download('?sections=pallet')
+        self.assertEqual(zf.namelist(), list(self.images))
+        for info in zf.infolist():
+            self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.read(info), self.images[info.filename])
+        self.assertIsNone(zf.testzip())
+
+    def test_all_sections_by_default(self):
+        zf = self.download()
+        self.assertEqual(zf.namelist(), [self.marking_name, *self.images])
+
+    def test_unknown_section(self):
+        response = APIClient().get(f'/api/inspections/{self.inspection.pk}/photos.zip/?sections=cars')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(REPORT_RUN_IN_PROCESS=False)
+class ReportJobTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(REPORT_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        self.inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1),
+                                                    inspector=user, job_number='J-8')
+        # генератор рассчитан на заполненные разделы
+        thermometer = Thermometer.objects.create(info='T-1')
+        MushroomStorage.objects.create(
+            inspection=self.inspection, thermometer=thermometer, quantity_of_boxes=1,
+            quantity_of_pallets=1, temperature_in_fridge=2, mushroom_temperature_min=1,
+            mushroom_temperature_max=3)
+        qi = QuantityInspection.objects.create(inspection=self.inspection)
+        Box.objects.create(quantity_inspection=qi, net_weight=10, defect_weight=1)
+        QualityInspection.objects.create(inspection=self.inspection, sample_mass_kg=10,
+                                         conforms_to_declared_grade=9, off_grade_mass_kg_50=0.5,
+                                         off_grade_mass_kg_70=0.5)
+        DiameterMeasurement.objects.create(inspection=self.inspection)
+        Pallet.objects.create(inspection=self.inspection)
+        ProductLoading.objects.create(inspection=self.inspection, car_number='A1', thermometer=thermometer)
+        self.client = APIClient()
+
+    def request_report(self, body):
+        return self.client.post(f'/generate-report/{self.inspection.pk}/', body, format='json')
+
+    def test_report_is_queued_then_downloaded(self):
+        response = self.request_report({'pallet_photo_ids': [3, 1, 3]})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], 'pending')
+        self.assertEqual(job['photo_ids'], {'pallet_photo_ids': [1, 3]})
+        self.assertEqual(self.client.get(f"/api/report-jobs/{job['id']}/download/").status_code, 409)
+
+        self.assertEqual(run_pending_report_jobs(), 1)
+        status = self.client.get(f"/api/report-jobs/{job['id']}/").data
+        self.assertEqual(status['status'], 'done', status['error'])
+        download = self.client.get(status['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('2025-05-01', download['Content-Disposition'])
+        self.assertTrue(zipfile.is_zipfile(io.BytesIO(b''.join(download.streaming_content))))
+
+    def test_errors_are_reported(self):
+        self.assertEqual(self.request_report({'marking_photo_ids': 'all'}).status_code, 400)
+        self.assertEqual(self.client.post('/generate-report/999999/', {}, format='json').status_code, 404)
+
+        job_id = self.request_report({}).json()['id']
+        with mock.patch('app.reports.generate_inspection_report', side_effect=RuntimeError('нет шаблона')):
+            run_pending_report_jobs()
+        status = self.client.get(f'/api/report-jobs/{job_id}/').data
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error'], 'RuntimeError: нет шаблона')
+        self.assertIsNone(status['download_url'])
+
+    def test_job_of_dead_worker_is_rebuilt(self):
+        job_id = self.request_report({}).json()['id']
+        ReportJob.objects.filter(pk=job_id).update(
+            status='running',
+            heartbeat_at=timezone.now() - datetime.timedelta(seconds=settings.JOB_STALE_AFTER + 1))
+        with override_settings(REPORT_RUN_IN_PROCESS=True), \
+                mock.patch('app.views.start_report_worker') as start:
+            self.client.get(f'/api/report-jobs/{job_id}/')
+        start.assert_called_once_with()
+
+        self.assertEqual(run_pending_report_jobs(), 1)
+        self.assertEqual(ReportJob.objects.get(pk=job_id).status, 'done')
+
+    def test_photos_are_embedded_at_print_size(self):
+        pallet = self.inspection.pallets.get()
+        # фото без готовой копии report: копия создаётся при сборке отчёта
+        photo = PalletPhoto.objects.create(
+            pallet=pallet, image=default_storage.save('photos/big.jpg', io.BytesIO(make_jpeg(size=(3000, 2000)))))
+        self.assertFalse(default_storage.exists(derivative_name(photo.image.name, 'report')))
+
+        job = self.request_report({'pallet_photo_ids': [photo.pk]}).json()
+        run_pending_report_jobs()
+        job = ReportJob.objects.get(pk=job['id'])
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertTrue(default_storage.exists(derivative_name(photo.image.name, 'report')))
+        with open(os.path.join(self.cache_dir, job.cache_name), 'rb') as f, zipfile.ZipFile(f) as docx:
+            media = [name for name in docx.namelist() if name.startswith('word/media/')]
+            self.assertEqual(len(media), 1)
+            with Image.open(io.BytesIO(docx.read(media[0]))) as img:
+                self.assertEqual(img.size[0], 4 * settings.REPORT_IMAGE_DPI)
+
+    def cached_files(self):
+        return sorted(name for _, _, names in os.walk(self.cache_dir) for name in names)
+
+    def test_identical_report_comes_from_cache(self):
+        first = self.request_report({'pallet_photo_ids': [2, 1]}).json()
+        run_pending_report_jobs()
+        self.assertEqual(len(self.cached_files()), 1)
+
+        with mock.patch('app.reports.generate_inspection_report') as generate:
+            with CaptureQueriesContext(connection) as ctx:
+                second = self.request_report({'pallet_photo_ids': [1, 2]}).json()
+            self.assertEqual(second['status'], 'done')
+            self.assertEqual(run_pending_report_jobs(), 0)
+        generate.assert_not_called()
+        self.assertLessEqual(len(ctx.captured_queries), 3)
+        files = [self.client.get(f"/api/report-jobs/{job['id']}/download/") for job in (first, second)]
+        self.assertEqual(*(b''.join(f.streaming_content) for f in files))
+
+        # другой набор фото — другой отчёт
+        other = self.request_report({'pallet_photo_ids': [1]}).json()
+        self.assertEqual(other['status'], 'pending')
+
+    def test_edit_invalidates_cached_reports(self):
+        self.request_report({})
+        run_pending_report_jobs()
+        old = self.cached_files()
+
+        self.inspection.refresh_from_db()
+        self.inspection.job_number = 'J-9'
+        self.inspection.save()
+        job = self.request_report({}).json()
+        self.assertEqual(job['status'], 'pending')
+        run_pending_report_jobs()
+        new = self.cached_files()
+        self.assertEqual(len(new), 1)
+        self.assertNotEqual(old, new)
+
+    def test_cache_is_bounded(self):
+        with override_settings(REPORT_CACHE_MAX_BYTES=1):
+            for ids in ([1], [2], [3]):
+                self.request_report({'pallet_photo_ids': ids})
+                run_pending_report_jobs()
+        # других копий отчётов нет: лимит кэша — это весь диск под отчёты
+        self.assertLessEqual(len(self.cached_files()), 1)
+        self.assertFalse(os.path.exists(os.path.join(settings.MEDIA_ROOT, 'reports')))
+
+        # отчёт вытеснен — скачивание ставит его в очередь заново
+        job = ReportJob.objects.order_by('id').first()
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertEqual(self.client.get(f'/api/report-jobs/{job.pk}/download/').status_code, 409)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'pending')
+        self.assertEqual(run_pending_report_jobs(), 1)
+        download = self.client.get(f'/api/report-jobs/{job.pk}/download/')
+        self.assertEqual(download.status_code, 200)
+        download.close()
+
+
+class ChunkedUploadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(username='inspector', role='inspector')
+        self.client = APIClient()
+        self.upload_dir = tempfile.mkdtemp()
+        override = override_settings(CHUNKED_UPLOAD_DIR=self.upload_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.upload_dir, True)
+
+    def put_chunk(self, upload_id, data, offset, checksum=None):
+        return self.client.generic(
+            'PUT', f'/api/uploads/{upload_id}/', data,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_resume_and_hand_off_to_pallet_serializer(self):
+        archive = make_zip(4, 'pallet').read()
+        created = self.client.post('/api/uploads/', {
+            'filename': 'pallet.zip',
+            'size': len(archive),
+            'sha256': hashlib.sha256(archive).hexdigest(),
+        }, format='json')
+        self.assertEqual(created.status_code, 201, created.data)
+        upload_id = created.data['id']
+        half = len(archive) // 2
+
+        self.assertEqual(self.put_chunk(upload_id, archive[:half], 0).status_code, 200)
+        # битый кусок не принимается, смещение не сдвигается
+        bad = self.put_chunk(upload_id, archive[half:], half, checksum='0' * 64)
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload_id}/').data['offset'], half)
+        # кусок не с того места
+        self.assertEqual(self.put_chunk(upload_id, archive[half + 1:], half + 1).status_code, 409)
+        # повтор уже принятого куска безопасен
+        self.assertEqual(self.put_chunk(upload_id, archive[:half], 0).status_code, 200)
+
+        self.assertEqual(self.put_chunk(upload_id, archive[half:], half).status_code, 200)
+        done = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(done.data['status'], 'complete')
+
+        response = self.client.post('/api/full-inspection/', {
+            'inspection_date': '2025-05-01',
+            'inspector': self.user.id,
+            'job_number': 'J-5',
+            'mushroom_storage[0].quantity_of_boxes': 100,
+            'mushroom_storage[0].quantity_of_pallets': 4,
+            'mushroom_storage[0].temperature_in_fridge': 2,
+            'mushroom_storage[0].mushroom_temperature_min': 1,
+            'mushroom_storage[0].mushroom_temperature_max': 3,
+            'pallets[0].zip_photos_upload': upload_id,
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(PalletPhoto.objects.count(), 4)
+        self.assertFalse(ChunkedUpload.objects.filter(pk=upload_id).exists())
+
+    @override_settings(CHUNKED_UPLOAD_MAX_SIZE=1024)
+    def test_size_is_limited(self):
+        response = self.client.post('/api/uploads/', {'filename': 'big.zip', 'size': 1025},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('size', response.data)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_purge_keeps_uploads_of_queued_jobs(self):
+        queued = create_upload('queued.zip', 10)
+        stale = create_upload('stale.zip', 10)
+        ChunkedUpload.objects.update(updated_at=timezone.now() - datetime.timedelta(days=7))
+        IngestJob.objects.create(payload={'pallets': [{'zip_photos': {'__upload__': str(queued.pk)}}]})
+
+        call_command('purge_chunked_uploads', stdout=io.StringIO())
+        self.assertEqual(list(ChunkedUpload.objects.values_list('pk', flat=True)), [queued.pk])
+        self.assertTrue(os.path.exists(upload_path(queued)))
+        self.assertFalse(os.path.exists(upload_path(stale)))
+
+
+class PhotoDerivativeTests(MediaRootMixin, TestCase):
+    def test_derivatives_are_rotated_and_resized_at_ingest(self):
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, 'w') as zf:
+            # 4000x3000, повернуть на 90° по EXIF
+            zf.writestr('big.jpg', make_jpeg((4000, 3000), orientation=6))
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        serializer = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01', 'inspector': user.id, 'job_number': 'J-6',
+            'mushroom_storage': [],
+            'pallets': [{'zip_photos': SimpleUploadedFile('p.zip', buf.getvalue())}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        photo = PalletPhoto.objects.get()
+
+        with default_storage.open(derivative_name(photo.image.name, 'thumb')) as f:
+            self.assertEqual(Image.open(f).size, (240, 320))
+        with default_storage.open(derivative_name(photo.image.name, 'report')) as f:
+            self.assertEqual(Image.open(f).size[0], 800)
+
+        data = PalletPhotoSerializer(photo).data
+        self.assertTrue(data['thumbnail'].endswith('__thumb.jpg'))
+        self.assertTrue(data['report_image'].endswith('__report.jpg'))
+
+    def test_missing_derivative_falls_back_to_original(self):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1), inspector=user)
+        pallet = Pallet.objects.create(inspection=inspection)
+        # фото из времён до копий: файл есть, __thumb и прочих нет
+        photo = PalletPhoto.objects.create(
+            pallet=pallet, image=SimpleUploadedFile('old.jpg', make_jpeg()))
+
+        data = PalletPhotoSerializer(photo).data
+        self.assertEqual(data['thumbnail'], photo.image.url)
+        self.assertEqual(data['report_image'], photo.image.url)
+
+        make_derivatives(photo.image.name, photo.image.storage, kinds=['thumb'])
+        data = PalletPhotoSerializer(photo).data
+        self.assertTrue(data['thumbnail'].endswith('__thumb.jpg'))
+        self.assertEqual(data['screen'], photo.image.url)
+
+    def test_rebuild_overwrites_same_name(self):
+        name = default_storage.save('photos/rebuild/rebuild.jpg', io.BytesIO(make_jpeg((800, 600))))
+        target = derivative_name(name, 'thumb')
+        self.assertTrue(make_derivatives(name, default_storage))
+
+        with override_settings(PHOTO_DERIVATIVES={'thumb': (100, 100)}):
+            self.assertTrue(make_derivatives(name, default_storage))
+        with default_storage.open(target) as f:
+            self.assertEqual(Image.open(f).size, (100, 75))
+        # копия заменена на месте, а не записана рядом под другим именем
+        self.assertEqual(sorted(default_storage.listdir('photos/rebuild')[1]),
+                         sorted(['rebuild.jpg', 'rebuild__thumb.jpg',
+                                 'rebuild__screen.jpg', 'rebuild__report.jpg']))
+
+    def test_decompression_bomb_is_skipped(self):
+        name = default_storage.save('photos/test/bomb.jpg', io.BytesIO(make_jpeg((800, 600))))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            self.assertFalse(make_derivatives(name, default_storage))
+        self.assertFalse(default_storage.exists(derivative_name(name, 'thumb')))
+
+
+class MediaThumbnailTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        override = override_settings(MEDIA_THUMB_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1), inspector=user)
+        self.photo = ProductMarkingPhoto.objects.create(
+            inspection=inspection,
+            image=SimpleUploadedFile('big.jpg', make_jpeg(size=(2000, 1000))),
+        )
+
+    def test_thumbnail_is_generated_once_and_cached(self):
+        client = APIClient()
+        url = f'/media-thumb/marking/{self.photo.pk}/128/'
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        with Image.open(io.BytesIO(b''.join(response.streaming_content))) as img:
+            self.assertEqual(img.size, (128, 64))
+
+        with mock.patch('app.thumbnails.render', side_effect=AssertionError('rebuilt')):
+            again = client.get(url, HTTP_ACCEPT='image/jpeg')
+            self.assertEqual(again.status_code, 200)
+            again.close()
+        cached = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+        webp = client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(webp['Content-Type'], 'image/webp')
+        webp.close()
+
+    def test_unknown_size_or_photo(self):
+        client = APIClient()
+        self.assertEqual(client.get(f'/media-thumb/marking/{self.photo.pk}/100/').status_code, 404)
+        self.assertEqual(client.get('/media-thumb/marking/999999/128/').status_code, 404)
+        self.assertEqual(client.get(f'/media-thumb/nope/{self.photo.pk}/128/').status_code, 404)
+
+    @override_settings(MEDIA_REQUIRE_AUTH=True)
+    def test_auth_required(self):
+        client = APIClient()
+        url = f'/media-thumb/marking/{self.photo.pk}/64/'
+        self.assertEqual(client.get(url).status_code, 401)
+        client.force_login(self.photo.inspection.inspector)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Cache-Control'].startswith('private'))
+        response.close()
+
+    def test_thumbnail_evicted_before_open_is_rebuilt(self):
+        url = f'/media-thumb/marking/{self.photo.pk}/64/'
+        build = get_thumbnail
+
+        def evicted_once(*args):
+            path = build(*args)
+            if not calls:
+                # другой процесс вытеснил превью сразу после проверки
+                os.remove(path)
+            calls.append(path)
+            return path
+
+        calls = []
+        with mock.patch('app.thumbnails.get_thumbnail', evicted_once):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(calls), 2)
+        response.close()
+
+    def test_cache_is_bounded(self):
+        with override_settings(MEDIA_THUMB_CACHE_MAX_BYTES=1):
+            for size in (64, 128, 320):
+                path = get_thumbnail(self.photo.image.name, size)
+                # только что собранное превью не вытесняется до отдачи
+                self.assertTrue(os.path.exists(path))
+        files = sum(len(names) for _, _, names in os.walk(self.cache_dir))
+        self.assertLessEqual(files, 1)
+
+
+class MediaFileTests(MediaRootMixin, SimpleTestCase):
+    def setUp(self):
+        self.content = bytes(range(256)) * 4
+        self.name = default_storage.save('photos/test/range.jpg', io.BytesIO(self.content))
+        self.addCleanup(default_storage.delete, self.name)
+        self.url = f'/media/{self.name}'
+
+    def test_full_and_ranged_download(self):
+        client = APIClient()
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        response = client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+        response.close()
+
+        response = client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+        etag = client.get(self.url)['ETag']
+        self.assertEqual(client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_only_cas_originals_are_immutable(self):
+        digest = 'ab' * 32
+        original = default_storage.save(cas_name(digest, '.jpg'), io.BytesIO(self.content))
+        derivative = default_storage.save(derivative_name(original, 'thumb'), io.BytesIO(self.content))
+        for name in (original, derivative):
+            self.addCleanup(default_storage.delete, name)
+
+        client = APIClient()
+        response = client.get(f'/media/{original}')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+        response = client.get(f'/media/{derivative}')
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        response.close()
+
+    def test_missing_and_outside_media_root(self):
+        client = APIClient()
+        self.assertEqual(client.get('/media/photos/nope.jpg').status_code, 404)
+        self.assertEqual(client.get('/media/../settings.py').status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_nginx_handoff(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_only_photos_are_served(self):
+        client = APIClient()
+        for name in ('ingest/upload.zip', 'reports/2025-05-01_1.docx',
+                     'photos/sha256/.incoming/tmp1234'):
+            saved = default_storage.save(name, io.BytesIO(b'secret'))
+            self.addCleanup(default_storage.delete, saved)
+            self.assertEqual(client.get(f'/media/{saved}').status_code, 404, saved)
+        self.assertEqual(client.get('/media/photos/../ingest/upload.zip').status_code, 404)
+
+    @override_settings(MEDIA_REQUIRE_AUTH=True)
+    def test_auth_required(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+
+@override_settings(PHOTO_INGEST_CHUNK_SIZE=256, PHOTO_DERIVATIVES_ON_INGEST=False)
+class ZipChunkedCopyTests(MediaRootMixin, TestCase):
+    def test_members_are_copied_in_chunks(self):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        inspection = Inspection.objects.create(inspection_date=datetime.date(2025, 5, 1), inspector=user)
+        pallet = Pallet.objects.create(inspection=inspection)
+
+        reads = []
+        read = zipfile.ZipExtFile.read
+
+        def spy(member, n=-1):
+            reads.append(n)
+            return read(member, n)
+
+        with mock.patch.object(zipfile.ZipExtFile, 'read', spy):
+            photos = extract_zip_photos(make_zip(3, 'pallet'), PalletPhoto, pallet=pallet)
+        # ни один файл архива не читается целиком
+        self.assertTrue(reads)
+        self.assertEqual(set(reads), {256})
+        self.assertEqual(len(photos), 3)
+        for n, photo in enumerate(photos):
+            with photo.image.open('rb') as f:
+                self.assertEqual(f.read(), make_jpeg(color=(n, len('pallet'), 100)))
+
+
+@override_settings(PHOTO_INGEST_WORKERS=3, PHOTO_DERIVATIVES_ON_INGEST=False)
+class PhotoIngestPoolTests(MediaRootMixin, TestCase):
+    def test_section_archives_share_bounded_pool(self):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        # у каждого раздела своё содержимое фото (цвет зависит от длины префикса)
+        serializer = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01',
+            'inspector': user.id,
+            'job_number': 'J-1',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 100,
+                'quantity_of_pallets': 4,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+            }],
+            'quantity_inspections': [{
+                'zip_photos': make_zip(8, 'qty'),
+                'boxes': [{'net_weight': 10, 'defect_weight': 1}],
+            }],
+            'pallets': [
+                {'zip_photos': make_zip(8, 'pallet_a')},
+                {'zip_photos': make_zip(8, 'pallet_bb')},
+            ],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        pools = []
+        threads = set()
+
+        def pool(*args, **kwargs):
+            pools.append(kwargs['max_workers'])
+            return ThreadPoolExecutor(*args, **kwargs)
+
+        def spy(zf, info, photo):
+            threads.add(threading.current_thread().name)
+            return save_member(zf, info, photo)
+
+        with mock.patch('app.ingest.ThreadPoolExecutor', pool), \
+                mock.patch('app.ingest.save_member', spy):
+            inspection = serializer.save()
+        # один пул на все три архива инспекции, не больше трёх потоков
+        self.assertEqual(pools, [3])
+        self.assertTrue(threads)
+        self.assertLessEqual(len(threads), 3)
+        self.assertTrue(all(name.startswith('photo-ingest') for name in threads))
+
+        def contents(photos):
+            result = []
+            for photo in photos.order_by('id'):
+                with photo.image.open('rb') as f:
+                    result.append(f.read())
+            return result
+
+        def expected(prefix):
+            return [make_jpeg(color=(n, len(prefix), 100)) for n in range(8)]
+
+        qi = inspection.quantity_inspections.get()
+        self.assertEqual(contents(QuantityInspectionPhoto.objects.filter(quantity_inspection=qi)),
+                         expected('qty'))
+        for pallet, prefix in zip(inspection.pallets.order_by('id'), ('pallet_a', 'pallet_bb')):
+            self.assertEqual(contents(PalletPhoto.objects.filter(pallet=pallet)), expected(prefix))
+
+    def test_queued_archives_are_closed_when_a_later_section_fails(self):
+        user = CustomUser.objects.create(username='inspector', role='inspector')
+        serializer = FullInspectionSerializer(data={
+            'inspection_date': '2025-05-01',
+            'inspector': user.id,
+            'job_number': 'J-2',
+            'mushroom_storage': [{
+                'quantity_of_boxes': 100,
+                'quantity_of_pallets': 4,
+                'temperature_in_fridge': 2,
+                'mushroom_temperature_min': 1,
+                'mushroom_temperature_max': 3,
+                'zip_photos': make_zip(2, 'storage'),
+            }],
+            'quantity_inspections': [{
+                'zip_photos': SimpleUploadedFile('broken.zip', b'not a zip'),
+                'boxes': [{'net_weight': 10, 'defect_weight': 1}],
+            }],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        opened = []
+        zip_file = zipfile.ZipFile
+
+        def tracked(*args, **kwargs):
+            zf = zip_file(*args, **kwargs)
+            opened.append(zf)
+            return zf
+
+        with mock.patch('app.ingest.zipfile.ZipFile', tracked), \
+                self.assertRaises(zipfile.BadZipFile):
+            serializer.save()
+        self.assertEqual(len(opened), 1)
+        self.assertIsNone(opened[0].fp)
+        self.assertFalse(Inspection.objects.exists())
@@ -0,0 +1,103 @@
+# app/thumbnails.py
+"""
+Превью фото произвольного размера по запросу (/media-thumb/<вид>/<id>/<размер>/).
+
+Превью строится при первом обращении из ближайшей подходящей копии
+(app/imaging.py), а не из оригинала, и кладётся в дисковый кэш
+MEDIA_THUMB_CACHE_DIR. Кэш ограничен MEDIA_THUMB_CACHE_MAX_BYTES: при
+переполнении удаляются файлы, к которым дольше всего не обращались
+(время доступа — mtime, обновляется при каждом попадании).
+
+Одновременные запросы одного превью в одном процессе ждут друг друга на
+блокировке, и картинка строится один раз. Разные процессы могут собрать
+одно превью параллельно: запись атомарная, так что это лишь лишняя работа.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError, features
+
+from .disk_cache import DiskUsage, touch, write_atomic
+from .imaging import derivative_name, open_normalized, render
+from .storage import photo_storage
+
+logger = logging.getLogger(__name__)
+
+# формат -> (формат Pillow, Content-Type, расширение)
+THUMB_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp'),
+}
+
+# блокировки по хэшу ключа (в пределах процесса): число фиксировано, словарь не растёт
+_locks = [threading.Lock() for _ in range(64)]
+_usage = DiskUsage('MEDIA_THUMB_CACHE_DIR', 'MEDIA_THUMB_CACHE_MAX_BYTES')
+
+
+def webp_supported():
+    return features.check('webp')
+
+
+def thumbnail_key(name, size, fmt):
+    return hashlib.sha1(f'{name}:{size}:{fmt}'.encode()).hexdigest()
+
+
+def cache_path(key, fmt):
+    return os.path.join(settings.MEDIA_THUMB_CACHE_DIR, key[:2], f'{key}.{THUMB_FORMATS[fmt][2]}')
+
+
+def source_name(name, size, storage):
+    """Самая маленькая из готовых копий, которая не меньше size по обеим сторонам."""
+    candidates = sorted(
+        (min(box), kind) for kind, box in settings.PHOTO_DERIVATIVES.items() if min(box) >= size
+    )
+    for _, kind in candidates:
+        derivative = derivative_name(name, kind)
+        if storage.exists(derivative):
+            return derivative
+    return name
+
+
+def get_thumbnail(name, size, fmt='jpeg', storage=None):
+    """Путь к файлу превью в кэше; None, если фото не читается."""
+    storage = storage or photo_storage
+    key = thumbnail_key(name, size, fmt)
+    path = cache_path(key, fmt)
+    if touch(path):
+        return path
+
+    with _locks[int(key[:8], 16) % len(_locks)]:
+        if os.path.exists(path):
+            return path
+        try:
+            with storage.open(source_name(name, size, storage)) as f:
+                img = open_normalized(f, [(size, size)])
+                img.load()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+            logger.warning("Cannot build thumbnail for %s: %s", name, e)
+            return None
+        data = render(img, (size, size), format=THUMB_FORMATS[fmt][0])
+        write_atomic(path, data)
+
+    # только что записанное превью вытеснять нельзя — его сейчас отдадут
+    _usage.account(len(data), keep=path)
+    return path
+
+
+def open_thumbnail(name, size, fmt='jpeg', storage=None):
+    """
+    Открытый файл превью; None, если фото не читается. Другой процесс может
+    вытеснить превью между get_thumbnail и open — тогда оно строится заново.
+    """
+    for _ in range(2):
+        path = get_thumbnail(name, size, fmt, storage)
+        if path is None:
+            return None
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            logger.info("Thumbnail %s evicted before it was sent, rebuilding", path)
+    return None
@@ -0,0 +1,137 @@
+# app/uploads.py
+"""
+Докачиваемая загрузка больших архивов кусками.
+
+Клиент создаёт загрузку, присылает куски PUT-запросами со смещением и
+контрольной суммой sha256, затем завершает её. Кусок сначала принимается
+во временный файл и проверяется, затем под блокировкой загрузки
+дописывается в один файл на локальном диске (CHUNKED_UPLOAD_DIR); готовый
+файл отдаётся сериализаторам разделов как есть, без повторного копирования.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+
+from .models import ChunkedUpload
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class OffsetMismatch(Exception):
+    pass
+
+
+class AssembledUpload(File):
+    """Собранный файл завершённой загрузки, открытый для чтения."""
+
+    def __init__(self, upload):
+        super().__init__(open(upload_path(upload), 'rb'), name=upload.filename)
+        self.upload_id = upload.pk
+        self.size = upload.size
+
+
+def upload_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def create_upload(filename, size, sha256='', user=None):
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+        raise ValidationError("Недопустимый размер загрузки")
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    upload = ChunkedUpload.objects.create(
+        filename=os.path.basename(filename),
+        size=size,
+        sha256=sha256.lower(),
+        created_by=user if getattr(user, 'is_authenticated', False) else None,
+    )
+    # файл нужного размера, куски пишутся в него по смещению
+    with open(upload_path(upload), 'wb') as f:
+        f.truncate(size)
+    return upload
+
+
+def receive_chunk(stream, length, checksum):
+    """
+    Читает кусок длиной length из stream во временный файл и сверяет sha256.
+    Вызывается до блокировки загрузки: медленный клиент не держит строку
+    и транзакцию. Возвращает файл, открытый на начале куска.
+    """
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    chunk = tempfile.TemporaryFile(dir=settings.CHUNKED_UPLOAD_DIR)
+    digest = hashlib.sha256()
+    remaining = length
+    while remaining:
+        data = stream.read(min(remaining, settings.PHOTO_INGEST_CHUNK_SIZE))
+        if not data:
+            break
+        digest.update(data)
+        chunk.write(data)
+        remaining -= len(data)
+
+    if remaining or digest.hexdigest() != checksum.lower():
+        chunk.close()
+        raise ChecksumMismatch()
+    chunk.seek(0)
+    return chunk
+
+
+def write_chunk(upload, offset, chunk, length):
+    """
+    Дописывает принятый кусок (receive_chunk) по смещению offset.
+    Повтор уже принятого куска ничего не делает.
+    """
+    if offset + length <= upload.offset:
+        return upload
+    if offset != upload.offset:
+        raise OffsetMismatch(upload.offset)
+    if offset + length > upload.size:
+        raise OffsetMismatch(upload.offset)
+
+    with open(upload_path(upload), 'r+b') as f:
+        f.seek(offset)
+        shutil.copyfileobj(chunk, f, settings.PHOTO_INGEST_CHUNK_SIZE)
+
+    upload.offset = offset + length
+    upload.save(update_fields=['offset', 'updated_at'])
+    return upload
+
+
+def complete_upload(upload):
+    if upload.offset != upload.size:
+        raise OffsetMismatch(upload.offset)
+    if upload.sha256:
+        digest = hashlib.sha256()
+        with open(upload_path(upload), 'rb') as f:
+            for data in iter(lambda: f.read(settings.PHOTO_INGEST_CHUNK_SIZE), b''):
+                digest.update(data)
+        if digest.hexdigest() != upload.sha256:
+            raise ChecksumMismatch(upload.offset)
+    upload.status = 'complete'
+    upload.save(update_fields=['status', 'updated_at'])
+    return upload
+
+
+def open_completed_upload(upload_id):
+    """Открывает готовый файл загрузки; None, если загрузка не завершена."""
+    try:
+        upload = ChunkedUpload.objects.filter(pk=upload_id, status='complete').first()
+    except (ValueError, ValidationError):
+        return None
+    if upload is None:
+        return None
+    return AssembledUpload(upload)
+
+
+def delete_upload(upload):
+    try:
+        os.remove(upload_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
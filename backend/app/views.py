@@ -1,16 +1,27 @@
 # app/views.py
 import json
+import mimetypes
 import os
-from io import BytesIO
+import stat
+import zipfile
+from urllib.parse import quote
 
 from django.conf import settings
-from django.http import HttpResponse
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework import viewsets
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -19,39 +30,217 @@ from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from .models import (
+    ChunkedUpload,
     CustomUser,
+    IngestJob,
     Inspection,
     MushroomStorage,
+    ProductLoading,
     ProductMarkingZip,
     ProductMarkingPhoto,
+    QuantityInspection,
     QuantityInspectionPhoto,
     QualityInspectionPhoto,
     PalletPhoto,
+    ReportJob,
     Thermometer,
-    Scale
+    Scale,
+    PHOTO_KINDS,
 )
 
-from .report_generator import generate_inspection_report
+from .archive import archive_entries, stream_zip
+from .bundle import inspection_bundle
+from .cas import is_cas_name
+from .conditional import ConditionalInspectionMixin
+from .export import EXPORT_DATASETS, EXPORT_FORMATS, export_chunks, export_filename, parse_period
+from .ingest import PhotoIngest, extract_zip_photos, save_uploaded_photos
+from .jobs import enqueue_ingest_job, is_claimable, start_ingest_worker
+from .media import RangeFile, RangeNotSatisfiable, parse_range
+from .multipart import parse_nested_keys
+from .pagination import InspectionPagination, PhotoPagination
+from .reference import cached_list, scale_id
+from .report_cache import open_cached_report
+from .reports import (
+    enqueue_report_job,
+    parse_photo_ids,
+    report_file_name,
+    requeue_report_job,
+    start_report_worker,
+)
+from .signals import bump_inspection_version
+from .thumbnails import THUMB_FORMATS, open_thumbnail, thumbnail_key, webp_supported
+from .uploads import (
+    ChecksumMismatch,
+    OffsetMismatch,
+    complete_upload,
+    create_upload,
+    delete_upload,
+    open_completed_upload,
+    receive_chunk,
+    write_chunk,
+)
 from .serializers import (
+    ChunkedUploadSerializer,
     FullInspectionSerializer,
+    IngestJobSerializer,
+    InspectionListSerializer,
     MushroomStorageSerializer,
     ProductMarkingZipSerializer,
     ProductMarkingPhotoSerializer,
     QuantityInspectionPhotoSerializer,
     QualityInspectionPhotoSerializer,
     PalletPhotoSerializer,
+    ReportJobSerializer,
     ThermometerSerializer,
-    ScaleSerializer
+    ScaleSerializer,
+    parse_field_list,
 )
 
-class ThermometerViewSet(viewsets.ModelViewSet):
+class ReferenceListMixin:
+    """Список справочника из кэша (app/reference.py); сбрасывается сигналами."""
+    reference_name = None
+
+    def list(self, request, *args, **kwargs):
+        data = cached_list(
+            self.reference_name,
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+        )
+        return Response(data)
+
+
+class ThermometerViewSet(ReferenceListMixin, viewsets.ModelViewSet):
     queryset = Thermometer.objects.all()
     serializer_class = ThermometerSerializer
+    reference_name = 'thermometer'
 
 
-class ScaleViewSet(viewsets.ModelViewSet):
+class ScaleViewSet(ReferenceListMixin, viewsets.ModelViewSet):
     queryset = Scale.objects.all()
     serializer_class = ScaleSerializer
+    reference_name = 'scale'
+
+def media_file(request, path):
+    """
+    Файлы MEDIA_ROOT для развёртываний без DEBUG: проверка доступа,
+    затем X-Accel-Redirect / X-Sendfile или FileResponse с Range (app/media.py).
+    """
+    if settings.MEDIA_REQUIRE_AUTH and not _media_user_authenticated(request):
+        return HttpResponse(status=401)
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    path = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+    if not _media_path_served(path):
+        raise Http404
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag = quote_etag(f'{st.st_mtime_ns:x}-{st.st_size:x}')
+    response = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        backend = settings.MEDIA_SENDFILE_BACKEND
+        if backend == 'nginx':
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        elif backend == 'apache':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = _ranged_file_response(request, full_path, st.st_size, etag, content_type)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(st.st_mtime)
+    if is_cas_name(path):
+        response['Cache-Control'] = f'{_media_cache_scope()}, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    else:
+        # копии (__thumb, __report...) пересоздаются под тем же именем
+        # (generate_photo_derivatives --force) — браузер перепроверяет по ETag
+        response['Cache-Control'] = f'{_media_cache_scope()}, no-cache'
+    return response
+
+
+def _media_path_served(path):
+    # скрытые каталоги — временные файлы записи
+    if any(part.startswith('.') for part in path.split('/')):
+        return False
+    return path.startswith(tuple(settings.MEDIA_SERVED_PREFIXES))
+
+
+def _media_cache_scope():
+    # закрытые файлы не должны оседать в общих прокси-кэшах
+    return 'private' if settings.MEDIA_REQUIRE_AUTH else 'public'
+
+
+def _media_user_authenticated(request):
+    # админка — сессия, фронтенд — JWT в заголовке Authorization
+    if request.user.is_authenticated:
+        return True
+    try:
+        return JWTAuthentication().authenticate(request) is not None
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return False
+
+
+def _ranged_file_response(request, full_path, size, etag, content_type):
+    header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    byte_range = None
+    if header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    f = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(f, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(f, start, end - start + 1),
+                                status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_thumbnail(request, kind, pk, size):
+    """
+    Превью фото: /media-thumb/<вид>/<id>/<размер>/, размер из MEDIA_THUMB_SIZES.
+    WebP, если браузер его принимает, иначе JPEG.
+    """
+    if settings.MEDIA_REQUIRE_AUTH and not _media_user_authenticated(request):
+        return HttpResponse(status=401)
+    if kind not in PHOTO_KINDS or size not in settings.MEDIA_THUMB_SIZES:
+        raise Http404
+    photo_model = PHOTO_KINDS[kind][1]
+    name = photo_model.objects.filter(pk=pk).values_list('image', flat=True).first()
+    if not name:
+        raise Http404
+
+    accepts_webp = 'image/webp' in request.headers.get('Accept', '')
+    fmt = 'webp' if accepts_webp and webp_supported() else 'jpeg'
+    # имя файла фото не переиспользуется, поэтому превью по нему неизменно
+    etag = quote_etag(thumbnail_key(name, size, fmt))
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        f = open_thumbnail(name, size, fmt)
+        if f is None:
+            raise Http404
+        response = FileResponse(f, content_type=THUMB_FORMATS[fmt][1])
+    response['ETag'] = etag
+    response['Cache-Control'] = f'{_media_cache_scope()}, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    patch_vary_headers(response, ['Accept'])
+    return response
+
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -96,199 +285,401 @@ class FullInspectionCreateView(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request):
-        flat = request.data
-        files = request.FILES
+        self.uploads = []
+        structured = self.structure(request)
+        serializer = FullInspectionSerializer(data=structured)
+        if not serializer.is_valid():
+            print(f"Ошибки сериализатора: {serializer.errors}")
+            return Response(serializer.errors, status=400)
 
-        raw = flat.get('quantity_inspections')
+        if self.wants_async(request):
+            # принимаем загрузку сразу, распаковка — в фоновом обработчике
+            job, _ = enqueue_ingest_job(
+                structured,
+                user=request.user,
+                client_key=request.headers.get('Idempotency-Key'),
+            )
+            return Response(IngestJobSerializer(job).data, status=202)
+
+        serializer.save()
+        for upload in self.uploads:
+            # архив докачиваемой загрузки распакован и больше не нужен
+            upload.close()
+            delete_upload(ChunkedUpload(pk=upload.upload_id))
+        return Response({'message': 'Инспекция успешно создана'}, status=201)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        for upload in getattr(self, 'uploads', []):
+            upload.close()
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def wants_async(self, request):
+        if request.query_params.get('async') in ('1', 'true'):
+            return True
+        return 'respond-async' in request.headers.get('Prefer', '')
+
+    def structure(self, request):
+        """Собирает вложенный словарь из плоских ключей multipart-формы."""
+        root, sections = parse_nested_keys(request.data)
+
+        raw = root.get('quantity_inspections')
         if raw:
             try:
-                # Перезапишем пустой список в structured на разобранный JSON
+                # Количество может прийти и JSON-строкой целиком
                 parsed = json.loads(raw)
             except ValueError:
-                return Response({"error": "Invalid JSON in quantity_inspections"}, status=400)
+                raise ValidationError({"error": "Invalid JSON in quantity_inspections"})
         else:
             parsed = []
+
         # Собираем корневые поля
         structured = {
-            "inspection_date": flat.get("inspection_date"),
-            "inspector":       flat.get("inspector"),
-            "job_number":      flat.get("job_number"),
-
-            "mushroom_storage":      [],
-            "marking_zips":          [],
-            "quantity_inspections":  parsed,
-            "quality_inspections":   [],
-            "diameter_measurements": [],
-            "pallets":               [],
-            "product_loading":       [],
+            "inspection_date": root.get("inspection_date"),
+            "inspector":       root.get("inspector"),
+            "job_number":      root.get("job_number"),
+
+            "mushroom_storage":      sections.get("mushroom_storage", []),
+            "marking_zips":          sections.get("marking_zips", []),
+            "quantity_inspections":  parsed + sections.get("quantity_inspections", []),
+            "quality_inspections":   sections.get("quality_inspections", []),
+            "diameter_measurements": sections.get("diameter_measurements", []),
+            "pallets":               sections.get("pallets", []),
+            "product_loading":       sections.get("product_loading", []),
         }
 
-        # 1. MushroomStorage
-        i = 0
-        while f"mushroom_storage[{i}].quantity_of_boxes" in flat:
-            item = {
-                "quantity_of_boxes": flat[f"mushroom_storage[{i}].quantity_of_boxes"],
-                "quantity_of_pallets": flat[f"mushroom_storage[{i}].quantity_of_pallets"],
-                "temperature_in_fridge": flat[f"mushroom_storage[{i}].temperature_in_fridge"],
-                "mushroom_temperature_min": flat[f"mushroom_storage[{i}].mushroom_temperature_min"],
-                "mushroom_temperature_max": flat[f"mushroom_storage[{i}].mushroom_temperature_max"],
-                "thermometer": flat.get(f"mushroom_storage[{i}].thermometer"),
-                "invoice_number": flat.get(f"mushroom_storage[{i}].invoice_number")
-            }
-            key = f"mushroom_storage[{i}].zip_photos"
-            if key in files:
-                item["zip_photos"] = files[key]
-            structured["mushroom_storage"].append(item)
-            i += 1
-
-        # 2. marking_zips
-        j = 0
-        while f"marking_zips[{j}].zip_photos" in files:
-            structured["marking_zips"].append({
-                "zip_photos": files[f"marking_zips[{j}].zip_photos"]
-            })
-            j += 1
-
-        # 3. quantity_inspections
-        k = 0
-        while (
-                f"quantity_inspections[{k}].zip_photos" in files or
-                any(f"quantity_inspections[{k}].boxes[{n}].net_weight" in flat for n in range(20))
-        # на всякий случай ограничим range
-        ):
-            item = {}
-
-            # zip
-            key_zip = f"quantity_inspections[{k}].zip_photos"
-            if key_zip in files:
-                item["zip_photos"] = files[key_zip]
-
-            # вытаскиваем коробки
-            boxes = []
-            n = 0
-            while f"quantity_inspections[{k}].boxes[{n}].net_weight" in flat:
-                box = {
-                    "net_weight": flat[f"quantity_inspections[{k}].boxes[{n}].net_weight"],
-                    "defect_weight": flat[f"quantity_inspections[{k}].boxes[{n}].defect_weight"],
-                }
-                boxes.append(box)
-                n += 1
-            item["boxes"] = boxes
-
-            key_scale_prefix = f"quantity_inspections[{k}].scale"
-
-            # Собираем данные по весам, если передаются как вложенный объект
+        # Архив из докачиваемой загрузки: section[i].zip_photos_upload = <id>
+        for key, items in structured.items():
+            if isinstance(items, list):
+                for item in items:
+                    self.attach_uploads(item)
+
+        # Весы приходят плоскими полями scale_model / scale_serial_number / ...
+        for item in structured["quantity_inspections"]:
+            item.setdefault("boxes", [])
             scale_data = {}
             for suffix in ['model', 'serial_number', 'calibration_date']:
-                key = f"{key_scale_prefix}_{suffix}"
-                if key in flat:
-                    scale_data[suffix] = flat[key]
+                key = f"scale_{suffix}"
+                if key in item:
+                    scale_data[suffix] = item.pop(key)
 
             if scale_data:
-                # создаём или ищем Scale
-                from .models import Scale
-                scale_obj, created = Scale.objects.get_or_create(
+                # ищем Scale в кэше справочника, создаём при отсутствии
+                item['scale'] = scale_id(
                     model=scale_data.get('model', ''),
                     serial_number=scale_data.get('serial_number'),
                     calibration_date=scale_data.get('calibration_date')
                 )
-                item['scale'] = scale_obj.id
-
-            structured["quantity_inspections"].append(item)
-            k += 1
-
-        # 4. quality_inspections
-        l = 0
-        # пока есть хоть одно поле из нашей группы
-        while any([
-            f"quality_inspections[{l}].zip_photos" in files,
-            f"quality_inspections[{l}].sample_mass_kg" in flat,
-            f"quality_inspections[{l}].conforms_to_declared_grade" in flat,
-        ]):
-            item = {}
-            # ZIP
-            key_zip = f"quality_inspections[{l}].zip_photos"
-            if key_zip in files:
-                item["zip_photos"] = files[key_zip]
-            # масса объединённой пробы
-            mass_key = f"quality_inspections[{l}].sample_mass_kg"
-            if mass_key in flat:
-                item["sample_mass_kg"] = flat[mass_key]
-            # соответствие сорту
-            grade_key = f"quality_inspections[{l}].conforms_to_declared_grade"
-            if grade_key in flat:
-                item["conforms_to_declared_grade"] = flat[grade_key]
-
-            key_offgrade_50 = f"quality_inspections[{l}].off_grade_mass_kg_50"
-            if key_offgrade_50 in flat:
-                item["off_grade_mass_kg_50"] = flat[key_offgrade_50]
-
-            key_offgrade_70 = f"quality_inspections[{l}].off_grade_mass_kg_70"
-            if key_offgrade_70 in flat:
-                item["off_grade_mass_kg_70"] = flat[key_offgrade_50]
-
-            structured["quality_inspections"].append(item)
-            l += 1
-
-        # 5. diameter_measurements
-        m = 0
-        while f"diameter_measurements[{m}].average_diameter" in flat:
-            item = {
-                "average_diameter": flat[f"diameter_measurements[{m}].average_diameter"],
-                "notes":             flat[f"diameter_measurements[{m}].notes"],
-            }
-            key = f"diameter_measurements[{m}].zip_photos"
-            if key in files:
-                item["zip_photos"] = files[key]
-            structured["diameter_measurements"].append(item)
-            m += 1
-
-        # 6. Паллеты
-        p = 0
-        while f"pallets[{p}].zip_photos" in files:
-            print(f"Обрабатываем паллеты для {p}")
-            item = {}
-
-            # Сохраняем только zip_photos для паллеты
-            key_zip = f"pallets[{p}].zip_photos"
-            if key_zip in files:
-                item["zip_photos"] = files[key_zip]
-                print(f"Zip файл для паллеты {p} найден.")
-
-            structured["pallets"].append(item)
-            p += 1
-
-        # 7. product_loading
-        q = 0
-        while f"product_loading[{q}].mushroom_temperature" in flat:
-            item = {
-                "mushroom_temperature": flat[f"product_loading[{q}].mushroom_temperature"],
-                "car_number":           flat[f"product_loading[{q}].car_number"],
-                "refrigerator_number":  flat[f"product_loading[{q}].refrigerator_number"],
-                "seal_number":          flat[f"product_loading[{q}].seal_number"],
-                "transport_temperature":flat[f"product_loading[{q}].transport_temperature"],
-                "thermometer": flat.get(f"product_loading[{q}].thermometer"),
-            }
-            key = f"product_loading[{q}].zip_photos"
-            if key in files:
-                item["zip_photos"] = files[key]
-            structured["product_loading"].append(item)
-            q += 1
 
         # Теперь у нас есть правильно вложенный словарь + файлы
-        serializer = FullInspectionSerializer(data=structured)
-        if serializer.is_valid():
-            serializer.save()
-            return Response({'message': 'Инспекция успешно создана'}, status=201)
-        else:
-            print(f"Ошибки сериализатора: {serializer.errors}")
-            return Response(serializer.errors, status=400)
+        return structured
 
+    def attach_uploads(self, item):
+        """Заменяет поля <file>_upload открытым файлом завершённой загрузки."""
+        for field in [f for f in item if f.endswith('_upload')]:
+            upload = open_completed_upload(item.pop(field))
+            if upload is None:
+                raise ValidationError({field: "Загрузка не найдена или не завершена"})
+            self.uploads.append(upload)
+            item[field[:-len('_upload')]] = upload
 
 
-class InspectionViewSet(viewsets.ModelViewSet):
+class InspectionViewSet(ConditionalInspectionMixin, viewsets.ModelViewSet):
     queryset = Inspection.objects.all()
     serializer_class = FullInspectionSerializer
+    pagination_class = InspectionPagination
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(kwargs['pk'], super().retrieve, request, *args, **kwargs)
+
+    def section_prefetches(self):
+        """Prefetch для каждого раздела: один запрос на раздел и на его фото."""
+        return {
+            'mushroom_storage': Prefetch(
+                'mushroom_storage',
+                MushroomStorage.objects.select_related('thermometer').prefetch_related('photos')),
+            'marking_zips': 'marking_zips',
+            'quantity_inspections': Prefetch(
+                'quantity_inspections',
+                QuantityInspection.objects.prefetch_related('boxes', 'photos')),
+            'quality_inspections': 'quality_inspections',
+            'diameter_measurements': 'diameter_measurements',
+            'pallets': 'pallets',
+            'product_loading': Prefetch(
+                'product_loading', ProductLoading.objects.prefetch_related('photos')),
+        }
+
+    def read_options(self):
+        """
+        (fields, expand) из ?fields= и ?expand=. Без параметров список не
+        раскрывает разделы, а детальная инспекция раскрывает все; при
+        заданном ?fields= раскрываются только перечисленные в нём разделы.
+        """
+        if not hasattr(self, '_read_options'):
+            params = self.request.query_params
+            fields = parse_field_list(params.get('fields'))
+            expand = parse_field_list(params.get('expand'))
+            sections = set(FullInspectionSerializer.SECTIONS)
+            if expand is None:
+                if fields is not None or self.action == 'list':
+                    expand = set()
+                else:
+                    expand = sections
+            unknown = expand - sections
+            if unknown:
+                raise ValidationError({'expand': f"Неизвестные разделы: {', '.join(sorted(unknown))}"})
+            if fields is not None:
+                expand = expand | (fields & sections)
+            self._read_options = (fields, expand)
+        return self._read_options
+
+    def get_queryset(self):
+        # ФИО инспектора и номер машины хранятся в самой инспекции
+        qs = Inspection.objects.all()
+        if self.action not in ('list', 'retrieve', 'update', 'partial_update'):
+            return qs
+        # загружаем только раскрытые разделы; порядок списка задаёт InspectionPagination
+        _, expand = self.read_options()
+        prefetches = self.section_prefetches()
+        return qs.prefetch_related(*(prefetches[name] for name in sorted(expand)))
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not self.read_options()[1]:
+            return InspectionListSerializer
+        return FullInspectionSerializer
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs['fields'], kwargs['expand'] = self.read_options()
+        return super().get_serializer(*args, **kwargs)
+
+    # разделы, чьи id возвращает metadata(); маркировка живёт на самой инспекции
+    SECTION_KEYS = (
+        'mushroom_storage',
+        'quantity_inspections',
+        'quality_inspections',
+        'diameter_measurements',
+        'pallets',
+        'product_loading',
+    )
+
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        """Страница инспекции одним запросом: все разделы и фото всех видов."""
+        return self.conditional(
+            pk, lambda request: Response(inspection_bundle(self.get_object(), request)), request)
+
+    @action(detail=True, methods=['get'], url_path=r'photos\.zip')
+    def photos_zip(self, request, pk=None):
+        """
+        Все фото инспекции одним ZIP, собираемым на лету;
+        ?sections=pallet,loading — только выбранные виды.
+        """
+        selected = parse_field_list(request.query_params.get('sections'))
+        if selected is None:
+            selected = set(PHOTO_KINDS)
+        unknown = selected - set(PHOTO_KINDS)
+        if unknown:
+            raise ValidationError({'sections': f"Неизвестные разделы: {', '.join(sorted(unknown))}"})
+        kinds = [kind for kind in PHOTO_KINDS if kind in selected]
+        inspection = get_object_or_404(Inspection.objects.only('id', 'job_number'), pk=pk)
+
+        response = StreamingHttpResponse(stream_zip(archive_entries(inspection, kinds)),
+                                         content_type='application/zip')
+        name = inspection.job_number or f'inspection_{inspection.pk}'
+        response['Content-Disposition'] = (
+            f'attachment; filename="inspection_{inspection.pk}_photos.zip"; '
+            f"filename*=UTF-8''{quote(name)}_photos.zip")
+        return response
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser])
+    def metadata(self, request):
+        """
+        Создаёт инспекцию и строки разделов из JSON, без фотографий.
+        Фото потом загружаются отдельно и параллельно: photos/<kind>/.
+        """
+        serializer = FullInspectionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        inspection = serializer.save()
+        sections = {
+            key: list(getattr(inspection, key).order_by('id').values_list('id', flat=True))
+            for key in self.SECTION_KEYS
+        }
+        return Response({'id': inspection.id, 'sections': sections}, status=201)
+
+    @action(detail=True, methods=['post'], url_path=r'photos/(?P<kind>[a-z]+)',
+            parser_classes=[MultiPartParser, FormParser])
+    @transaction.atomic
+    def upload_photos(self, request, pk=None, kind=None):
+        """
+        Загружает фото одного раздела: ZIP в zip_photos и/или файлы в images.
+        Раздел выбирается полем section (id), по умолчанию — первый раздел.
+
+        Всё или ничего: при ошибке строки фото не остаются. Повтор того же
+        запроса новых строк не создаёт — уже загруженные в раздел фото
+        (по sha256) возвращаются как есть.
+        """
+        if kind not in PHOTO_KINDS:
+            raise NotFound(f"Неизвестный раздел фото: {kind}")
+        inspection = self.get_object()
+        section_model, photo_model, owner_field = PHOTO_KINDS[kind]
+
+        if section_model is None:
+            owner = inspection
+        else:
+            sections = section_model.objects.filter(inspection=inspection)
+            section_id = request.data.get('section')
+            if section_id:
+                owner = get_object_or_404(sections, pk=section_id)
+            else:
+                owner = sections.order_by('id').first()
+                if owner is None:
+                    raise ValidationError({'section': f"У инспекции нет раздела {kind}"})
+            owner.inspection = inspection
+
+        zip_file = request.FILES.get('zip_photos')
+        upload = None
+        if zip_file is None and request.data.get('upload'):
+            # архив, загруженный заранее через /api/uploads/
+            upload = zip_file = open_completed_upload(request.data['upload'])
+            if upload is None:
+                raise ValidationError({'upload': "Загрузка не найдена или не завершена"})
+        images = request.FILES.getlist('images')
+        if not zip_file and not images:
+            raise ValidationError({'zip_photos': "Нужен ZIP-архив или файлы images"})
+
+        # архив и отдельные фото — одним PhotoIngest: уже загруженные строки
+        # раздела подбираются для всех новых фото разом, каждая один раз
+        try:
+            with PhotoIngest(reuse_existing=True) as ingest:
+                if zip_file:
+                    try:
+                        extract_zip_photos(zip_file, photo_model, ingest, **{owner_field: owner})
+                    except zipfile.BadZipFile:
+                        raise ValidationError({'zip_photos': "Файл не является ZIP-архивом"})
+                save_uploaded_photos(images, photo_model, ingest, **{owner_field: owner})
+                photos = [photo for batch in ingest.run() for photo in batch]
+        finally:
+            if upload is not None:
+                upload.close()
+        if upload is not None:
+            # докачанный архив удаляем, только если загрузка сохранилась
+            upload_id = upload.upload_id
+            transaction.on_commit(lambda: delete_upload(ChunkedUpload(pk=upload_id)))
+        # bulk_create не посылает сигналов — версию инспекции меняем сами
+        bump_inspection_version(pk=inspection.pk)
+
+        return Response({
+            'kind': kind,
+            'section': owner.id,
+            'photos': [p.id for p in photos],
+        }, status=201)
+
+
+class ChunkedUploadViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """
+    Докачиваемая загрузка архива:
+      POST /api/uploads/                {filename, size, sha256?}
+      PUT  /api/uploads/<id>/           тело — кусок, заголовки Upload-Offset и X-Chunk-SHA256
+      GET  /api/uploads/<id>/           сколько байт уже принято (offset) — откуда продолжать
+      POST /api/uploads/<id>/complete/
+    Готовую загрузку передают вместо файла: pallets[0].zip_photos_upload = <id>.
+    """
+    queryset = ChunkedUpload.objects.all()
+    serializer_class = ChunkedUploadSerializer
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        serializer.instance = create_upload(
+            data['filename'], data['size'], data.get('sha256', ''), user=self.request.user)
+
+    def perform_destroy(self, instance):
+        delete_upload(instance)
+
+    def update(self, request, pk=None):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            raise ValidationError({'error': "Нужны заголовки Upload-Offset и Content-Length"})
+        checksum = request.headers.get('X-Chunk-SHA256')
+        if not checksum:
+            raise ValidationError({'error': "Нужен заголовок X-Chunk-SHA256"})
+        if not 0 < length <= settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+            raise ValidationError({'error': "Недопустимый размер куска"})
+
+        upload = get_object_or_404(ChunkedUpload, pk=pk)
+        if upload.status == 'complete':
+            return Response(self.get_serializer(upload).data, status=409)
+        # тело читаем без блокировки: 16 МБ от медленного клиента идут долго
+        try:
+            chunk = receive_chunk(request.stream, length, checksum)
+        except ChecksumMismatch:
+            return Response({'error': "Контрольная сумма куска не совпала",
+                             'offset': upload.offset}, status=400)
+
+        with chunk, transaction.atomic():
+            upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), pk=pk)
+            if upload.status == 'complete':
+                return Response(self.get_serializer(upload).data, status=409)
+            try:
+                write_chunk(upload, offset, chunk, length)
+            except OffsetMismatch:
+                return Response(self.get_serializer(upload).data, status=409)
+        return Response(self.get_serializer(upload).data)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        with transaction.atomic():
+            upload = get_object_or_404(ChunkedUpload.objects.select_for_update(), pk=pk)
+            try:
+                complete_upload(upload)
+            except OffsetMismatch:
+                return Response(self.get_serializer(upload).data, status=409)
+            except ChecksumMismatch:
+                return Response({'error': "Контрольная сумма файла не совпала"}, status=400)
+        return Response(self.get_serializer(upload).data)
+
+
+class IngestJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус фоновой загрузки инспекции: прогресс по разделам и id результата."""
+    queryset = IngestJob.objects.all()
+    serializer_class = IngestJobSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if settings.INGEST_RUN_IN_PROCESS and is_claimable(job):
+            # задача осталась от перезапущенного процесса — некому её выполнять
+            start_ingest_worker()
+        return Response(self.get_serializer(job).data)
+
+
+class ReportJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус сборки отчёта и скачивание готового .docx."""
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if settings.REPORT_RUN_IN_PROCESS and is_claimable(job):
+            # задача осталась от перезапущенного процесса — некому её выполнять
+            start_report_worker()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'done':
+            return Response({'status': job.status, 'error': job.error}, status=409)
+        f = open_cached_report(job.cache_name) if job.cache_name else None
+        if f is None:
+            # отчёт вытеснен из кэша — собираем заново, клиент снова ждёт статуса
+            requeue_report_job(job)
+            return Response({'status': job.status, 'error': job.error}, status=409)
+        return FileResponse(f, as_attachment=True,
+                            filename=report_file_name(job.inspection_id, job.inspection.inspection_date))
 
 
 class MushroomStorageViewSet(viewsets.ModelViewSet):
@@ -313,36 +704,58 @@ class ProductMarkingZipViewSet(viewsets.ModelViewSet):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class GenerateReportView(View):
-    def post(self, request, inspection_id):
-        body = json.loads(request.body or "{}")
-        doc, inspection_date = generate_inspection_report(
-            inspection_id,
-            placement_ids=body.get("placement_photo_ids"),
-            marking_ids=body.get("marking_photo_ids"),
-            quantity_photo_ids=body.get("quantity_photo_ids"),
-            quality_photo_ids=body.get("quality_photo_ids"),
-            pallet_photo_ids=body.get("pallet_photo_ids"),
-            loading_ids=body.get("loading_photo_ids"),
-        )
-        buf = BytesIO()
-        doc.save(buf)
-        buf.seek(0)
-
-        save_dir = os.path.join(settings.MEDIA_ROOT, 'reports')
-        os.makedirs(save_dir, exist_ok=True)
-
-        date_str = inspection_date.strftime('%Y-%m-%d')
-        fn = f"{date_str}.docx"
-
-        with open(os.path.join(save_dir, fn), 'wb') as f:
-            f.write(buf.read())
+    """
+    Ставит сборку отчёта в очередь (app/reports.py) и сразу отвечает 202
+    с задачей: статус — GET /api/report-jobs/<id>/, файл — download_url.
+    """
 
-        return HttpResponse(status=200)
+    def post(self, request, inspection_id):
+        try:
+            body = json.loads(request.body or "{}")
+            photo_ids = parse_photo_ids(body)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        inspection = get_object_or_404(Inspection.objects.only('id', 'version'),
+                                       pk=inspection_id)
+        job = enqueue_report_job(inspection, photo_ids, user=request.user)
+        data = ReportJobSerializer(job, context={'request': request}).data
+        return JsonResponse(data, status=202)
+
+
+class ExportView(View):
+    """
+    GET /api/export/<набор>/?format=csv|ndjson&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
 
+    Наборы: inspections, storage, boxes, quality, loading (app/export.py).
+    Ответ потоковый, память не растёт с числом строк.
+    """
 
-class ProductMarkingPhotoViewSet(viewsets.ReadOnlyModelViewSet):
+    def get(self, request, dataset):
+        if dataset not in EXPORT_DATASETS:
+            raise Http404
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return JsonResponse({'format': f"Допустимо: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        try:
+            date_from, date_to = parse_period(request.GET.get('date_from'), request.GET.get('date_to'))
+        except ValueError as e:
+            return JsonResponse({'date': str(e)}, status=400)
+
+        response = StreamingHttpResponse(export_chunks(dataset, fmt, date_from, date_to),
+                                         content_type=EXPORT_FORMATS[fmt][0])
+        response['Content-Disposition'] = (
+            f'attachment; filename="{export_filename(dataset, fmt, date_from, date_to)}"')
+        return response
+
+
+class ProductMarkingPhotoViewSet(ConditionalInspectionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = ProductMarkingPhoto.objects.all()
     serializer_class = ProductMarkingPhotoSerializer
+    pagination_class = PhotoPagination
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request.query_params.get('inspection'), super().list,
+                                request, *args, **kwargs)
 
     def get_queryset(self):
         inspection_id = self.request.query_params.get('inspection')
@@ -350,9 +763,14 @@ class ProductMarkingPhotoViewSet(viewsets.ReadOnlyModelViewSet):
             return self.queryset.filter(inspection_id=inspection_id)
         return self.queryset
 
-class QuantityInspectionPhotoViewSet(viewsets.ReadOnlyModelViewSet):
+class QuantityInspectionPhotoViewSet(ConditionalInspectionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = QuantityInspectionPhoto.objects.all()
     serializer_class = QuantityInspectionPhotoSerializer
+    pagination_class = PhotoPagination
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request.query_params.get('inspection'), super().list,
+                                request, *args, **kwargs)
 
     def get_queryset(self):
         insp = self.request.query_params.get('inspection')
@@ -365,9 +783,14 @@ class QuantityInspectionPhotoViewSet(viewsets.ReadOnlyModelViewSet):
         return qs
 
 
-class QualityInspectionPhotoViewSet(viewsets.ReadOnlyModelViewSet):
+class QualityInspectionPhotoViewSet(ConditionalInspectionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = QualityInspectionPhoto.objects.all()
     serializer_class = QualityInspectionPhotoSerializer
+    pagination_class = PhotoPagination
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request.query_params.get('inspection'), super().list,
+                                request, *args, **kwargs)
 
     def get_queryset(self):
         insp = self.request.query_params.get('inspection')
@@ -376,9 +799,14 @@ class QualityInspectionPhotoViewSet(viewsets.ReadOnlyModelViewSet):
         return self.queryset.none()
 
 
-class PalletPhotoViewSet(viewsets.ReadOnlyModelViewSet):
+class PalletPhotoViewSet(ConditionalInspectionMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PalletPhoto.objects.all()
     serializer_class = PalletPhotoSerializer
+    pagination_class = PhotoPagination
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(request.query_params.get('inspection'), super().list,
+                                request, *args, **kwargs)
 
     def get_queryset(self):
         inspection_id = self.request.query_params.get('inspection')
@@ -150,6 +150,26 @@ TIME_ZONE = 'Europe/Minsk'
 USE_I18N = True
 
 
+# Кэш по умолчанию — в памяти процесса; для нескольких воркеров можно
+# указать общий файловый кэш через DJANGO_CACHE_DIR
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mushrooms',
+    }
+}
+if os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+    }
+
+# Сколько секунд хранится список термометров и весов (сбрасывается при записи).
+# Сброс виден другим воркерам только через общий кэш, поэтому с кэшем
+# в памяти процесса срок короткий
+REFERENCE_CACHE_TIMEOUT = int(os.environ.get(
+    'REFERENCE_CACHE_TIMEOUT', 24 * 3600 if os.environ.get('DJANGO_CACHE_DIR') else 60))
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
@@ -157,6 +177,94 @@ STATIC_URL = 'static/'
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 MEDIA_URL = "/media/"
 
+# Оригиналы фото в CAS (photos/sha256/...) под своим именем не меняются,
+# браузер кэширует их без перепроверки. Остальное (в том числе копии
+# __thumb/__screen/__report) — с перепроверкой по ETag
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 3600
+
+# Медиа отдаются через Django (app/media.py), в том числе без DEBUG:
+#   'django' — FileResponse (sendfile через wsgi.file_wrapper) с поддержкой Range;
+#   'nginx'  — X-Accel-Redirect на internal location MEDIA_ACCEL_PREFIX;
+#   'apache' — X-Sendfile.
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', 'django')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Отдавать медиа только вошедшим пользователям (сессия или JWT). Выключено:
+# фронтенд грузит фото обычными <img src> без заголовка Authorization
+MEDIA_REQUIRE_AUTH = os.environ.get('MEDIA_REQUIRE_AUTH', '0') == '1'
+# Какие каталоги MEDIA_ROOT вообще отдаются: фото и их копии. Архивы
+# фоновой загрузки (ingest/), отчёты (reports/) и скрытые каталоги
+# (photos/sha256/.incoming/ с недописанными файлами) — никогда
+MEDIA_SERVED_PREFIXES = ('photos/',)
+
+# Загрузки больше этого размера Django пишет во временный файл, а не в память
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+# Каждый ящик — два поля формы; с умолчанием Django (1000 полей) форма
+# больше чем на ~490 ящиков отклонялась ещё до разбора ключей
+DATA_UPLOAD_MAX_NUMBER_FIELDS = int(os.environ.get('DATA_UPLOAD_MAX_NUMBER_FIELDS', 20000))
+
+# Размер куска при копировании фото из ZIP-архива в хранилище
+PHOTO_INGEST_CHUNK_SIZE = 64 * 1024
+
+# Сколько потоков одновременно распаковывают архивы всех разделов инспекции
+PHOTO_INGEST_WORKERS = int(os.environ.get('PHOTO_INGEST_WORKERS', 8))
+
+# Хранить фото по sha256 содержимого (photos/sha256/ab/cd/...): одинаковые
+# файлы пишутся на диск один раз. При 0 — прежние имена
+# photos/<дата>/<раздел>/... (inspection_photo_upload_path)
+PHOTO_CONTENT_ADDRESSED = os.environ.get('PHOTO_CONTENT_ADDRESSED', '1') == '1'
+
+# Уменьшенные копии фото, создаются при загрузке: вид -> (ширина, высота), px.
+# report — ширина фото в отчёте .docx (REPORT_IMAGE_WIDTH_INCHES) при REPORT_IMAGE_DPI;
+# именно эта копия встраивается в отчёт
+REPORT_IMAGE_WIDTH_INCHES = 4
+REPORT_IMAGE_DPI = int(os.environ.get('REPORT_IMAGE_DPI', '200'))
+PHOTO_DERIVATIVES = {
+    'thumb':  (320, 320),
+    'screen': (1600, 1600),
+    'report': (REPORT_IMAGE_WIDTH_INCHES * REPORT_IMAGE_DPI, 10 * REPORT_IMAGE_DPI),
+}
+PHOTO_DERIVATIVE_QUALITY = 85
+PHOTO_DERIVATIVES_ON_INGEST = True
+
+# Превью по запросу (/media-thumb/<вид>/<id>/<размер>/): допустимые размеры, px,
+# и дисковый кэш с вытеснением давно не запрашиваемых файлов
+MEDIA_THUMB_SIZES = (64, 128, 320, 640, 1280)
+MEDIA_THUMB_CACHE_DIR = os.path.join(BASE_DIR, "thumb_cache")
+MEDIA_THUMB_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Сколько строк фото/ящиков вставляется одним INSERT
+PHOTO_BULK_CREATE_BATCH_SIZE = 500
+
+# Выгрузка для сверки (/api/export/, manage.py export_inspections): строк
+# из БД за одну выборку серверного курсора и размер отдаваемого куска текста
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+# Фоновая загрузка (/api/full-inspection/?async=1): обрабатывать задачи потоком
+# внутри веб-процесса. Если False — запускайте `manage.py process_ingest_jobs --loop`
+INGEST_RUN_IN_PROCESS = os.environ.get('INGEST_RUN_IN_PROCESS', '1') == '1'
+# Как часто (сек) сохранять прогресс фоновой загрузки
+INGEST_PROGRESS_INTERVAL = 1.0
+# Задача в работе, обработчик которой не отмечался дольше (сек), считается
+# брошенной (процесс перезапущен или убит) и снова забирается из очереди
+JOB_STALE_AFTER = 300
+
+# Отчёты .docx собираются в фоне (app/reports.py): сколько одновременно внутри
+# веб-процесса. Если REPORT_RUN_IN_PROCESS=0 — `manage.py process_report_jobs --loop`
+REPORT_RUN_IN_PROCESS = os.environ.get('REPORT_RUN_IN_PROCESS', '1') == '1'
+REPORT_MAX_CONCURRENCY = int(os.environ.get('REPORT_MAX_CONCURRENCY', '2'))
+# Кэш готовых отчётов по версии инспекции и выбранным фото (app/report_cache.py).
+# Скачивание идёт прямо отсюда, поэтому лимит ограничивает все отчёты на диске
+REPORT_CACHE_DIR = os.path.join(BASE_DIR, "report_cache")
+REPORT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Докачиваемые загрузки архивов (/api/uploads/): куски пишутся сюда, вне MEDIA_ROOT
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, "chunked_uploads")
+# Максимальный размер всего файла, одного куска и срок жизни незавершённых загрузок
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 4 * 1024 ** 3))
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 16 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRE_HOURS = 48
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
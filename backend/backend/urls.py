@@ -1,23 +1,28 @@
 from app.views import (
     FullInspectionCreateView,
     InspectionViewSet,
+    IngestJobViewSet,
+    ReportJobViewSet,
+    ChunkedUploadViewSet,
     MushroomStorageViewSet,
     get_token_and_user_id,
     check_token,
     ProductMarkingZipViewSet,
     GenerateReportView,
+    ExportView,
     ProductMarkingPhotoViewSet,
     QuantityInspectionPhotoViewSet,
     QualityInspectionPhotoViewSet,
     PalletPhotoViewSet,
     ThermometerViewSet,
-    ScaleViewSet
+    ScaleViewSet,
+    media_file,
+    media_thumbnail,
 )
 
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -30,17 +35,21 @@ router.register(r'quality-photos', QualityInspectionPhotoViewSet)
 router.register(r'pallet-photos', PalletPhotoViewSet)
 router.register(r'thermometers', ThermometerViewSet)
 router.register(r'scales', ScaleViewSet)
+router.register(r'ingest-jobs', IngestJobViewSet)
+router.register(r'report-jobs', ReportJobViewSet, basename='report-job')
+router.register(r'uploads', ChunkedUploadViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/full-inspection/', FullInspectionCreateView.as_view(), name='full-inspection'),
+    path('api/export/<str:dataset>/', ExportView.as_view(), name='export'),
     path('api/token/', get_token_and_user_id, name='token'),
     path('api/token/check/', check_token, name='check-token'),
+    path('media-thumb/<str:kind>/<int:pk>/<int:size>/', media_thumbnail, name='media-thumb'),
     path('generate-report/<int:inspection_id>/',
          GenerateReportView.as_view(),
          name='generate-report'),
-]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # медиа и в DEBUG, и на боевом сервере (см. MEDIA_SENDFILE_BACKEND)
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', media_file, name='media'),
+]
\ No newline at end of file
@@ -1,9 +1,9 @@
 // bags.service.ts
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpHeaders } from '@angular/common/http';
-import { Observable, of } from 'rxjs';
+import { EMPTY, Observable, of } from 'rxjs';
 import { AuthService } from './auth.service';
-import { catchError, switchMap, tap } from 'rxjs/operators';
+import { catchError, expand, map, reduce, switchMap, tap } from 'rxjs/operators';
 import { environment } from '../environments/environment';
 import { HttpParams } from '@angular/common/http';
 
@@ -16,36 +16,65 @@ export class InspectionsService {
 
   constructor(private http: HttpClient) {}
 
-  getInspections(): Observable<any[]> {
-    return this.http.get<any[]>(`${environment.apiBaseUrl}/api/inspections/`);
+  // список приходит страницами по курсору: { next, previous, results };
+  // url — ссылка next/previous из предыдущего ответа
+  getInspections(url?: string | null, pageSize = 20): Observable<any> {
+    if (url) {
+      return this.http.get<any>(url);
+    }
+    const params = new HttpParams().set('page_size', pageSize);
+    return this.http.get<any>(`${environment.apiBaseUrl}/api/inspections/`, { params });
+  }
+
+  // собирает все страницы курсорного списка в один массив
+  private getAllPages(url: string): Observable<any[]> {
+    return this.http.get<any>(url).pipe(
+      expand(page => page.next ? this.http.get<any>(page.next) : EMPTY),
+      map(page => page.results),
+      reduce((all: any[], results: any[]) => all.concat(results), [])
+    );
   }
 
   getInspectionById(id: string): Observable<any> {
     return this.http.get<any>(`${environment.apiBaseUrl}/api/inspections/${id}/`);
   }
 
+  // страница инспекции одним запросом: разделы с photos и marking_photos
+  getInspectionBundle(id: string): Observable<any> {
+    return this.http.get<any>(`${environment.apiBaseUrl}/api/inspections/${id}/bundle/`);
+  }
+
+  // отчёт собирается в фоне: POST ставит задачу, статус опрашивается по id
+  requestReport(inspectionId: number, payload: any): Observable<any> {
+    return this.http.post<any>(`${environment.apiBaseUrl}/generate-report/${inspectionId}/`, payload);
+  }
+
+  getReportJob(id: number): Observable<any> {
+    return this.http.get<any>(`${environment.apiBaseUrl}/api/report-jobs/${id}/`);
+  }
+
   getMushroomStorageByInspectionId(id: string): Observable<any> {
    return this.http.get<any>(`${environment.apiBaseUrl}/api/mushroom-storage/?inspection=${id}`);
   }
 
   getQuantityPhotosByInspectionId(id: string): Observable<any[]> {
-    return this.http.get<any[]>(`${environment.apiBaseUrl}/api/quantity-photos/?inspection=${id}`);
+    return this.getAllPages(`${environment.apiBaseUrl}/api/quantity-photos/?inspection=${id}`);
   }
 
   getMarkingPhotosByInspectionId(id: string): Observable<any[]> {
-    return this.http.get<any[]>(
+    return this.getAllPages(
       `${environment.apiBaseUrl}/api/marking-photos/?inspection=${id}`
     );
   }
 
   getQualityPhotosByInspectionId(id: string): Observable<any[]> {
-    return this.http.get<any[]>(
+    return this.getAllPages(
       `${environment.apiBaseUrl}/api/quality-photos/?inspection=${id}`
     );
   }
 
   getPalletPhotosByInspectionId(id: string): Observable<any[]> {
-    return this.http.get<any[]>(
+    return this.getAllPages(
       `${environment.apiBaseUrl}/api/pallet-photos/?inspection=${id}`
     );
   }
@@ -12,6 +12,8 @@ import { HttpClient } from '@angular/common/http';
 import { MatCheckboxModule } from '@angular/material/checkbox';
 import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
+import { timer } from 'rxjs';
+import { last, switchMap, takeWhile } from 'rxjs/operators';
 
 
 @Component({
@@ -58,46 +60,15 @@ export class InspectionDetailComponent implements OnInit {
   ngOnInit(): void {
     const id = this.route.snapshot.paramMap.get('id')!;
 
-    // 1) Инспекция
-    this.service.getInspectionById(id).subscribe(ins => {
-      this.inspection = ins;
-      console.log('quantity_inspections', ins.quantity_inspections);
-      console.log('inspectionRows', this.inspectionRows);
-      if (ins.quantity_inspections?.length) {
-        this.inspectionRows = ins.quantity_inspections[0].boxes;
-        // ДОБАВИТЬ: подтягиваем фото
-        this.service.getQuantityPhotosByInspectionId(id).subscribe(qPhotos => {
-          // прямо в массив first.quantity_inspections
-          this.inspection.quantity_inspections[0].photos = qPhotos;
-        });
-      if (ins.quality_inspections?.length) {
-        this.service.getQualityPhotosByInspectionId(id).subscribe(qPhotos => {
-          this.inspection.quality_inspections[0].photos = qPhotos;
-        });
-
-        this.service.getPalletPhotosByInspectionId(id).subscribe(photos => {
-          this.palletPhotos = photos;
-        });
-      }
-      }
-    });
-
-    // 2) Размещение
-    this.service.getMushroomStorageByInspectionId(id).subscribe(storageData => {
-      this.mushroomStorageDetails = storageData;
-      // Находим именно тот блок, где inspection === id
-      // и сохраняем его в currentStorage
-      this.currentStorage =
-        storageData.find((s: any) => String(s.inspection) === id)
-        || storageData[0]; // fallback, если вдруг
+    // вся страница одним запросом: разделы уже содержат свои фото
+    this.service.getInspectionBundle(id).subscribe(bundle => {
+      this.inspection = bundle;
+      this.inspectionRows = bundle.quantity_inspections?.[0]?.boxes ?? [];
+      this.mushroomStorageDetails = bundle.mushroom_storage;
+      this.currentStorage = bundle.mushroom_storage[0];
+      this.markingPhotos = bundle.marking_photos;
+      this.palletPhotos = bundle.pallets.flatMap((p: any) => p.photos);
     });
-
-    // 3) Маркировка
-    this.service.getMarkingPhotosByInspectionId(id).subscribe(photoData => {
-      this.markingPhotos = photoData;
-    });
-
-    // … и так далее для остальных разделов …
   }
 
   currentSection!: 'placement' | 'marking' | 'loading' | 'quantity' | 'quality' | 'pallets';
@@ -146,10 +117,24 @@ exportReport(): void {
     quality_photo_ids:   this.selectedQualityPhotoIds,
     pallet_photo_ids:    this.selectedPalletPhotoIds,  // <-- вот он
   };
-  this.http.post(
-    `http://localhost:8000/generate-report/${inspectionId}/`,
-    payload
-  ).subscribe();
+  // задача в очереди: опрашиваем статус, пока отчёт не соберётся
+  this.service.requestReport(inspectionId, payload).pipe(
+    switchMap(job => timer(0, 2000).pipe(
+      switchMap(() => this.service.getReportJob(job.id)),
+      takeWhile(status => status.status === 'pending' || status.status === 'running', true)
+    )),
+    last()
+  ).subscribe({
+    next: status => {
+      if (status.status === 'done') {
+        // файл отдаётся как attachment — страница не уходит
+        window.location.href = status.download_url;
+      } else {
+        alert(`Ошибка при формировании отчета: ${status.error}`);
+      }
+    },
+    error: () => alert('Ошибка при формировании отчета')
+  });
 }
 
   saveJobNumber(): void {
@@ -13,6 +13,8 @@ import { Router } from '@angular/router';
 })
 export class InspectionsComponent implements OnInit {
   inspections: any[] = [];
+  nextUrl: string | null = null;
+  previousUrl: string | null = null;
 
   showSettings = false;
   deviceType: 'thermometer' | 'scale' = 'thermometer';
@@ -31,8 +33,15 @@ export class InspectionsComponent implements OnInit {
   ngOnInit(): void {
     this.loadThermometers();
     this.loadScales();
-    this.inspectionsService.getInspections().subscribe(data => {
-      this.inspections = data.sort((a, b) => new Date(b.inspection_date).getTime() - new Date(a.inspection_date).getTime());
+    this.loadInspections();
+  }
+
+  // сервер уже сортирует по дате (новые сверху) и отдаёт одну страницу
+  loadInspections(url: string | null = null) {
+    this.inspectionsService.getInspections(url, this.pageSize).subscribe(data => {
+      this.inspections = data.results;
+      this.nextUrl = data.next;
+      this.previousUrl = data.previous;
     });
   }
 
@@ -123,17 +132,20 @@ export class InspectionsComponent implements OnInit {
   }
 
   get pagedInspections() {
-    const start = (this.page - 1) * this.pageSize;
-    return this.inspections.slice(start, start + this.pageSize);
+    return this.inspections;
   }
 
-  get totalPages() {
-    return Math.ceil(this.inspections.length / this.pageSize);
+  nextPage() {
+    if (this.nextUrl) {
+      this.page++;
+      this.loadInspections(this.nextUrl);
+    }
   }
 
-  changePage(newPage: number) {
-    if (newPage >= 1 && newPage <= this.totalPages) {
-      this.page = newPage;
+  previousPage() {
+    if (this.previousUrl) {
+      this.page--;
+      this.loadInspections(this.previousUrl);
     }
   }
 